@@ -0,0 +1,264 @@
+"""
+Coalesced tracking of users' last login and last activity.
+
+Recording a login or an authenticated request does not write the user row.
+The timestamp goes to a pending store, and a flush later writes every
+pending timestamp with one UPDATE per chunk of users. A process records a
+user's activity at most once per ``USER_ACTIVITY_DEBOUNCE`` seconds, so busy
+users cost one store write per window however many requests they make.
+
+The pending store is either a map in process memory, flushed by a
+background thread every ``USER_ACTIVITY_FLUSH_INTERVAL`` seconds, or Redis
+hashes shared by all processes and flushed by the ``flush_user_activity``
+task (schedule it with celery beat). ``get_last_activity`` merges pending
+and persisted timestamps, so readers never see a value older than the last
+recorded one.
+
+Settings:
+
+    USER_ACTIVITY_BACKEND = "local"        # or "redis"
+    USER_ACTIVITY_DEBOUNCE = 60
+    USER_ACTIVITY_FLUSH_INTERVAL = 30      # local backend; 0 disables the thread
+    MIDDLEWARE = [..., "accounts.activity.ActivityMiddleware"]
+"""
+
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+from cachetools import TTLCache
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import close_old_connections
+from django.db.models import Case, DateTimeField, F, Value, When
+from django.db.models.functions import Coalesce, Greatest
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+LAST_LOGIN = "last_login"
+LAST_SEEN = "last_seen"
+FIELDS = (LAST_LOGIN, LAST_SEEN)
+FLUSH_CHUNK_SIZE = 500
+
+
+class LocalActivityStore:
+    """Pending timestamps kept in this process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {field: {} for field in FIELDS}
+
+    def record(self, field, user_id, timestamp):
+        with self._lock:
+            pending = self._pending[field]
+            pending[user_id] = max(timestamp, pending.get(user_id, timestamp))
+
+    def pending(self, field, user_ids):
+        with self._lock:
+            pending = self._pending[field]
+            return {uid: pending[uid] for uid in user_ids if uid in pending}
+
+    def drain(self, field):
+        with self._lock:
+            drained, self._pending[field] = self._pending[field], {}
+        return drained
+
+    def ack(self, field):
+        pass
+
+    def restore(self, field, drained):
+        for user_id, timestamp in drained.items():
+            self.record(field, user_id, timestamp)
+
+
+class RedisActivityStore:
+    """Pending timestamps kept in Redis hashes shared by every process"""
+
+    def __init__(self, alias="default"):
+        from django_redis import get_redis_connection
+
+        self.client = get_redis_connection(alias)
+
+    def _key(self, field):
+        return f"accounts:activity:{field}"
+
+    def _flushing_key(self, field):
+        return f"accounts:activity:{field}:flushing"
+
+    def record(self, field, user_id, timestamp):
+        self.client.hset(self._key(field), user_id, timestamp)
+
+    def pending(self, field, user_ids):
+        user_ids = list(user_ids)
+        found = {}
+        for key in (self._flushing_key(field), self._key(field)):
+            for user_id, value in zip(user_ids, self.client.hmget(key, user_ids)):
+                if value is not None:
+                    found[user_id] = max(float(value), found.get(user_id, 0))
+        return found
+
+    def drain(self, field):
+        # A hash left over from a flush that failed is retried first.
+        flushing = self._flushing_key(field)
+        if not self.client.exists(flushing):
+            from redis.exceptions import ResponseError
+
+            try:
+                self.client.rename(self._key(field), flushing)
+            except ResponseError:
+                # Nothing has been recorded since the last flush.
+                return {}
+        return {
+            int(user_id): float(value)
+            for user_id, value in self.client.hgetall(flushing).items()
+        }
+
+    def ack(self, field):
+        self.client.delete(self._flushing_key(field))
+
+    def restore(self, field, drained):
+        # The hash being flushed is kept until ack() and retried next time.
+        pass
+
+
+def _to_datetime(timestamp):
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc)
+
+
+class ActivityTracker:
+    """Debounces activity into a pending store and flushes it in bulk"""
+
+    def __init__(self, store, debounce=60, flush_interval=0):
+        self.store = store
+        self.debounce = debounce
+        self.flush_interval = flush_interval
+        # Users recorded by this process within the debounce window.
+        self._recent = TTLCache(maxsize=100_000, ttl=debounce) if debounce else None
+        self._lock = threading.Lock()
+        self._flusher_pid = None
+
+    def record(self, field, user_id, timestamp=None):
+        if self._recent is not None:
+            with self._lock:
+                if (field, user_id) in self._recent:
+                    return False
+                self._recent[(field, user_id)] = True
+        self.store.record(field, user_id, timestamp or time.time())
+        self._ensure_flusher()
+        return True
+
+    def record_login(self, user):
+        """Record a sign-in, which also counts as activity"""
+        now = time.time()
+        # Each sign-in is kept, not debounced.
+        self.store.record(LAST_LOGIN, user.pk, now)
+        self.record(LAST_SEEN, user.pk, now)
+
+    def record_seen(self, user_id):
+        self.record(LAST_SEEN, user_id)
+
+    def _ensure_flusher(self):
+        # Threads do not survive a fork, so each worker starts its own.
+        if not self.flush_interval or self._flusher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._flusher_pid != os.getpid():
+                threading.Thread(
+                    target=self._run, name="user-activity-flusher", daemon=True
+                ).start()
+                self._flusher_pid = os.getpid()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Failed to flush user activity")
+            finally:
+                close_old_connections()
+
+    def flush(self):
+        """Write pending timestamps to the database; returns rows updated"""
+        updated = 0
+        for field in FIELDS:
+            drained = self.store.drain(field)
+            pending = sorted(drained.items())
+            try:
+                for start in range(0, len(pending), FLUSH_CHUNK_SIZE):
+                    end = start + FLUSH_CHUNK_SIZE
+                    updated += self._write(field, pending[start:end])
+            except Exception:
+                self.store.restore(field, drained)
+                raise
+            self.store.ack(field)
+        return updated
+
+    def _write(self, field, chunk):
+        # Never move a timestamp backwards, e.g. when a delayed flush races
+        # a newer one.
+        whens = []
+        for user_id, timestamp in chunk:
+            value = Value(_to_datetime(timestamp), output_field=DateTimeField())
+            whens.append(
+                When(pk=user_id, then=Greatest(Coalesce(F(field), value), value))
+            )
+        return User.objects.filter(pk__in=[user_id for user_id, _ in chunk]).update(
+            **{field: Case(*whens, default=F(field), output_field=DateTimeField())}
+        )
+
+    def get_last_activity(self, user_ids):
+        """
+        Return {user_id: {"last_login": datetime, "last_seen": datetime}},
+        combining persisted values with those not yet flushed.
+        """
+        user_ids = list(user_ids)
+        activity = {
+            row["pk"]: {LAST_LOGIN: row[LAST_LOGIN], LAST_SEEN: row[LAST_SEEN]}
+            for row in User.objects.filter(pk__in=user_ids).values("pk", *FIELDS)
+        }
+        for field in FIELDS:
+            for user_id, timestamp in self.store.pending(field, user_ids).items():
+                if user_id not in activity:
+                    continue
+                pending = _to_datetime(timestamp)
+                persisted = activity[user_id][field]
+                if persisted is None or pending > persisted:
+                    activity[user_id][field] = pending
+        return activity
+
+
+def _make_tracker():
+    if getattr(settings, "USER_ACTIVITY_BACKEND", "local") == "redis":
+        store = RedisActivityStore(getattr(settings, "TIERED_CACHE_ALIAS", "default"))
+        flush_interval = 0
+    else:
+        store = LocalActivityStore()
+        flush_interval = getattr(settings, "USER_ACTIVITY_FLUSH_INTERVAL", 30)
+    return ActivityTracker(
+        store,
+        debounce=getattr(settings, "USER_ACTIVITY_DEBOUNCE", 60),
+        flush_interval=flush_interval,
+    )
+
+
+activity_tracker = _make_tracker()
+
+
+class ActivityMiddleware:
+    """Record the last activity of authenticated users"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        # DRF authenticates inside the view and sets request.user there.
+        user = getattr(request, "user", None)
+        if user is not None and user.is_authenticated:
+            activity_tracker.record_seen(user.pk)
+        return response
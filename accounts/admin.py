@@ -1,8 +1,23 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 
+from . import bulk
 from .models import CustomUser
 
 
+def _bulk_action(action, role=None):
+    def admin_action(modeladmin, request, queryset):
+        summary = bulk.apply_bulk_action(
+            queryset.exclude(pk=request.user.pk), action, role=role, actor=request.user
+        )
+        modeladmin.message_user(
+            request,
+            f"Updated {summary['updated']} of {summary['matched']} users.",
+            messages.SUCCESS,
+        )
+
+    return admin_action
+
+
 # Register your models here.
 # customizing the admin interface for CustomUser model
 @admin.register(CustomUser)
@@ -11,3 +26,17 @@ class CustomUserAdmin(admin.ModelAdmin):
     search_fields = ("username", "email")
     list_filter = ("is_staff", "is_active")
     ordering = ("email",)
+    actions = ["activate_users", "deactivate_users", "make_admins", "make_users"]
+
+    activate_users = admin.action(description="Activate selected users")(
+        _bulk_action(bulk.ACTIVATE)
+    )
+    deactivate_users = admin.action(
+        description="Deactivate selected users and sign them out"
+    )(_bulk_action(bulk.DEACTIVATE))
+    make_admins = admin.action(description="Change role of selected users to admin")(
+        _bulk_action(bulk.SET_ROLE, "admin")
+    )
+    make_users = admin.action(description="Change role of selected users to user")(
+        _bulk_action(bulk.SET_ROLE, "user")
+    )
@@ -0,0 +1,194 @@
+"""
+Buffered audit log of authentication events.
+
+Views call ``record()``, which only appends the event to a bounded in-process
+queue, so auditing adds no database round trip to the request. A flusher
+drains the queue in batches of ``AUDIT_LOG_BATCH_SIZE``, as soon as a batch
+is full or ``AUDIT_LOG_FLUSH_INTERVAL`` seconds after the oldest pending
+event, and writes each batch with one ``bulk_create``.
+
+When the queue is full, ``record()`` waits up to ``AUDIT_LOG_BLOCK_TIMEOUT``
+seconds for room (backpressure), then drops the event and counts it, so an
+unavailable database slows auth calls by a bounded amount and never fails
+them. ``audit_log.stats()`` reports recorded, dropped, written and failed
+events and the current queue depth.
+
+Sign-in events carry the country and ASN of the client address under
+``metadata["geo"]`` when GeoIP databases are configured (see
+accounts.geoip).
+
+Settings:
+
+    AUDIT_LOG_BACKEND = "thread"       # "thread": write from a background
+                                       #   thread in each process
+                                       # "celery": hand each batch to the
+                                       #   write_auth_events task
+                                       # "manual": write on flush() only
+    AUDIT_LOG_QUEUE_SIZE = 10000
+    AUDIT_LOG_BATCH_SIZE = 500
+    AUDIT_LOG_FLUSH_INTERVAL = 1.0
+    AUDIT_LOG_BLOCK_TIMEOUT = 0.01
+"""
+
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+from ipware import get_client_ip
+
+from . import geoip
+from .models import AuthEvent
+
+logger = logging.getLogger(__name__)
+
+# Events enriched with the location of the client, for fraud scoring.
+GEO_EVENTS = {
+    AuthEvent.LOGIN,
+    AuthEvent.LOGIN_FAILED,
+    AuthEvent.GOOGLE_LOGIN,
+    AuthEvent.GOOGLE_LOGIN_FAILED,
+}
+
+
+class AuditLog:
+    """Bounded queue of pending audit events and the flusher that drains it"""
+
+    def __init__(
+        self,
+        backend="thread",
+        queue_size=10000,
+        batch_size=500,
+        flush_interval=1.0,
+        block_timeout=0.01,
+    ):
+        self.backend = backend
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.block_timeout = block_timeout
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._counts_lock = threading.Lock()
+        self._counts = dict.fromkeys(("recorded", "dropped", "written", "failed"), 0)
+        self._flush_lock = threading.Lock()
+        self._flusher = None
+        self._flusher_pid = None
+
+    def _count(self, field, amount=1):
+        with self._counts_lock:
+            self._counts[field] += amount
+
+    def stats(self):
+        with self._counts_lock:
+            counts = dict(self._counts)
+        counts["pending"] = self._queue.qsize()
+        return counts
+
+    def record(self, event):
+        """Queue an event (a dict of AuthEvent fields) for writing"""
+        if self.backend != "manual":
+            self._ensure_flusher()
+        try:
+            self._queue.put(event, timeout=self.block_timeout)
+        except queue.Full:
+            self._count("dropped")
+            return False
+        self._count("recorded")
+        if self.backend == "manual" and self._queue.qsize() >= self.batch_size:
+            self.flush()
+        return True
+
+    def _ensure_flusher(self):
+        # Threads do not survive a fork, so each worker starts its own.
+        if self._flusher_pid == os.getpid():
+            return
+        with self._flush_lock:
+            if self._flusher_pid != os.getpid():
+                self._flusher = threading.Thread(
+                    target=self._run, name="audit-log-flusher", daemon=True
+                )
+                self._flusher.start()
+                self._flusher_pid = os.getpid()
+
+    def _next_batch(self, wait, size):
+        """Collect up to ``size`` events, waiting at most ``wait`` seconds"""
+        batch = []
+        deadline = time.monotonic() + wait
+        while len(batch) < size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            batch = [first] + self._next_batch(self.flush_interval, self.batch_size - 1)
+            self._write(batch)
+            close_old_connections()
+
+    def flush(self):
+        """Write every pending event now, in the calling thread"""
+        while batch := self._next_batch(0, self.batch_size):
+            self._write(batch)
+
+    def _write(self, batch):
+        try:
+            if self.backend == "celery":
+                from .tasks import write_auth_events
+
+                write_auth_events.delay(batch)
+            else:
+                write_auth_events_batch(batch)
+        except Exception:
+            self._count("failed", len(batch))
+            logger.exception("Failed to write %d audit events", len(batch))
+        else:
+            self._count("written", len(batch))
+
+
+def write_auth_events_batch(batch):
+    """Insert a batch of audit events with one query"""
+    AuthEvent.objects.bulk_create([AuthEvent(**event) for event in batch])
+
+
+audit_log = AuditLog(
+    backend=getattr(settings, "AUDIT_LOG_BACKEND", "thread"),
+    queue_size=getattr(settings, "AUDIT_LOG_QUEUE_SIZE", 10000),
+    batch_size=getattr(settings, "AUDIT_LOG_BATCH_SIZE", 500),
+    flush_interval=getattr(settings, "AUDIT_LOG_FLUSH_INTERVAL", 1.0),
+    block_timeout=getattr(settings, "AUDIT_LOG_BLOCK_TIMEOUT", 0.01),
+)
+atexit.register(audit_log.flush)
+
+
+def record(request, event_type, user=None, email="", **metadata):
+    """Record an authentication event for the current request"""
+    client_ip, _routable = get_client_ip(request)
+    if event_type in GEO_EVENTS:
+        geo = geoip.lookup(client_ip)
+        if geo:
+            metadata["geo"] = geo
+    user_id = user.pk if user is not None else None
+    audit_log.record(
+        {
+            "id": uuid.uuid4(),
+            "event_type": event_type,
+            "user_id": user_id,
+            "email": (user.email if user is not None else str(email))[:254],
+            "ip_address": client_ip,
+            "user_agent": request.META.get("HTTP_USER_AGENT", "")[:255],
+            "metadata": metadata,
+            "created_at": timezone.now(),
+        }
+    )
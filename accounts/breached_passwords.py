@@ -0,0 +1,152 @@
+"""
+Offline breached-password check.
+
+Passwords are compared, by SHA-1 digest, against a local corpus of breached
+passwords (for example the Pwned Passwords download). The corpus is compacted
+by ``manage.py build_breached_passwords`` into a sorted binary file that is
+memory-mapped rather than loaded, so a lookup is a binary search touching a
+handful of pages and the file costs no heap however large it is.
+
+File layout (all integers little-endian):
+
+    8 bytes           magic, b"BRPWv1\\0\\0"
+    65537 x uint64    index: position of the first digest with each 2-byte
+                      prefix, followed by the total number of digests
+    n x 20 bytes      SHA-1 digests in ascending order, without duplicates
+
+The prefix index narrows each search to about n / 65536 digests.
+
+Settings:
+
+    BREACHED_PASSWORDS_FILE = "/var/lib/e-commerce/breached-passwords.bin"
+
+The check is skipped when the setting is unset. The build command replaces
+the file atomically, so running workers keep their current mapping until
+they restart.
+"""
+
+import hashlib
+import mmap
+import struct
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+MAGIC = b"BRPWv1\0\0"
+DIGEST_SIZE = 20
+PREFIXES = 1 << 16
+INDEX_SIZE = (PREFIXES + 1) * 8
+HEADER_SIZE = len(MAGIC) + INDEX_SIZE
+
+
+class BreachedPasswordFile:
+    """Read-only, memory-mapped view of a compacted breached-password corpus"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as corpus:
+            self._map = mmap.mmap(corpus.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[: len(MAGIC)] != MAGIC:
+            self._map.close()
+            raise ImproperlyConfigured(f"{path} is not a breached-password file.")
+        self.count = self._index(PREFIXES)
+        if len(self._map) != HEADER_SIZE + self.count * DIGEST_SIZE:
+            self._map.close()
+            raise ImproperlyConfigured(f"{path} is truncated.")
+
+    def _index(self, prefix):
+        return struct.unpack_from("<Q", self._map, len(MAGIC) + prefix * 8)[0]
+
+    def _digest(self, position):
+        start = HEADER_SIZE + position * DIGEST_SIZE
+        end = start + DIGEST_SIZE
+        return self._map[start:end]
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, digest):
+        prefix = int.from_bytes(digest[:2], "big")
+        low, high = self._index(prefix), self._index(prefix + 1)
+        while low < high:
+            middle = (low + high) // 2
+            found = self._digest(middle)
+            if found == digest:
+                return True
+            if found < digest:
+                low = middle + 1
+            else:
+                high = middle
+        return False
+
+    def contains_password(self, password):
+        return hashlib.sha1(password.encode("utf-8")).digest() in self
+
+    def close(self):
+        self._map.close()
+
+
+def write_breached_password_file(path, digests):
+    """
+    Write digests, which must arrive in ascending order, to a corpus file.
+
+    Duplicates are dropped. Returns the number of digests written.
+    """
+    counts = [0] * PREFIXES
+    previous = None
+    with open(path, "wb") as corpus:
+        corpus.write(MAGIC + bytes(INDEX_SIZE))
+        for digest in digests:
+            if digest == previous:
+                continue
+            if previous is not None and digest < previous:
+                raise ValueError("Digests must be sorted.")
+            corpus.write(digest)
+            counts[int.from_bytes(digest[:2], "big")] += 1
+            previous = digest
+
+        index, position = [], 0
+        for count in counts:
+            index.append(position)
+            position += count
+        index.append(position)
+        corpus.seek(len(MAGIC))
+        corpus.write(struct.pack(f"<{PREFIXES + 1}Q", *index))
+    return position
+
+
+@lru_cache(maxsize=None)
+def get_breached_password_file():
+    """Return this process's mapping of the configured corpus, if any"""
+    path = getattr(settings, "BREACHED_PASSWORDS_FILE", None)
+    return BreachedPasswordFile(path) if path else None
+
+
+@receiver(setting_changed)
+def reset_breached_password_file(*, setting, **kwargs):
+    if setting == "BREACHED_PASSWORDS_FILE":
+        get_breached_password_file.cache_clear()
+
+
+def is_password_breached(password):
+    corpus = get_breached_password_file()
+    return corpus is not None and corpus.contains_password(password)
+
+
+class BreachedPasswordValidator:
+    """
+    Password validator for AUTH_PASSWORD_VALIDATORS that rejects passwords
+    found in the breached-password corpus.
+    """
+
+    message = "This password has appeared in a data breach. Choose another one."
+
+    def validate(self, password, user=None):
+        if is_password_breached(password):
+            raise ValidationError(self.message, code="password_breached")
+
+    def get_help_text(self):
+        return "Your password can't be one that has appeared in a data breach."
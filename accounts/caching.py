@@ -0,0 +1,92 @@
+"""
+Cached lookups on the authenticated request path.
+
+Every JWT-authenticated request loads its user, and ``GET /user/`` then
+loads the profile and serializes both. Both results are kept in two-tier
+caches (see e_commerce_api.tiered_cache) and invalidated whenever the user
+or the profile is saved or deleted.
+
+Settings:
+
+    USER_CACHE_TIMEOUT = 300      # seconds in the shared cache
+    USER_CACHE_LOCAL_TTL = 30     # seconds in process memory
+"""
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from e_commerce_api.tiered_cache import (TieredCache,
+                                         invalidate_now_and_on_commit)
+
+from .models import UserProfile
+
+User = get_user_model()
+
+CACHE_TIMEOUT = getattr(settings, "USER_CACHE_TIMEOUT", 300)
+LOCAL_TTL = getattr(settings, "USER_CACHE_LOCAL_TTL", 30)
+
+user_cache = TieredCache(
+    "accounts:user", maxsize=10000, local_ttl=LOCAL_TTL, timeout=CACHE_TIMEOUT
+)
+user_payload_cache = TieredCache(
+    "accounts:user-payload",
+    maxsize=10000,
+    local_ttl=LOCAL_TTL,
+    timeout=CACHE_TIMEOUT,
+)
+
+
+def _load_user_row(user_id):
+    """Return the user's field values as an immutable tuple, or None"""
+    fields = [field.attname for field in User._meta.concrete_fields]
+    row = User.objects.filter(pk=user_id).values_list(*fields).first()
+    return None if row is None else (tuple(fields), row)
+
+
+def get_cached_user(user_id):
+    """
+    Return the user with the given primary key, or None.
+
+    A fresh instance is built for every call, so callers may modify it.
+    """
+    row = user_cache.get_or_set(user_id, lambda: _load_user_row(user_id))
+    if row is None:
+        return None
+    fields, values = row
+    return User.from_db("default", fields, values)
+
+
+def get_cached_user_payload(user_id, build):
+    """Return the cached ``GET /user/`` payload, building it on a miss"""
+    return user_payload_cache.get_or_set(user_id, build)
+
+
+def _invalidate(caches, user_ids):
+    def invalidate():
+        for cache in caches:
+            cache.invalidate_many(user_ids)
+
+    invalidate_now_and_on_commit(invalidate)
+
+
+def invalidate_user(user_id):
+    _invalidate((user_cache, user_payload_cache), [user_id])
+
+
+def invalidate_users(user_ids):
+    """Invalidate many users with a few round trips per cache"""
+    _invalidate((user_cache, user_payload_cache), list(user_ids))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    invalidate_user(instance.pk)
+
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def profile_changed(sender, instance, **kwargs):
+    _invalidate((user_payload_cache,), [instance.user_id])
@@ -0,0 +1,146 @@
+"""
+Country and ASN lookup for sign-in events.
+
+MaxMind databases (GeoLite2/GeoIP2 Country, City or ASN ``.mmdb`` files)
+are opened once per process in memory-mapped mode, so lookups read a few
+pages of the mapped file and the database costs no heap. Recent results
+are kept in an LRU, as a handful of addresses account for most sign-ins.
+
+Every ``GEOIP_CHECK_INTERVAL`` seconds a lookup also checks whether a file
+was replaced (by geoipupdate, for example). The new file is opened before
+the old reader is released, and requests in flight finish on the reader
+they started with, so an update never fails a lookup. A file that cannot
+be opened is logged and the current reader is kept.
+
+Settings:
+
+    GEOIP_COUNTRY_DB = "/var/lib/GeoIP/GeoLite2-Country.mmdb"   # or City
+    GEOIP_ASN_DB = "/var/lib/GeoIP/GeoLite2-ASN.mmdb"
+    GEOIP_CACHE_SIZE = 10000
+    GEOIP_CHECK_INTERVAL = 60
+
+Lookups return an empty dict when neither database is configured.
+"""
+
+import logging
+import os
+import threading
+import time
+from functools import lru_cache
+
+import maxminddb
+from cachetools import LRUCache
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+
+class MappedDatabase:
+    """One memory-mapped .mmdb file, reopened when the file changes"""
+
+    def __init__(self, path):
+        self.path = path
+        self.signature = self._signature()
+        self.reader = maxminddb.open_database(path, maxminddb.MODE_MMAP)
+
+    def _signature(self):
+        stat = os.stat(self.path)
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def reopen_if_changed(self):
+        """Return a database for the current file, or self if unchanged"""
+        try:
+            if self._signature() == self.signature:
+                return self
+            return MappedDatabase(self.path)
+        except (OSError, maxminddb.InvalidDatabaseError):
+            logger.exception("Could not reopen GeoIP database %s", self.path)
+            return self
+
+    def get(self, ip_address):
+        try:
+            return self.reader.get(ip_address) or {}
+        except ValueError:
+            # Not an IP address.
+            return {}
+
+
+class GeoIPReader:
+    """Looks up addresses in the country and ASN databases, with an LRU"""
+
+    def __init__(
+        self, country_path=None, asn_path=None, cache_size=10000, check_interval=60
+    ):
+        self._databases = tuple(
+            MappedDatabase(path) for path in (country_path, asn_path) if path
+        )
+        self.check_interval = check_interval
+        self._next_check = time.monotonic() + check_interval
+        self._cache = LRUCache(maxsize=cache_size)
+        self._lock = threading.Lock()
+
+    def _maybe_reload(self):
+        if time.monotonic() < self._next_check:
+            return
+        with self._lock:
+            if time.monotonic() < self._next_check:
+                return
+            self._next_check = time.monotonic() + self.check_interval
+            databases = tuple(db.reopen_if_changed() for db in self._databases)
+            if databases != self._databases:
+                # Old readers are released, not closed: lookups in flight
+                # keep their mapping until they finish.
+                self._databases = databases
+                self._cache.clear()
+                logger.info("Reloaded GeoIP databases")
+
+    def lookup(self, ip_address):
+        """Return {"country": ..., "asn": ..., "as_org": ...} as known"""
+        if not ip_address or not self._databases:
+            return {}
+        self._maybe_reload()
+        with self._lock:
+            result = self._cache.get(ip_address)
+        if result is not None:
+            return dict(result)
+
+        result = {}
+        for database in self._databases:
+            record = database.get(ip_address)
+            country = record.get("country") or record.get("registered_country") or {}
+            if country.get("iso_code"):
+                result["country"] = country["iso_code"]
+            if record.get("autonomous_system_number"):
+                result["asn"] = record["autonomous_system_number"]
+                result["as_org"] = record.get("autonomous_system_organization", "")
+        with self._lock:
+            self._cache[ip_address] = result
+        return dict(result)
+
+
+@lru_cache(maxsize=None)
+def get_geoip_reader():
+    """Return this process's reader for the configured databases"""
+    return GeoIPReader(
+        country_path=getattr(settings, "GEOIP_COUNTRY_DB", None),
+        asn_path=getattr(settings, "GEOIP_ASN_DB", None),
+        cache_size=getattr(settings, "GEOIP_CACHE_SIZE", 10000),
+        check_interval=getattr(settings, "GEOIP_CHECK_INTERVAL", 60),
+    )
+
+
+@receiver(setting_changed)
+def reset_geoip_reader(*, setting, **kwargs):
+    if setting.startswith("GEOIP_"):
+        get_geoip_reader.cache_clear()
+
+
+def lookup(ip_address):
+    """Look up an address; never raises, so sign-in never depends on it"""
+    try:
+        return get_geoip_reader().lookup(ip_address)
+    except (OSError, maxminddb.InvalidDatabaseError):
+        logger.exception("GeoIP lookup unavailable")
+        return {}
@@ -1,12 +1,83 @@
+import json
+
+import jwt
 import requests
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.db import transaction
+from google.auth import exceptions as google_exceptions
 from google.auth.transport import requests as google_requests
 from google.oauth2 import id_token
-from rest_framework_simplejwt.tokens import RefreshToken
+
+from e_commerce_api.tiered_cache import TieredCache
+
+from .models import OutboxEvent, SocialIdentity, UserProfile
+from .tokens import RefreshToken
 
 User = get_user_model()
 
+GOOGLE_PROVIDER = "google"
+SOCIAL_IDENTITY_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Overridable in settings to point at a local stand-in (see loadtest/).
+GOOGLE_CERTS_URL = "https://www.googleapis.com/oauth2/v1/certs"
+GOOGLE_TOKEN_URL = "https://oauth2.googleapis.com/token"
+GOOGLE_ISSUERS = ["accounts.google.com", "https://accounts.google.com"]
+
+# Shared HTTP sessions so certs and token calls reuse connections.
+_http = requests.Session()
+_google_transport = google_requests.Request(session=_http)
+
+# Google rotates its signing keys every few days and publishes new ones well
+# before using them, so certificates are fetched at most once per timeout.
+# A token signed with an unknown key triggers an early refetch, at most once
+# per GOOGLE_CERTS_REFRESH_INTERVAL across all processes.
+GOOGLE_CERTS_CACHE_TIMEOUT = getattr(settings, "GOOGLE_CERTS_CACHE_TIMEOUT", 3600)
+GOOGLE_CERTS_REFRESH_INTERVAL = 60
+google_certs_cache = TieredCache(
+    "accounts:google-certs",
+    maxsize=8,
+    local_ttl=GOOGLE_CERTS_CACHE_TIMEOUT,
+    timeout=GOOGLE_CERTS_CACHE_TIMEOUT,
+)
+
+
+def _fetch_certs(url):
+    response = _google_transport(url, method="GET")
+    if response.status != 200:
+        raise google_exceptions.TransportError(f"Could not fetch certificates at {url}")
+    return response.data
+
+
+def _get_certs(url):
+    return google_certs_cache.get_or_set(url, lambda: _fetch_certs(url))
+
+
+class _CertsResponse:
+    status = 200
+    headers = {}
+
+    def __init__(self, data):
+        self.data = data
+
+
+def _cached_certs_transport(url, method="GET", **kwargs):
+    """google-auth transport that answers certificate requests from the cache"""
+    return _CertsResponse(_get_certs(url))
+
+
+def _refresh_certs_for(token, url):
+    """Drop the cached certificates if they do not include the token's key"""
+    kid = jwt.get_unverified_header(token).get("kid")
+    certs = json.loads(_get_certs(url))
+    kids = {key.get("kid") for key in certs.get("keys", [])} | set(certs)
+    if kid not in kids and cache.add(
+        f"accounts:google-certs-refresh:{url}", True, GOOGLE_CERTS_REFRESH_INTERVAL
+    ):
+        google_certs_cache.invalidate(url)
+
 
 class GoogleAuthHandler:
     """Handle Google OAuth authentication and token verification"""
@@ -23,15 +94,19 @@ class GoogleAuthHandler:
             dict: User information or None if verification fails
         """
         try:
-            idinfo = id_token.verify_oauth2_token(
-                token, google_requests.Request(), settings.GOOGLE_OAUTH2_CLIENT_ID
+            certs_url = getattr(settings, "GOOGLE_OAUTH2_CERTS_URL", GOOGLE_CERTS_URL)
+            _refresh_certs_for(token, certs_url)
+            idinfo = id_token.verify_token(
+                token,
+                _cached_certs_transport,
+                audience=settings.GOOGLE_OAUTH2_CLIENT_ID,
+                certs_url=certs_url,
             )
 
             # Token is valid
-            if idinfo["iss"] not in [
-                "accounts.google.com",
-                "https://accounts.google.com",
-            ]:
+            if idinfo["iss"] not in getattr(
+                settings, "GOOGLE_OAUTH2_ISSUERS", GOOGLE_ISSUERS
+            ):
                 raise ValueError("Wrong issuer.")
 
             return idinfo
@@ -45,31 +120,99 @@ class GoogleAuthHandler:
         """
         Get or create user from Google user data.
 
+        Users are keyed on the Google subject (``sub``), which unlike the
+        email never changes. A repeat login resolves through the cached
+        sub -> user id mapping with a single primary key lookup.
+
         Args:
             google_user_data: Dictionary containing Google user information
 
         Returns:
             tuple: (user, created) - User object and boolean indicating if it was created
+
+        Raises:
+            ValueError: If the email belongs to an existing account and Google
+                has not verified it
         """
-        email = google_user_data.get("email")
-        first_name = google_user_data.get("given_name", "")
-        last_name = google_user_data.get("family_name", "")
+        subject = google_user_data["sub"]
+        cache_key = f"accounts:social:{GOOGLE_PROVIDER}:{subject}"
+
+        user_id = cache.get(cache_key)
+        if user_id is not None:
+            user = User.objects.filter(pk=user_id).first()
+            if user is not None:
+                return user, False
+
+        identity = (
+            SocialIdentity.objects.select_related("user")
+            .filter(provider=GOOGLE_PROVIDER, subject=subject)
+            .first()
+        )
+        if identity is not None:
+            created = False
+        else:
+            identity, created = GoogleAuthHandler._create_identity(google_user_data)
+
+        email = google_user_data.get("email", "")
+        if identity.email != email:
+            SocialIdentity.objects.filter(pk=identity.pk).update(email=email)
 
-        user, created = User.objects.get_or_create(
+        cache.set(cache_key, identity.user_id, SOCIAL_IDENTITY_CACHE_TIMEOUT)
+        return identity.user, created
+
+    @staticmethod
+    @transaction.atomic
+    def _create_identity(google_user_data):
+        """
+        Insert the user, profile and identity for a first Google login.
+
+        Every insert is INSERT ... ON CONFLICT DO NOTHING followed by a read,
+        so concurrent first logins converge on the same rows instead of
+        failing with IntegrityError. bulk_create skips save(), so the
+        user.created event is written here, with the user row.
+        """
+        email = User.objects.normalize_email(google_user_data["email"])
+        candidate = User(
             email=email,
-            defaults={
-                "first_name": first_name,
-                "last_name": last_name,
-                "is_active": True,
-            },
+            first_name=google_user_data.get("given_name", ""),
+            last_name=google_user_data.get("family_name", ""),
+            is_active=True,
+            password=make_password(None),
         )
-
-        return user, created
+        User.objects.bulk_create([candidate], ignore_conflicts=True)
+        user = User.objects.get(email=email)
+        # Unusable password hashes are random, so only our insert matches.
+        created = user.password == candidate.password
+
+        if not created and not google_user_data.get("email_verified"):
+            raise ValueError("Google account email is not verified.")
+        if created:
+            OutboxEvent.for_user(user, OutboxEvent.USER_CREATED).save()
+
+        UserProfile.objects.bulk_create([UserProfile(user=user)], ignore_conflicts=True)
+        SocialIdentity.objects.bulk_create(
+            [
+                SocialIdentity(
+                    user=user,
+                    provider=GOOGLE_PROVIDER,
+                    subject=google_user_data["sub"],
+                    email=email,
+                )
+            ],
+            ignore_conflicts=True,
+        )
+        identity = SocialIdentity.objects.select_related("user").get(
+            provider=GOOGLE_PROVIDER, subject=google_user_data["sub"]
+        )
+        return identity, created and identity.user_id == user.pk
 
     @staticmethod
-    def get_tokens_for_user(user):
+    def get_tokens_for_user(user, request=None):
         """Generate JWT tokens for authenticated user"""
-        refresh = RefreshToken.for_user(user)
+        if request is not None:
+            refresh = RefreshToken.for_device(user, request)
+        else:
+            refresh = RefreshToken.for_user(user)
         return {
             "refresh": str(refresh),
             "access": str(refresh.access_token),
@@ -88,7 +231,9 @@ class GoogleAuthHandler:
             dict: Token response or None if exchange fails
         """
         try:
-            token_endpoint = "https://oauth2.googleapis.com/token"
+            token_endpoint = getattr(
+                settings, "GOOGLE_OAUTH2_TOKEN_URL", GOOGLE_TOKEN_URL
+            )
 
             payload = {
                 "code": code,
@@ -98,7 +243,7 @@ class GoogleAuthHandler:
                 "grant_type": "authorization_code",
             }
 
-            response = requests.post(token_endpoint, data=payload)
+            response = _http.post(token_endpoint, data=payload, timeout=10)
             response.raise_for_status()
 
             return response.json()
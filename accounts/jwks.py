@@ -0,0 +1,100 @@
+"""
+Asymmetric signing keys for JWTs issued by the accounts service.
+
+Keys are configured in settings as an ordered list, newest first:
+
+    JWT_SIGNING_KEYS = [
+        {"kid": "2026-10", "algorithm": "RS256", "private_key": "<PEM>"},
+        {"kid": "2026-07", "algorithm": "EdDSA", "public_key": "<PEM>"},
+    ]
+
+The first entry holding a private key signs new tokens. Every entry is
+published in the JWKS document so tokens signed with an older key keep
+verifying until it is removed from the list. To rotate, prepend a new key
+and drop the old one once the refresh token lifetime has passed.
+"""
+
+from functools import lru_cache
+
+import jwt
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+
+class SigningKey:
+    """A single entry of the signing key ring"""
+
+    def __init__(self, kid, algorithm, private_key=None, public_key=None):
+        if not private_key and not public_key:
+            raise ImproperlyConfigured(
+                f"Signing key '{kid}' needs a private_key or a public_key."
+            )
+
+        self.kid = kid
+        self.algorithm = algorithm
+        self._algorithm = jwt.get_algorithm_by_name(algorithm)
+        self.private_key = (
+            self._algorithm.prepare_key(private_key) if private_key else None
+        )
+        if public_key:
+            self.public_key = self._algorithm.prepare_key(public_key)
+        else:
+            self.public_key = self.private_key.public_key()
+
+    def to_jwk(self):
+        """Return the public half of this key as a JWK dictionary"""
+        jwk = self._algorithm.to_jwk(self.public_key, as_dict=True)
+        jwk.update({"kid": self.kid, "alg": self.algorithm, "use": "sig"})
+        return jwk
+
+
+class KeyRing:
+    """Ordered collection of signing keys, newest first"""
+
+    def __init__(self, keys):
+        self.keys = list(keys)
+        self._by_kid = {key.kid: key for key in self.keys}
+        self.active = next((key for key in self.keys if key.private_key), None)
+        if self.active is None:
+            raise ImproperlyConfigured(
+                "JWT_SIGNING_KEYS must contain at least one private key."
+            )
+
+    @classmethod
+    def from_settings(cls, entries):
+        keys = []
+        for entry in entries:
+            entry = dict(entry)
+            for field in ("private_key", "public_key"):
+                path = entry.pop(f"{field}_path", None)
+                if path:
+                    with open(path) as key_file:
+                        entry[field] = key_file.read()
+            keys.append(SigningKey(**entry))
+        return cls(keys)
+
+    def get(self, kid):
+        return self._by_kid.get(kid)
+
+    def jwks(self):
+        return {"keys": [key.to_jwk() for key in self.keys]}
+
+
+@lru_cache(maxsize=None)
+def get_key_ring():
+    """
+    Return the configured key ring, or None when tokens are still signed
+    with the shared HMAC secret.
+    """
+    entries = getattr(settings, "JWT_SIGNING_KEYS", None)
+    if not entries:
+        return None
+    return KeyRing.from_settings(entries)
+
+
+@receiver(setting_changed)
+def reset_key_ring(*, setting, **kwargs):
+    if setting == "JWT_SIGNING_KEYS":
+        get_key_ring.cache_clear()
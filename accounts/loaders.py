@@ -0,0 +1,79 @@
+"""
+Request-scoped batch loaders for the GraphQL API.
+
+Resolvers ask a loader for one object at a time, but the loader answers from
+a single query covering every key queued so far. List resolvers queue the
+keys their children will need, so resolving N users with their profiles
+costs one query for the users and one for the profiles instead of N + 1.
+"""
+
+from django.contrib.auth import get_user_model
+
+from .models import UserProfile
+
+User = get_user_model()
+
+
+class BatchLoader:
+    """
+    Synchronous DataLoader.
+
+    Keys queued with ``enqueue`` (or requested with ``load``) are fetched
+    together by ``batch_load`` the first time any of them is needed; results
+    are cached for the rest of the request.
+    """
+
+    def __init__(self):
+        self._cache = {}
+        self._queue = set()
+
+    def batch_load(self, keys):
+        """Return a mapping of key to object for the given keys"""
+        raise NotImplementedError
+
+    def enqueue(self, keys):
+        self._queue.update(key for key in keys if key not in self._cache)
+
+    def prime(self, key, value):
+        self._cache[key] = value
+        self._queue.discard(key)
+
+    def load(self, key):
+        if key not in self._cache:
+            self._queue.add(key)
+            self.dispatch()
+        return self._cache[key]
+
+    def dispatch(self):
+        keys, self._queue = self._queue, set()
+        results = self.batch_load(keys) if keys else {}
+        for key in keys:
+            self._cache[key] = results.get(key)
+
+
+class UserLoader(BatchLoader):
+    def batch_load(self, keys):
+        return User.objects.in_bulk(keys)
+
+
+class ProfileByUserLoader(BatchLoader):
+    def batch_load(self, keys):
+        return {
+            profile.user_id: profile
+            for profile in UserProfile.objects.filter(user_id__in=keys)
+        }
+
+
+class Loaders:
+    def __init__(self):
+        self.users = UserLoader()
+        self.profiles_by_user = ProfileByUserLoader()
+
+
+def get_loaders(context):
+    """Return the loaders attached to the request, creating them if needed"""
+    loaders = getattr(context, "_graphql_loaders", None)
+    if loaders is None:
+        loaders = Loaders()
+        setattr(context, "_graphql_loaders", loaders)
+    return loaders
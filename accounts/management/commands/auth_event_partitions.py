@@ -0,0 +1,163 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from accounts.models import AuthEvent
+
+
+def month_start(day, months=0):
+    month = day.month - 1 + months
+    return datetime.date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def partition_name(table, start):
+    return f"{table}_{start:%Y_%m}"
+
+
+def default_partition_name(table):
+    return f"{table}_default"
+
+
+def table_exists(name):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT to_regclass(%s) IS NOT NULL", [f'"{name}"'])
+        return cursor.fetchone()[0]
+
+
+def is_partitioned(table):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE relname = %s", [table])
+        row = cursor.fetchone()
+    return row is not None and row[0] == "p"
+
+
+def list_partitions(table):
+    """Return (name, upper bound) for each monthly partition of the table"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class parent ON pg_inherits.inhparent = parent.oid "
+            "JOIN pg_class child ON pg_inherits.inhrelid = child.oid "
+            "WHERE parent.relname = %s ORDER BY child.relname",
+            [table],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    partitions = []
+    for name in names:
+        try:
+            start = datetime.datetime.strptime(name[-7:], "%Y_%m").date()
+        except ValueError:
+            continue
+        partitions.append((name, month_start(start, 1)))
+    return partitions
+
+
+class Command(BaseCommand):
+    help = (
+        "Maintain monthly range partitions of the auth event table on "
+        "PostgreSQL. --init converts the empty table created by migrate into a "
+        "table partitioned by created_at; afterwards run this daily (or from "
+        "beat) to create the partitions for the coming months. Rows outside "
+        "every monthly partition go to a default partition, and move to their "
+        "month's partition when it is created."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--init",
+            action="store_true",
+            help="Convert the (empty) auth event table into a partitioned table",
+        )
+        parser.add_argument(
+            "--months",
+            type=int,
+            default=3,
+            help="Number of future months to create partitions for",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("Partitioning requires PostgreSQL.")
+        table = AuthEvent._meta.db_table
+
+        if options["init"]:
+            self.convert(table)
+        elif not is_partitioned(table):
+            raise CommandError(f"{table} is not partitioned; run with --init first.")
+
+        # Without a default partition, an event dated outside every monthly
+        # partition (the command not run for months, a skewed clock) would
+        # fail to insert and be lost from the audit log.
+        default = default_partition_name(table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TABLE IF NOT EXISTS "{default}" PARTITION OF "{table}" DEFAULT'
+            )
+
+        first = month_start(timezone.now().date())
+        for months in range(options["months"] + 1):
+            start, end = month_start(first, months), month_start(first, months + 1)
+            name = partition_name(table, start)
+            if not table_exists(name):
+                self.create_partition(table, name, start, end)
+            self.stdout.write(f"Partition {name} ready")
+
+    @transaction.atomic
+    def create_partition(self, table, name, start, end):
+        default = default_partition_name(table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT EXISTS (SELECT 1 FROM "{default}" '
+                "WHERE created_at >= %s AND created_at < %s)",
+                [start, end],
+            )
+            if not cursor.fetchone()[0]:
+                cursor.execute(
+                    f'CREATE TABLE "{name}" PARTITION OF "{table}" '
+                    "FOR VALUES FROM (%s) TO (%s)",
+                    [start, end],
+                )
+                return
+            # PostgreSQL refuses a partition whose rows are still in the
+            # default partition, so they are moved into it before attaching.
+            cursor.execute(f'CREATE TABLE "{name}" (LIKE "{table}" INCLUDING DEFAULTS)')
+            cursor.execute(
+                f'WITH moved AS (DELETE FROM "{default}" '
+                "WHERE created_at >= %s AND created_at < %s RETURNING *) "
+                f'INSERT INTO "{name}" SELECT * FROM moved',
+                [start, end],
+            )
+            cursor.execute(
+                f'ALTER TABLE "{table}" ATTACH PARTITION "{name}" '
+                "FOR VALUES FROM (%s) TO (%s)",
+                [start, end],
+            )
+
+    @transaction.atomic
+    def convert(self, table):
+        if is_partitioned(table):
+            self.stdout.write(f"{table} is already partitioned")
+            return
+        if AuthEvent.objects.exists():
+            raise CommandError(f"{table} is not empty; only new tables are converted.")
+
+        # The primary key of a partitioned table must include the partition
+        # key, and indexes are recreated on the parent so partitions inherit
+        # them.
+        with connection.cursor() as cursor:
+            cursor.execute(f'ALTER TABLE "{table}" RENAME TO "{table}_unpartitioned"')
+            cursor.execute(
+                f'CREATE TABLE "{table}" '
+                f'(LIKE "{table}_unpartitioned" INCLUDING DEFAULTS) '
+                "PARTITION BY RANGE (created_at)"
+            )
+            cursor.execute(f'DROP TABLE "{table}_unpartitioned"')
+            cursor.execute(f'ALTER TABLE "{table}" ADD PRIMARY KEY (id, created_at)')
+            for index in AuthEvent._meta.indexes:
+                columns = ", ".join(
+                    AuthEvent._meta.get_field(field).column for field in index.fields
+                )
+                cursor.execute(f'CREATE INDEX "{index.name}" ON "{table}" ({columns})')
+        self.stdout.write(self.style.SUCCESS(f"{table} is now partitioned by month"))
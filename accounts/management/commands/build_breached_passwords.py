@@ -0,0 +1,107 @@
+import hashlib
+import heapq
+import os
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.breached_passwords import (DIGEST_SIZE, BreachedPasswordFile,
+                                         write_breached_password_file)
+
+READ_BLOCK = DIGEST_SIZE * 4096
+
+
+class Command(BaseCommand):
+    help = (
+        "Compact a breached-password corpus into the sorted, memory-mappable "
+        "file read by BREACHED_PASSWORDS_FILE. Input lines are SHA-1 hex "
+        "digests with an optional ':count' suffix (the Pwned Passwords "
+        "format), or plain passwords with --plaintext. Input does not need to "
+        "be sorted; it is sorted in chunks on disk and merged."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("inputs", nargs="+", help="Corpus files to compact")
+        parser.add_argument("--output", required=True, help="File to write")
+        parser.add_argument(
+            "--plaintext",
+            action="store_true",
+            help="Input lines are passwords rather than SHA-1 digests",
+        )
+        parser.add_argument(
+            "--min-count",
+            type=int,
+            default=0,
+            help="Skip digests seen fewer times than this in breaches",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=5_000_000,
+            help="Digests sorted in memory at a time",
+        )
+
+    def handle(self, *args, **options):
+        output = options["output"]
+        directory = os.path.dirname(os.path.abspath(output))
+        with tempfile.TemporaryDirectory(dir=directory) as workdir:
+            runs = self.write_sorted_runs(options, workdir)
+            partial = os.path.join(workdir, "corpus.bin")
+            written = write_breached_password_file(
+                partial, heapq.merge(*(self.read_run(run) for run in runs))
+            )
+            # Validate before swapping it in for running workers.
+            BreachedPasswordFile(partial).close()
+            os.replace(partial, output)
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Wrote {written} breached password digests to {output}")
+        )
+
+    def read_digests(self, options):
+        min_count = options["min_count"]
+        for path in options["inputs"]:
+            with open(path, encoding="utf-8", errors="replace") as corpus:
+                for number, line in enumerate(corpus, 1):
+                    line = line.rstrip("\r\n")
+                    if not line:
+                        continue
+                    if options["plaintext"]:
+                        yield hashlib.sha1(line.encode("utf-8")).digest()
+                        continue
+
+                    digest, _, count = line.partition(":")
+                    if min_count and count and int(count) < min_count:
+                        continue
+                    try:
+                        raw = bytes.fromhex(digest)
+                    except ValueError:
+                        raw = b""
+                    if len(raw) != DIGEST_SIZE:
+                        raise CommandError(f"{path}:{number}: not a SHA-1 digest")
+                    yield raw
+
+    def write_sorted_runs(self, options, workdir):
+        runs, chunk = [], []
+        for digest in self.read_digests(options):
+            chunk.append(digest)
+            if len(chunk) >= options["chunk_size"]:
+                runs.append(self.write_run(chunk, workdir, len(runs)))
+                chunk = []
+        if chunk or not runs:
+            runs.append(self.write_run(chunk, workdir, len(runs)))
+        return runs
+
+    def write_run(self, chunk, workdir, number):
+        path = os.path.join(workdir, f"run-{number}.bin")
+        chunk.sort()
+        with open(path, "wb") as run:
+            run.write(b"".join(chunk))
+        return path
+
+    def read_run(self, path):
+        with open(path, "rb") as run:
+            while block := run.read(READ_BLOCK):
+                for start in range(0, len(block), DIGEST_SIZE):
+                    end = start + DIGEST_SIZE
+                    yield block[start:end]
@@ -0,0 +1,86 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.retention import (ANONYMIZE, DELETE, AccountCleanup,
+                                get_progress, tracked_since)
+
+TASK = "accounts.tasks.cleanup_inactive_accounts"
+SCHEDULE_NAME = "Inactive account cleanup"
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete or anonymize accounts that were never used, as set by the "
+        "ACCOUNT_RETENTION_* settings, in small batches. An interrupted run "
+        "resumes where it stopped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--mode", choices=[DELETE, ANONYMIZE])
+        parser.add_argument("--batch-size", type=int, help="Accounts per batch")
+        parser.add_argument(
+            "--sleep", type=float, help="Seconds to pause between batches"
+        )
+        parser.add_argument(
+            "--max-seconds", type=float, help="Stop after this long; resume later"
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Count the accounts that would be removed",
+        )
+        parser.add_argument(
+            "--progress",
+            action="store_true",
+            help="Print the progress of the current or last pass and exit",
+        )
+        parser.add_argument(
+            "--install-schedule",
+            action="store_true",
+            help="Create or update the celery beat schedule, daily at 03:00",
+        )
+
+    def handle(self, *args, **options):
+        if options["install_schedule"]:
+            self.install_schedule()
+            return
+        if options["progress"]:
+            self.stdout.write(self.format(get_progress()))
+            return
+
+        if tracked_since() is None:
+            raise CommandError(
+                "Set ACCOUNT_RETENTION_TRACKED_SINCE to when sign-ins started "
+                "being recorded; older accounts are never removed."
+            )
+        cleanup = AccountCleanup(
+            mode=options["mode"],
+            batch_size=options["batch_size"],
+            sleep=options["sleep"],
+        )
+        progress = cleanup.run(
+            max_seconds=options["max_seconds"], dry_run=options["dry_run"]
+        )
+        if progress is None:
+            raise CommandError("Another account cleanup is running.")
+        self.stdout.write(self.style.SUCCESS(self.format(progress)))
+
+    def format(self, progress):
+        if not progress:
+            return "No account cleanup has run."
+        state = "finished" if progress["finished"] else "in progress"
+        return (
+            f"{progress['mode']} pass {state}: {progress['removed']} removed of "
+            f"{progress['scanned']} scanned in {progress['batches']} batches, "
+            f"up to id {progress['last_pk']}"
+        )
+
+    def install_schedule(self):
+        from django_celery_beat.models import CrontabSchedule, PeriodicTask
+
+        crontab, _ = CrontabSchedule.objects.get_or_create(
+            minute="0", hour="3", day_of_week="*", day_of_month="*", month_of_year="*"
+        )
+        PeriodicTask.objects.update_or_create(
+            name=SCHEDULE_NAME, defaults={"task": TASK, "crontab": crontab}
+        )
+        self.stdout.write(self.style.SUCCESS(f"Scheduled {TASK} daily at 03:00"))
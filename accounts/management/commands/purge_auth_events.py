@@ -0,0 +1,64 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from accounts.models import AuthEvent
+
+from .auth_event_partitions import is_partitioned, list_partitions
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete auth events older than the retention period. On a partitioned "
+        "PostgreSQL table, partitions that are entirely expired are dropped; "
+        "remaining rows are deleted in small batches so the table is never "
+        "locked for long."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days", type=int, default=90, help="Retention period in days"
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=5000, help="Rows deleted per batch"
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=0.1,
+            help="Seconds to pause between batches",
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options["days"])
+        table = AuthEvent._meta.db_table
+
+        dropped = 0
+        if connection.vendor == "postgresql" and is_partitioned(table):
+            with connection.cursor() as cursor:
+                for name, end in list_partitions(table):
+                    if end <= cutoff.date():
+                        cursor.execute(f'DROP TABLE "{name}"')
+                        dropped += 1
+                        self.stdout.write(f"Dropped partition {name}")
+
+        deleted = 0
+        expired = AuthEvent.objects.filter(created_at__lt=cutoff)
+        while True:
+            ids = list(expired.values_list("id", flat=True)[: options["batch_size"]])
+            if not ids:
+                break
+            deleted += expired.filter(id__in=ids).delete()[0]
+            if len(ids) < options["batch_size"]:
+                break
+            time.sleep(options["sleep"])
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Dropped {dropped} partitions and deleted {deleted} auth events "
+                f"older than {cutoff:%Y-%m-%d}"
+            )
+        )
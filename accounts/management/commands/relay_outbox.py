@@ -0,0 +1,62 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from accounts.outbox import OutboxRelay, get_publisher, outbox_lag
+
+
+class Command(BaseCommand):
+    help = (
+        "Publish user lifecycle events from the outbox table. Runs until "
+        "stopped; start one per partition to scale out while keeping each "
+        "user's events in order."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=getattr(settings, "OUTBOX_BATCH_SIZE", 100),
+            help="Events locked and published per transaction",
+        )
+        parser.add_argument(
+            "--partition", type=int, default=0, help="Partition served by this relay"
+        )
+        parser.add_argument(
+            "--partitions", type=int, default=1, help="Total number of partitions"
+        )
+        parser.add_argument(
+            "--idle-sleep",
+            type=float,
+            default=1.0,
+            help="Seconds to wait when there is nothing to publish",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Publish everything pending, then exit",
+        )
+        parser.add_argument(
+            "--lag", action="store_true", help="Print the outbox backlog and exit"
+        )
+
+    def handle(self, *args, **options):
+        if options["lag"]:
+            lag = outbox_lag()
+            self.stdout.write(
+                f"pending={lag['pending']} oldest_age={lag['oldest_age']:.1f}s "
+                f"failing={lag['failing']}"
+            )
+            return
+
+        relay = OutboxRelay(
+            get_publisher(),
+            batch_size=options["batch_size"],
+            partition=options["partition"],
+            partitions=options["partitions"],
+        )
+        if options["once"]:
+            published = relay.drain()
+            self.stdout.write(self.style.SUCCESS(f"Published {published} events"))
+            return
+
+        relay.run(idle_sleep=options["idle_sleep"])
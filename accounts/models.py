@@ -1,6 +1,8 @@
+import uuid
+
 from django.contrib.auth.models import (AbstractUser, BaseUserManager,
                                         PermissionsMixin)
-from django.db import models
+from django.db import models, router, transaction
 from django.utils import timezone
 
 
@@ -26,7 +28,90 @@ class CustomUserManager(BaseUserManager):
         return self.create_user(email, password, **extra_fields)
 
 
-class CustomUser(AbstractUser, PermissionsMixin):
+class DirtyFieldsMixin:
+    """
+    Track which fields changed since the instance was loaded or saved.
+
+    ``save()`` without ``update_fields`` writes only the changed columns and
+    skips the UPDATE entirely when nothing changed, so no ``post_save`` is
+    sent either. Receivers can tell what changed from ``update_fields``.
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = instance._field_state(field_names)
+        return instance
+
+    def _field_state(self, attnames=None):
+        # Compared as strings, so mutable values such as files are copied.
+        return {
+            field.attname: field.value_to_string(self)
+            for field in self._meta.concrete_fields
+            if attnames is None or field.attname in attnames
+        }
+
+    def get_dirty_fields(self, fields=None):
+        """
+        Return the names of ``fields`` (default: all but the primary key)
+        whose values changed; all of them if the instance was never loaded.
+        """
+        if fields is None:
+            fields = [
+                field.attname
+                for field in self._meta.concrete_fields
+                if not field.primary_key
+            ]
+        loaded = getattr(self, "_loaded_values", None)
+        if loaded is None:
+            return list(fields)
+        current = self._field_state(
+            [name for name in fields if name in loaded or name in self.__dict__]
+        )
+        return [
+            name
+            for name in fields
+            if name in current and current[name] != loaded.get(name)
+        ]
+
+    def save(self, *args, **kwargs):
+        # Inserts and explicit update_fields are saved as requested.
+        explicit = args or kwargs.get("force_insert") or "update_fields" in kwargs
+        loaded = getattr(self, "_loaded_values", None) is not None
+        if loaded and not explicit and not self._state.adding:
+            dirty = self.get_dirty_fields()
+            if not dirty:
+                return
+            dirty += [
+                field.attname
+                for field in self._meta.concrete_fields
+                if getattr(field, "auto_now", False) and field.attname not in dirty
+            ]
+            kwargs["update_fields"] = dirty
+        super().save(*args, **kwargs)
+        self._remember_state(kwargs.get("update_fields"))
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        self._remember_state(fields)
+
+    def _remember_state(self, names=None):
+        loaded = getattr(self, "_loaded_values", None)
+        if names is None or loaded is None:
+            deferred = self.get_deferred_fields()
+            self._loaded_values = self._field_state(
+                [
+                    field.attname
+                    for field in self._meta.concrete_fields
+                    if field.attname not in deferred
+                ]
+            )
+        else:
+            attnames = [self._meta.get_field(name).attname for name in names]
+            loaded.update(self._field_state(attnames))
+
+
+class CustomUser(DirtyFieldsMixin, AbstractUser, PermissionsMixin):
     ROLES_CHOICES = [
         ("admin", "Admin"),
         ("user", "User"),
@@ -40,17 +125,64 @@ class CustomUser(AbstractUser, PermissionsMixin):
     date_joined = models.DateTimeField(default=timezone.now)
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
+    # Embedded in every token; bumping it revokes all of the user's tokens.
+    token_generation = models.PositiveIntegerField(default=0)
+    # Written in batches by accounts.activity, like last_login.
+    last_seen = models.DateTimeField(null=True, blank=True)
 
     objects = CustomUserManager()
 
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = ["first_name", "last_name"]
 
+    # Changes to these fields are published as user.updated events.
+    PUBLISHED_FIELDS = ("email", "first_name", "last_name", "role", "is_staff")
+
     def __str__(self):
         return f"{self.first_name} {self.last_name}"
 
+    def lifecycle_events(self, update_fields=None):
+        """Return the outbox events that saving this user would publish"""
+        if self._state.adding:
+            return [OutboxEvent.USER_CREATED]
+
+        events = []
+        published = [
+            name
+            for name in self.PUBLISHED_FIELDS + ("is_active",)
+            if update_fields is None or name in update_fields
+        ]
+        changed = self.get_dirty_fields(published)
+        if "is_active" in changed:
+            changed.remove("is_active")
+            if not self.is_active:
+                events.append(OutboxEvent.USER_DEACTIVATED)
+            else:
+                changed.append("is_active")
+        if changed:
+            events.append((OutboxEvent.USER_UPDATED, {"changed": changed}))
+        # Set by set_password() and cleared once the row is saved.
+        if self._password is not None:
+            events.append(OutboxEvent.USER_PASSWORD_CHANGED)
+        return events
+
+    def save(self, *args, **kwargs):
+        events = self.lifecycle_events(kwargs.get("update_fields"))
+        if not events:
+            super().save(*args, **kwargs)
+        else:
+            # The events are committed, or rolled back, with the user row.
+            using = kwargs.get("using") or router.db_for_write(
+                type(self), instance=self
+            )
+            with transaction.atomic(using=using):
+                super().save(*args, **kwargs)
+                OutboxEvent.objects.using(using).bulk_create(
+                    [OutboxEvent.for_user(self, event) for event in events]
+                )
 
-class UserProfile(models.Model):
+
+class UserProfile(DirtyFieldsMixin, models.Model):
     user = models.OneToOneField(CustomUser, on_delete=models.CASCADE)
     bio = models.TextField(blank=True)
     profile_picture = models.ImageField(upload_to="profile_pics/", blank=True)
@@ -59,3 +191,167 @@ class UserProfile(models.Model):
 
     def __str__(self):
         return f"Profile of {self.user.email}"
+
+
+class DeviceSession(models.Model):
+    """A signed-in device, identified by the ``sid`` claim of its tokens"""
+
+    user = models.ForeignKey(
+        CustomUser, on_delete=models.CASCADE, related_name="device_sessions"
+    )
+    session_id = models.CharField(max_length=32, unique=True)
+    generation = models.PositiveIntegerField(default=0)
+    user_agent = models.CharField(max_length=255, blank=True)
+    ip_address = models.GenericIPAddressField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+    revoked_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["user", "expires_at"])]
+
+    def __str__(self):
+        return f"Session {self.session_id} of {self.user.email}"
+
+
+class SocialIdentity(models.Model):
+    """Link between a user and an account at an external identity provider"""
+
+    PROVIDER_CHOICES = [
+        ("google", "Google"),
+    ]
+
+    user = models.ForeignKey(
+        CustomUser, on_delete=models.CASCADE, related_name="social_identities"
+    )
+    provider = models.CharField(max_length=20, choices=PROVIDER_CHOICES)
+    subject = models.CharField(max_length=255)
+    email = models.EmailField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["provider", "subject"], name="unique_social_identity"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.provider}:{self.subject} of {self.user.email}"
+
+
+class AuthEvent(models.Model):
+    """
+    Audit record of an authentication event.
+
+    Rows are written in batches by accounts.audit. The primary key is a UUID
+    assigned in Python and the user is not a database foreign key, so the
+    table can be range-partitioned on ``created_at`` (see the
+    ``auth_event_partitions`` command) and rows outlive deleted users.
+    """
+
+    LOGIN = "login"
+    LOGIN_FAILED = "login_failed"
+    LOGOUT = "logout"
+    PASSWORD_CHANGE = "password_change"
+    PASSWORD_RESET_REQUEST = "password_reset_request"
+    PASSWORD_RESET = "password_reset"
+    GOOGLE_LOGIN = "google_login"
+    GOOGLE_LOGIN_FAILED = "google_login_failed"
+
+    EVENT_CHOICES = [
+        (LOGIN, "Login"),
+        (LOGIN_FAILED, "Failed login"),
+        (LOGOUT, "Logout"),
+        (PASSWORD_CHANGE, "Password change"),
+        (PASSWORD_RESET_REQUEST, "Password reset request"),
+        (PASSWORD_RESET, "Password reset"),
+        (GOOGLE_LOGIN, "Google login"),
+        (GOOGLE_LOGIN_FAILED, "Failed Google login"),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    event_type = models.CharField(max_length=32, choices=EVENT_CHOICES)
+    user = models.ForeignKey(
+        CustomUser,
+        null=True,
+        blank=True,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name="+",
+    )
+    email = models.EmailField(blank=True)
+    ip_address = models.GenericIPAddressField(null=True, blank=True)
+    user_agent = models.CharField(max_length=255, blank=True)
+    metadata = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "created_at"], name="authevent_user_idx"),
+            models.Index(fields=["created_at"], name="authevent_created_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.event_type} for {self.email or self.user_id}"
+
+
+class OutboxEvent(models.Model):
+    """
+    A user lifecycle event waiting to be published to other services.
+
+    Rows are written in the same transaction as the change they describe and
+    published, in id order, by the relay in accounts.outbox.
+    """
+
+    USER_CREATED = "user.created"
+    USER_UPDATED = "user.updated"
+    USER_DEACTIVATED = "user.deactivated"
+    USER_PASSWORD_CHANGED = "user.password_changed"
+    # One event for a batch of users changed by accounts.bulk.
+    USERS_BULK_UPDATED = "users.bulk_updated"
+
+    EVENT_CHOICES = [
+        (USER_CREATED, "User created"),
+        (USER_UPDATED, "User updated"),
+        (USER_DEACTIVATED, "User deactivated"),
+        (USER_PASSWORD_CHANGED, "User password changed"),
+        (USERS_BULK_UPDATED, "Users updated in bulk"),
+    ]
+
+    event_type = models.CharField(max_length=64, choices=EVENT_CHOICES)
+    # Events for one aggregate are always published in order.
+    aggregate_id = models.PositiveBigIntegerField()
+    payload = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    published_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["id"],
+                condition=models.Q(published_at__isnull=True),
+                name="outbox_pending_idx",
+            ),
+            models.Index(fields=["published_at"], name="outbox_published_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.event_type} for {self.aggregate_id}"
+
+    @classmethod
+    def for_user(cls, user, event):
+        """Build an event for ``user``; ``event`` is a type or (type, extra)"""
+        event_type, extra = event if isinstance(event, tuple) else (event, {})
+        payload = {
+            "user_id": user.pk,
+            "email": user.email,
+            "first_name": user.first_name,
+            "last_name": user.last_name,
+            "role": user.role,
+            "is_active": user.is_active,
+            **extra,
+        }
+        return cls(event_type=event_type, aggregate_id=user.pk, payload=payload)
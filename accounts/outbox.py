@@ -0,0 +1,233 @@
+"""
+Relay for the transactional outbox of user lifecycle events.
+
+Saving a user writes ``user.created``, ``user.updated``, ``user.deactivated``
+or ``user.password_changed`` rows to ``OutboxEvent`` in the same transaction
+as the change (see ``CustomUser.save``), so an event exists if and only if
+the change was committed. The relay then drains the table in id order:
+
+    1. lock the next batch of unpublished rows with
+       ``SELECT ... FOR UPDATE SKIP LOCKED``,
+    2. publish them one by one,
+    3. mark the published rows and commit.
+
+Rows locked by one relay are skipped by the others, so several relays can
+run side by side without publishing a row twice between them. A relay that
+dies after publishing but before committing leaves its rows unpublished and
+they are sent again: delivery is at least once, and consumers should
+deduplicate on the message ``id``. When a publish fails the batch stops
+there, so a later event is never sent before an earlier one; the row is
+retried on the next pass.
+
+Several relays keep events for the same user in order when each is given
+its own partition (``--partition 0 --partitions 4`` and so on), which splits
+events by user id. The scheduled ``relay_outbox`` task relays every
+partition, so it holds a cache lock while it runs: a beat run that overlaps
+the previous one does nothing.
+
+Settings:
+
+    OUTBOX_PUBLISHER = "celery"          # or "redis"
+    OUTBOX_CELERY_TASK = "user_events.handle"
+    OUTBOX_CELERY_QUEUE = "user-events"
+    OUTBOX_REDIS_STREAM = "user-events"  # consumed with XREADGROUP
+    OUTBOX_REDIS_MAXLEN = 100000
+    OUTBOX_BATCH_SIZE = 100
+    OUTBOX_RELAY_LOCK_TIMEOUT = 600      # seconds; longer than one task run
+    OUTBOX_RETENTION_DAYS = 7            # published rows kept this long
+"""
+
+import json
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Min
+from django.db.models.functions import Mod
+from django.utils import timezone
+
+from .models import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+RELAY_LOCK_KEY = "accounts:outbox:relay:lock"
+
+
+def to_message(event):
+    return {
+        "id": event.pk,
+        "type": event.event_type,
+        "aggregate_id": event.aggregate_id,
+        "payload": event.payload,
+        "occurred_at": event.created_at.isoformat(),
+    }
+
+
+class CeleryPublisher:
+    """Send each event as a Celery task for the consuming services"""
+
+    def __init__(self, task_name, queue=None):
+        self.task_name = task_name
+        self.queue = queue
+
+    def __call__(self, message):
+        from e_commerce_api.celery import app
+
+        app.send_task(self.task_name, args=[message], queue=self.queue)
+
+
+class RedisStreamPublisher:
+    """Append each event to a Redis stream"""
+
+    def __init__(self, stream, alias="default", maxlen=100000):
+        from django_redis import get_redis_connection
+
+        self.client = get_redis_connection(alias)
+        self.stream = stream
+        self.maxlen = maxlen
+
+    def __call__(self, message):
+        self.client.xadd(
+            self.stream,
+            {"id": message["id"], "type": message["type"], "body": json.dumps(message)},
+            maxlen=self.maxlen,
+            approximate=True,
+        )
+
+
+def get_publisher():
+    if getattr(settings, "OUTBOX_PUBLISHER", "celery") == "redis":
+        return RedisStreamPublisher(
+            getattr(settings, "OUTBOX_REDIS_STREAM", "user-events"),
+            alias=getattr(settings, "TIERED_CACHE_ALIAS", "default"),
+            maxlen=getattr(settings, "OUTBOX_REDIS_MAXLEN", 100000),
+        )
+    return CeleryPublisher(
+        getattr(settings, "OUTBOX_CELERY_TASK", "user_events.handle"),
+        queue=getattr(settings, "OUTBOX_CELERY_QUEUE", "user-events"),
+    )
+
+
+class OutboxRelay:
+    """Publishes unpublished outbox rows in id order"""
+
+    def __init__(self, publisher, batch_size=100, partition=0, partitions=1):
+        if not 0 <= partition < partitions:
+            raise ValueError("partition must be between 0 and partitions - 1.")
+        self.publisher = publisher
+        self.batch_size = batch_size
+        self.partition = partition
+        self.partitions = partitions
+        self._lock = threading.Lock()
+        self._stats = {"published": 0, "failed": 0, "last_lag": 0.0, "max_lag": 0.0}
+
+    def stats(self):
+        """Counts for this relay; lag is seconds from commit to publish"""
+        with self._lock:
+            return dict(self._stats)
+
+    def pending(self):
+        queryset = OutboxEvent.objects.filter(published_at__isnull=True)
+        if self.partitions > 1:
+            queryset = queryset.alias(
+                partition=Mod("aggregate_id", self.partitions)
+            ).filter(partition=self.partition)
+        return queryset
+
+    def relay_batch(self):
+        """Publish the next batch; returns the number of events published"""
+        with transaction.atomic():
+            batch = list(
+                self.pending()
+                .select_for_update(skip_locked=True)
+                .order_by("id")[: self.batch_size]
+            )
+            published = []
+            for event in batch:
+                try:
+                    self.publisher(to_message(event))
+                except Exception as exc:
+                    logger.exception("Failed to publish outbox event %s", event.pk)
+                    OutboxEvent.objects.filter(pk=event.pk).update(
+                        attempts=F("attempts") + 1, last_error=repr(exc)[:1000]
+                    )
+                    with self._lock:
+                        self._stats["failed"] += 1
+                    break
+                published.append(event)
+
+            if published:
+                now = timezone.now()
+                OutboxEvent.objects.filter(pk__in=[e.pk for e in published]).update(
+                    published_at=now
+                )
+                lag = (now - published[-1].created_at).total_seconds()
+                with self._lock:
+                    self._stats["published"] += len(published)
+                    self._stats["last_lag"] = lag
+                    self._stats["max_lag"] = max(self._stats["max_lag"], lag)
+        return len(published)
+
+    def drain(self, max_batches=None):
+        """Publish batches until none is left; returns events published"""
+        total = batches = 0
+        while max_batches is None or batches < max_batches:
+            published = self.relay_batch()
+            total += published
+            batches += 1
+            if published < self.batch_size:
+                break
+        return total
+
+    def run(self, idle_sleep=1.0):
+        """Relay forever, sleeping between passes that find nothing to send"""
+        while True:
+            try:
+                published = self.drain()
+            except Exception:
+                logger.exception("Outbox relay pass failed")
+                published = 0
+            if not published:
+                time.sleep(idle_sleep)
+
+
+def drain_alone(relay, max_batches=None):
+    """
+    Drain with ``relay`` unless another run holds the relay lock; returns
+    events published, or None if the lock was taken.
+    """
+    timeout = getattr(settings, "OUTBOX_RELAY_LOCK_TIMEOUT", 600)
+    if not cache.add(RELAY_LOCK_KEY, True, timeout):
+        logger.info("Outbox relay is already running")
+        return None
+    try:
+        return relay.drain(max_batches=max_batches)
+    finally:
+        cache.delete(RELAY_LOCK_KEY)
+
+
+def outbox_lag():
+    """
+    Backlog of the outbox: unpublished rows, the age in seconds of the
+    oldest one, and how many have failed at least once.
+    """
+    pending = OutboxEvent.objects.filter(published_at__isnull=True)
+    oldest = pending.aggregate(oldest=Min("created_at"))["oldest"]
+    return {
+        "pending": pending.count(),
+        "oldest_age": (timezone.now() - oldest).total_seconds() if oldest else 0.0,
+        "failing": pending.filter(attempts__gt=0).count(),
+    }
+
+
+def purge_published(days=None):
+    """Delete rows published more than ``days`` ago; returns rows deleted"""
+    if days is None:
+        days = getattr(settings, "OUTBOX_RETENTION_DAYS", 7)
+    cutoff = timezone.now() - timedelta(days=days)
+    deleted, _ = OutboxEvent.objects.filter(published_at__lt=cutoff).delete()
+    return deleted
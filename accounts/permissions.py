@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.utils.crypto import constant_time_compare
+from rest_framework.permissions import BasePermission
+
+
+class IsInternalService(BasePermission):
+    """
+    Allow requests carrying one of the shared service tokens listed in
+    ``settings.INTERNAL_SERVICE_TOKENS`` in the ``X-Service-Token`` header.
+    """
+
+    message = "A valid service token is required."
+
+    def has_permission(self, request, view):
+        provided = request.META.get("HTTP_X_SERVICE_TOKEN", "")
+        if not provided:
+            return False
+        return any(
+            constant_time_compare(provided, token)
+            for token in getattr(settings, "INTERNAL_SERVICE_TOKENS", [])
+        )
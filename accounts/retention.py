@@ -0,0 +1,308 @@
+"""
+Retention policy for accounts that were never used.
+
+Two kinds of account are removed:
+
+- accounts that were never used, created more than
+  ``ACCOUNT_RETENTION_NEVER_USED_DAYS`` ago,
+- inactive (deactivated or never activated) accounts that were never used,
+  created more than ``ACCOUNT_RETENTION_INACTIVE_DAYS`` ago.
+
+An account counts as used once it has a recorded login or activity, a
+device session, an outstanding token, a linked identity or any row that
+protects it from deletion, such as an order. ``last_login``
+alone is not enough: it was not written before sign-ins were tracked, so
+older accounts only show their use through their sessions and tokens.
+Sessions and tokens expire, so only accounts created after
+``ACCOUNT_RETENTION_TRACKED_SINCE``, the time sign-ins and activity were
+first recorded, are ever removed. Until it is set, no account is.
+
+Staff and superusers are never removed. Depending on
+``ACCOUNT_RETENTION_MODE`` an account is either anonymized (the default):
+personal fields are blanked, the password is made unusable and every token
+is revoked, but the row is kept; or deleted with its profile, linked
+identities and outstanding tokens.
+
+``AccountCleanup`` walks matching accounts in primary key order,
+``batch_size`` at a time. Each batch is re-checked and changed in its own
+short transaction, locking only rows no one else holds, with a pause
+between batches. The position reached is saved in the cache after every
+batch, so a run stopped by its time budget, a deploy or a crash resumes
+where it left off; a pass that reaches the end starts again from the
+beginning next time. Progress counters are saved alongside and returned by
+``get_progress()``.
+
+Settings:
+
+    ACCOUNT_RETENTION_TRACKED_SINCE = None     # e.g. "2026-10-01"; required
+    ACCOUNT_RETENTION_MODE = "anonymize"       # or "delete"
+    ACCOUNT_RETENTION_NEVER_USED_DAYS = 365
+    ACCOUNT_RETENTION_INACTIVE_DAYS = 30
+    ACCOUNT_RETENTION_BATCH_SIZE = 200
+    ACCOUNT_RETENTION_SLEEP = 0.5              # seconds between batches
+    ACCOUNT_RETENTION_MAX_SECONDS = 240        # budget of one scheduled run
+"""
+
+import logging
+import time
+from datetime import date, datetime, timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.db.models import PROTECT, CharField, Exists, OuterRef, Q, Value
+from django.db.models.functions import Cast, Concat
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+
+from .activity import activity_tracker
+from .caching import invalidate_user
+from .models import DeviceSession, OutboxEvent, SocialIdentity, UserProfile
+from .revocation import revoke_tokens_in_bulk
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+DELETE = "delete"
+ANONYMIZE = "anonymize"
+
+# Anonymized accounts get an address in this reserved domain.
+ANONYMIZED_DOMAIN = "anonymized.invalid"
+
+CHECKPOINT_KEY = "accounts:retention:checkpoint"
+PROGRESS_KEY = "accounts:retention:progress"
+LOCK_KEY = "accounts:retention:lock"
+STATE_TIMEOUT = 60 * 60 * 24 * 30
+
+
+def tracked_since():
+    """
+    When sign-ins and activity started being recorded, from
+    ``ACCOUNT_RETENTION_TRACKED_SINCE`` (a date, datetime or ISO string);
+    None when not set.
+    """
+    value = getattr(settings, "ACCOUNT_RETENTION_TRACKED_SINCE", None)
+    if isinstance(value, str):
+        parsed = parse_datetime(value) or parse_date(value)
+        if parsed is None:
+            raise ImproperlyConfigured(
+                f"ACCOUNT_RETENTION_TRACKED_SINCE is not a date: {value!r}"
+            )
+        value = parsed
+    if isinstance(value, date) and not isinstance(value, datetime):
+        value = datetime.combine(value, datetime.min.time())
+    if value is not None and timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return value
+
+
+def expired_accounts(now=None):
+    """Return the accounts the retention policy removes"""
+    since = tracked_since()
+    if since is None:
+        return User.objects.none()
+    now = now or timezone.now()
+    never_used = now - timedelta(
+        days=getattr(settings, "ACCOUNT_RETENTION_NEVER_USED_DAYS", 365)
+    )
+    inactive = now - timedelta(
+        days=getattr(settings, "ACCOUNT_RETENTION_INACTIVE_DAYS", 30)
+    )
+    unused = [
+        ~Exists(model.objects.filter(user=OuterRef("pk")))
+        for model in (DeviceSession, OutstandingToken, SocialIdentity)
+    ]
+    # Rows that protect a user from deletion, such as orders, show use too.
+    unused += [
+        ~Exists(
+            relation.related_model.objects.filter(
+                **{relation.field.name: OuterRef("pk")}
+            )
+        )
+        for relation in User._meta.related_objects
+        if relation.on_delete is PROTECT
+    ]
+    return User.objects.filter(
+        Q(date_joined__lt=never_used) | Q(is_active=False, date_joined__lt=inactive),
+        *unused,
+        date_joined__gte=since,
+        last_login__isnull=True,
+        last_seen__isnull=True,
+        is_staff=False,
+        is_superuser=False,
+    ).exclude(email__endswith=f"@{ANONYMIZED_DOMAIN}")
+
+
+def get_progress():
+    """Counters of the current (or last finished) pass"""
+    return cache.get(PROGRESS_KEY)
+
+
+class AccountCleanup:
+    """Removes expired accounts in small, resumable batches"""
+
+    def __init__(self, mode=None, batch_size=None, sleep=None):
+        self.mode = mode or getattr(settings, "ACCOUNT_RETENTION_MODE", ANONYMIZE)
+        if self.mode not in (DELETE, ANONYMIZE):
+            raise ValueError(f"Unknown retention mode: {self.mode!r}")
+        self.batch_size = batch_size or getattr(
+            settings, "ACCOUNT_RETENTION_BATCH_SIZE", 200
+        )
+        if sleep is None:
+            sleep = getattr(settings, "ACCOUNT_RETENTION_SLEEP", 0.5)
+        self.sleep = sleep
+
+    def run(self, max_seconds=None, max_batches=None, dry_run=False):
+        """
+        Process batches until done or a budget is spent; returns the progress,
+        or None if another run holds the lock.
+
+        With ``dry_run`` nothing is changed or saved, and the progress
+        reports how many accounts would be removed.
+        """
+        if tracked_since() is None:
+            logger.warning(
+                "ACCOUNT_RETENTION_TRACKED_SINCE is not set; no account is removed"
+            )
+        if dry_run:
+            return self._run(max_seconds, max_batches, dry_run)
+        # A lost lock expires; the checkpoint keeps the work from repeating.
+        lock_timeout = (max_seconds or 60 * 60) + 60
+        if not cache.add(LOCK_KEY, True, lock_timeout):
+            logger.info("Account cleanup is already running")
+            return None
+        try:
+            return self._run(max_seconds, max_batches, dry_run)
+        finally:
+            cache.delete(LOCK_KEY)
+
+    def _run(self, max_seconds, max_batches, dry_run):
+        started = time.monotonic()
+        last_pk = None if dry_run else cache.get(CHECKPOINT_KEY)
+        progress = (None if dry_run else get_progress()) or {}
+        if last_pk is None or not progress:
+            last_pk = 0
+            progress = {
+                "mode": self.mode,
+                "started_at": timezone.now().isoformat(),
+                "scanned": 0,
+                "removed": 0,
+                "batches": 0,
+                "last_pk": 0,
+                "finished": False,
+            }
+
+        batches = 0
+        while True:
+            ids = list(
+                expired_accounts()
+                .filter(pk__gt=last_pk)
+                .order_by("pk")
+                .values_list("pk", flat=True)[: self.batch_size]
+            )
+            if not ids:
+                progress["finished"] = True
+                break
+
+            removed = len(ids) if dry_run else self.process_batch(ids)
+            last_pk = ids[-1]
+            batches += 1
+            progress["scanned"] += len(ids)
+            progress["removed"] += removed
+            progress["batches"] += 1
+            progress["last_pk"] = last_pk
+            if not dry_run:
+                cache.set_many(
+                    {CHECKPOINT_KEY: last_pk, PROGRESS_KEY: progress}, STATE_TIMEOUT
+                )
+            logger.info(
+                "Account cleanup: %s %d of %d scanned, up to id %d",
+                self.mode,
+                progress["removed"],
+                progress["scanned"],
+                last_pk,
+            )
+
+            if len(ids) < self.batch_size:
+                progress["finished"] = True
+                break
+            if max_batches is not None and batches >= max_batches:
+                break
+            if max_seconds is not None and time.monotonic() - started >= max_seconds:
+                break
+            if self.sleep:
+                time.sleep(self.sleep)
+
+        progress["elapsed"] = round(time.monotonic() - started, 3)
+        if not dry_run:
+            if progress["finished"]:
+                # The next run starts a new pass from the beginning.
+                cache.delete(CHECKPOINT_KEY)
+            cache.set(PROGRESS_KEY, progress, STATE_TIMEOUT)
+        return progress
+
+    def process_batch(self, ids):
+        """Remove the accounts among ``ids`` that still match the policy"""
+        # Sign-ins are written to the user row in batches; skip anyone whose
+        # latest activity is still pending.
+        pending = activity_tracker.get_last_activity(ids)
+        ids = [user_id for user_id in ids if not any(pending.get(user_id, {}).values())]
+        if not ids:
+            return 0
+
+        with transaction.atomic():
+            # Rows in use elsewhere are skipped and picked up by a later pass.
+            ids = list(
+                expired_accounts()
+                .filter(pk__in=ids)
+                .select_for_update(skip_locked=True)
+                .values_list("pk", flat=True)
+            )
+            if not ids:
+                return 0
+            if self.mode == DELETE:
+                self._delete(ids)
+            else:
+                self._anonymize(ids)
+            OutboxEvent.objects.create(
+                event_type=OutboxEvent.USERS_BULK_UPDATED,
+                aggregate_id=ids[0],
+                payload={"action": self.mode, "changes": {}, "user_ids": ids},
+            )
+        return len(ids)
+
+    def _delete(self, ids):
+        # Dependent rows first, each with one set-based DELETE.
+        OutstandingToken.objects.filter(user_id__in=ids).delete()
+        DeviceSession.objects.filter(user_id__in=ids).delete()
+        SocialIdentity.objects.filter(user_id__in=ids).delete()
+        UserProfile.objects.filter(user_id__in=ids).delete()
+        User.objects.filter(pk__in=ids).delete()
+        for user_id in ids:
+            invalidate_user(user_id)
+
+    def _anonymize(self, ids):
+        OutstandingToken.objects.filter(user_id__in=ids).delete()
+        DeviceSession.objects.filter(user_id__in=ids).delete()
+        SocialIdentity.objects.filter(user_id__in=ids).delete()
+        UserProfile.objects.filter(user_id__in=ids).update(
+            bio="", profile_picture="", phone_number="", address=""
+        )
+        User.objects.filter(pk__in=ids).update(
+            # Unique, so the original address can be registered again.
+            email=Concat(
+                Value("deleted-"),
+                Cast("pk", CharField()),
+                Value(f"@{ANONYMIZED_DOMAIN}"),
+            ),
+            first_name="",
+            last_name="",
+            is_active=False,
+            password=make_password(None),
+        )
+        revoke_tokens_in_bulk(ids)
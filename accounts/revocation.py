@@ -0,0 +1,102 @@
+"""
+Token revocation without per-token blacklisting.
+
+Every token carries the user's ``token_generation`` in the ``gen`` claim and,
+when issued for a signed-in device, a ``sid`` claim naming its
+``DeviceSession``. Revoking all of a user's tokens is a single increment of
+the generation; revoking one device marks its session. Validation reads the
+current generation and the session's revoked flag from the cache in one
+round trip and only falls back to the database on a miss.
+"""
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings
+
+from .caching import invalidate_user, invalidate_users
+
+User = get_user_model()
+
+GENERATION_CLAIM = "gen"
+SESSION_CLAIM = "sid"
+
+GENERATION_CACHE_TIMEOUT = 60 * 60
+
+
+def _generation_key(user_id):
+    return f"accounts:token-generation:{user_id}"
+
+
+def _revoked_session_key(session_id):
+    return f"accounts:revoked-session:{session_id}"
+
+
+def get_revocation_state(user_id, session_id=None):
+    """
+    Return the user's current token generation (None if the user does not
+    exist) and whether the given device session has been revoked.
+    """
+    generation_key = _generation_key(user_id)
+    keys = [generation_key]
+    if session_id:
+        keys.append(_revoked_session_key(session_id))
+    cached = cache.get_many(keys)
+
+    generation = cached.get(generation_key)
+    if generation is None:
+        generation = (
+            User.objects.filter(**{api_settings.USER_ID_FIELD: user_id})
+            .values_list("token_generation", flat=True)
+            .first()
+        )
+        if generation is not None:
+            cache.set(generation_key, generation, GENERATION_CACHE_TIMEOUT)
+
+    session_revoked = bool(session_id) and _revoked_session_key(session_id) in cached
+    return generation, session_revoked
+
+
+def get_revoked_sessions(session_ids):
+    """Return the subset of the given session ids that have been revoked"""
+    keys = {_revoked_session_key(session_id): session_id for session_id in session_ids}
+    return {keys[key] for key in cache.get_many(list(keys))}
+
+
+def revoke_all_tokens(user):
+    """Invalidate every token issued to the user so far"""
+    User.objects.filter(pk=user.pk).update(token_generation=F("token_generation") + 1)
+    user.refresh_from_db(fields=["token_generation"])
+
+    generation_key = _generation_key(getattr(user, api_settings.USER_ID_FIELD))
+    cache.delete(generation_key)
+    # update() skips the post_save receivers that keep the user cache fresh.
+    invalidate_user(user.pk)
+    # A concurrent reader may have cached the old value before the commit.
+    transaction.on_commit(lambda: cache.delete(generation_key))
+
+
+def revoke_tokens_in_bulk(user_ids):
+    """Invalidate every token issued to the given users, with one UPDATE"""
+    users = User.objects.filter(pk__in=user_ids)
+    users.update(token_generation=F("token_generation") + 1)
+    generation_keys = [
+        _generation_key(user_id)
+        for user_id in users.values_list(api_settings.USER_ID_FIELD, flat=True)
+    ]
+    cache.delete_many(generation_keys)
+    invalidate_users(user_ids)
+    transaction.on_commit(lambda: cache.delete_many(generation_keys))
+
+
+def revoke_session(session):
+    """Invalidate the tokens of a single device session"""
+    session.revoked_at = timezone.now()
+    session.save(update_fields=["revoked_at"])
+    cache.set(
+        _revoked_session_key(session.session_id),
+        True,
+        int(api_settings.REFRESH_TOKEN_LIFETIME.total_seconds()),
+    )
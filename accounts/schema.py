@@ -0,0 +1,87 @@
+import graphene
+from django.conf import settings
+from graphene_django import DjangoObjectType
+
+from .loaders import get_loaders
+from .models import CustomUser, UserProfile
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = getattr(settings, "GRAPHQL_MAX_PAGE_SIZE", 100)
+
+
+class UserProfileType(DjangoObjectType):
+    user = graphene.Field(lambda: UserType)
+
+    class Meta:
+        model = UserProfile
+        fields = ["id", "bio", "profile_picture", "phone_number", "address"]
+
+    def resolve_user(profile, info):
+        return get_loaders(info.context).users.load(profile.user_id)
+
+
+class UserType(DjangoObjectType):
+    profile = graphene.Field(UserProfileType)
+
+    class Meta:
+        model = CustomUser
+        fields = [
+            "id",
+            "email",
+            "first_name",
+            "last_name",
+            "role",
+            "is_active",
+            "date_joined",
+        ]
+
+    def resolve_profile(user, info):
+        return get_loaders(info.context).profiles_by_user.load(user.pk)
+
+
+def paginate(queryset, first, offset):
+    first = max(0, min(first, MAX_PAGE_SIZE))
+    offset = max(0, offset)
+    return list(queryset[offset:][:first])
+
+
+class Query(graphene.ObjectType):
+    users = graphene.List(
+        graphene.NonNull(UserType),
+        first=graphene.Int(default_value=DEFAULT_PAGE_SIZE),
+        offset=graphene.Int(default_value=0),
+        role=graphene.String(),
+        is_active=graphene.Boolean(),
+    )
+    user = graphene.Field(UserType, id=graphene.ID(required=True))
+    profiles = graphene.List(
+        graphene.NonNull(UserProfileType),
+        first=graphene.Int(default_value=DEFAULT_PAGE_SIZE),
+        offset=graphene.Int(default_value=0),
+    )
+
+    def resolve_users(root, info, first, offset, role=None, is_active=None):
+        queryset = CustomUser.objects.order_by("id")
+        if role is not None:
+            queryset = queryset.filter(role=role)
+        if is_active is not None:
+            queryset = queryset.filter(is_active=is_active)
+        users = paginate(queryset, first, offset)
+
+        loaders = get_loaders(info.context)
+        for user in users:
+            loaders.users.prime(user.pk, user)
+        loaders.profiles_by_user.enqueue(user.pk for user in users)
+        return users
+
+    def resolve_user(root, info, id):
+        return get_loaders(info.context).users.load(int(id))
+
+    def resolve_profiles(root, info, first, offset):
+        profiles = paginate(UserProfile.objects.order_by("id"), first, offset)
+
+        loaders = get_loaders(info.context)
+        for profile in profiles:
+            loaders.profiles_by_user.prime(profile.user_id, profile)
+        loaders.users.enqueue(profile.user_id for profile in profiles)
+        return profiles
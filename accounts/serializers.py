@@ -1,8 +1,17 @@
+from django.conf import settings
 from django.contrib.auth import authenticate
 from django.contrib.auth.password_validation import validate_password
+from django.contrib.auth.tokens import default_token_generator
+from django.utils.encoding import force_str
+from django.utils.http import urlsafe_base64_decode
 from rest_framework import serializers
+from rest_framework_simplejwt import serializers as jwt_serializers
 
-from .models import CustomUser, UserProfile
+from . import bulk
+from .breached_passwords import BreachedPasswordValidator, is_password_breached
+from .models import CustomUser, DeviceSession, UserProfile
+from .revocation import SESSION_CLAIM, revoke_all_tokens
+from .tokens import RefreshToken
 
 
 def validate_password_strength(value):
@@ -15,6 +24,12 @@ def validate_password_strength(value):
         raise serializers.ValidationError("Password cannot be entirely numeric.")
 
 
+def validate_password_not_breached(value):
+    """Validate that the password is not in the local breached-password corpus"""
+    if is_password_breached(value):
+        raise serializers.ValidationError(BreachedPasswordValidator.message)
+
+
 class UserProfileSerializer(serializers.ModelSerializer):
     class Meta:
         model = UserProfile
@@ -26,7 +41,11 @@ class RegistrationSerializer(serializers.ModelSerializer):
         write_only=True,
         required=True,
         style={"input_type": "password"},
-        validators=[validate_password, validate_password_strength],
+        validators=[
+            validate_password,
+            validate_password_strength,
+            validate_password_not_breached,
+        ],
         min_length=8,
     )
     password2 = serializers.CharField(
@@ -51,9 +70,8 @@ class RegistrationSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         validated_data.pop("password2")
-        user = CustomUser.objects.create_user(**validated_data)
-        UserProfile.objects.create(user=user)
-        return user
+        # accounts.signals creates the profile.
+        return CustomUser.objects.create_user(**validated_data)
 
 
 class LoginSerializer(serializers.Serializer):
@@ -101,7 +119,11 @@ class ChangePasswordSerializer(serializers.Serializer):
         write_only=True,
         required=True,
         style={"input_type": "password"},
-        validators=[validate_password, validate_password_strength],
+        validators=[
+            validate_password,
+            validate_password_strength,
+            validate_password_not_breached,
+        ],
         min_length=8,
     )
     new_password2 = serializers.CharField(
@@ -131,6 +153,7 @@ class ChangePasswordSerializer(serializers.Serializer):
         user = self.context["request"].user
         user.set_password(self.validated_data["new_password"])
         user.save()
+        revoke_all_tokens(user)
         return user
 
 
@@ -148,7 +171,11 @@ class PasswordResetConfirmSerializer(serializers.Serializer):
         write_only=True,
         required=True,
         style={"input_type": "password"},
-        validators=[validate_password, validate_password_strength],
+        validators=[
+            validate_password,
+            validate_password_strength,
+            validate_password_not_breached,
+        ],
         min_length=8,
     )
     password2 = serializers.CharField(
@@ -161,8 +188,27 @@ class PasswordResetConfirmSerializer(serializers.Serializer):
     def validate(self, data):
         if data["password"] != data["password2"]:
             raise serializers.ValidationError({"password": "Passwords didn't match."})
+
+        try:
+            uid = force_str(urlsafe_base64_decode(self.context["uidb64"]))
+            user = CustomUser.objects.get(pk=uid)
+        except (TypeError, ValueError, OverflowError, CustomUser.DoesNotExist):
+            user = None
+        if user is None or not default_token_generator.check_token(
+            user, self.context["token"]
+        ):
+            raise serializers.ValidationError("Invalid or expired reset link.")
+
+        data["user"] = user
         return data
 
+    def save(self, **kwargs):
+        user = self.validated_data["user"]
+        user.set_password(self.validated_data["password"])
+        user.save()
+        revoke_all_tokens(user)
+        return user
+
 
 class GoogleAuthSerializer(serializers.Serializer):
     """Serializer for Google OAuth authentication"""
@@ -184,3 +230,100 @@ class GoogleCallbackSerializer(serializers.Serializer):
         if not value:
             raise serializers.ValidationError("Authorization code is required.")
         return value
+
+
+class DeviceSessionSerializer(serializers.ModelSerializer):
+    current = serializers.SerializerMethodField()
+
+    class Meta:
+        model = DeviceSession
+        fields = [
+            "session_id",
+            "user_agent",
+            "ip_address",
+            "created_at",
+            "expires_at",
+            "current",
+        ]
+
+    def get_current(self, obj):
+        token = self.context["request"].auth
+        return token is not None and token.get(SESSION_CLAIM) == obj.session_id
+
+
+class TokenRefreshSerializer(jwt_serializers.TokenRefreshSerializer):
+    """Refresh serializer using the accounts signing keys"""
+
+    token_class = RefreshToken
+
+
+class TokenBlacklistSerializer(jwt_serializers.TokenBlacklistSerializer):
+    """Blacklist serializer using the accounts signing keys"""
+
+    token_class = RefreshToken
+
+
+class TokenIntrospectionSerializer(serializers.Serializer):
+    """Serializer for batch token introspection"""
+
+    tokens = serializers.ListField(
+        child=serializers.CharField(),
+        allow_empty=False,
+        max_length=getattr(settings, "TOKEN_INTROSPECTION_MAX_BATCH", 500),
+    )
+
+
+class BulkUserFilterSerializer(serializers.Serializer):
+    """Criteria selecting the users of a bulk action"""
+
+    role = serializers.ChoiceField(choices=CustomUser.ROLES_CHOICES, required=False)
+    is_active = serializers.BooleanField(required=False)
+    email_domain = serializers.CharField(required=False)
+    joined_before = serializers.DateTimeField(required=False)
+    last_seen_before = serializers.DateTimeField(required=False)
+
+    def to_lookups(self, data):
+        """Return queryset lookups for validated criteria"""
+        lookups = {}
+        if "role" in data:
+            lookups["role"] = data["role"]
+        if "is_active" in data:
+            lookups["is_active"] = data["is_active"]
+        if "email_domain" in data:
+            lookups["email__iendswith"] = "@" + data["email_domain"].lstrip("@")
+        if "joined_before" in data:
+            lookups["date_joined__lt"] = data["joined_before"]
+        if "last_seen_before" in data:
+            lookups["last_seen__lt"] = data["last_seen_before"]
+        return lookups
+
+
+class BulkUserActionSerializer(serializers.Serializer):
+    """Serializer for staff bulk changes to users"""
+
+    action = serializers.ChoiceField(choices=bulk.ACTIONS)
+    role = serializers.ChoiceField(choices=CustomUser.ROLES_CHOICES, required=False)
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        required=False,
+        allow_empty=False,
+        max_length=getattr(settings, "BULK_USER_ACTION_MAX_IDS", 10000),
+    )
+    filters = BulkUserFilterSerializer(required=False)
+
+    def validate(self, data):
+        if data["action"] == bulk.SET_ROLE and "role" not in data:
+            raise serializers.ValidationError({"role": "Required for set_role."})
+        if not data.get("ids") and not data.get("filters"):
+            raise serializers.ValidationError("Select users with ids, filters or both.")
+        return data
+
+    def get_queryset(self):
+        """Return the selected users, never including the requesting user"""
+        queryset = CustomUser.objects.all()
+        if "ids" in self.validated_data:
+            queryset = queryset.filter(pk__in=self.validated_data["ids"])
+        if self.validated_data.get("filters"):
+            lookups = self.fields["filters"].to_lookups(self.validated_data["filters"])
+            queryset = queryset.filter(**lookups)
+        return queryset.exclude(pk=self.context["request"].user.pk)
@@ -8,18 +8,18 @@ User = get_user_model()
 
 
 @receiver(post_save, sender=User)
-def create_user_profile(sender, instance, created, **kwargs):
+def create_user_profile(sender, instance, created, using, **kwargs):
     """
     Create a UserProfile when a new CustomUser is created
     """
     if created:
-        UserProfile.objects.create(user=instance)
+        UserProfile.objects.using(using).create(user=instance)
 
 
 @receiver(post_save, sender=User)
 def save_user_profile(sender, instance, **kwargs):
     """
-    Save the user profile when the user is saved
+    Save the user profile when the user is saved, if it has unsaved changes
     """
-    if hasattr(instance, "userprofile"):
+    if hasattr(instance, "userprofile") and instance.userprofile.get_dirty_fields():
         instance.userprofile.save()
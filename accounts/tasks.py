@@ -0,0 +1,49 @@
+from celery import shared_task
+from django.conf import settings
+
+from .activity import activity_tracker
+from .audit import write_auth_events_batch
+
+
+@shared_task(ignore_result=True)
+def write_auth_events(batch):
+    """Insert a batch of audit events queued by accounts.audit"""
+    write_auth_events_batch(batch)
+
+
+@shared_task(ignore_result=True)
+def flush_user_activity():
+    """Write pending last-login and last-seen timestamps to the database"""
+    activity_tracker.flush()
+
+
+@shared_task(ignore_result=True)
+def relay_outbox(max_batches=50):
+    """
+    Publish pending user lifecycle events; schedule with celery beat. Runs
+    do not overlap, as two would publish a user's events out of order.
+    """
+    from .outbox import OutboxRelay, drain_alone, get_publisher
+
+    relay = OutboxRelay(
+        get_publisher(), batch_size=getattr(settings, "OUTBOX_BATCH_SIZE", 100)
+    )
+    drain_alone(relay, max_batches=max_batches)
+
+
+@shared_task(ignore_result=True)
+def purge_outbox():
+    """Delete published outbox rows past OUTBOX_RETENTION_DAYS"""
+    from .outbox import purge_published
+
+    purge_published()
+
+
+@shared_task(ignore_result=True)
+def cleanup_inactive_accounts():
+    """Remove accounts expired under the retention policy, resuming each run"""
+    from .retention import AccountCleanup
+
+    AccountCleanup().run(
+        max_seconds=getattr(settings, "ACCOUNT_RETENTION_MAX_SECONDS", 240)
+    )
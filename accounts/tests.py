@@ -1,10 +1,55 @@
+import hashlib
+import io
+import ipaddress
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+import unittest
+from datetime import timedelta
+from unittest import mock
+
+import jwt
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.contrib.auth.password_validation import validate_password
+from django.contrib.auth.tokens import default_token_generator
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.core.management import CommandError, call_command
+from django.db import connection, router, transaction
+from django.test import (RequestFactory, TestCase, modify_settings,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
 from rest_framework import status
 from rest_framework.test import APIClient
+from rest_framework_simplejwt import authentication as jwt_authentication
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
 from rest_framework_simplejwt.tokens import RefreshToken
 
-from .models import UserProfile
+from e_commerce_api import replicas, testing, tiered_cache
+from e_commerce_api.idempotency import (IdempotencyStore, IdempotentMixin,
+                                        request_scope)
+from e_commerce_api.tiered_cache import TieredCache
+from loadtest.fake_google import FakeGoogleProvider
+
+from . import (activity, audit, bulk, factories, geoip, google_oauth, outbox,
+               retention, tokens, views)
+from .authentication import CachedJWTAuthentication
+from .breached_passwords import BreachedPasswordFile
+from .caching import user_cache, user_payload_cache
+from .factories import make_user
+from .google_oauth import GoogleAuthHandler, google_certs_cache
+from .models import (AuthEvent, DeviceSession, OutboxEvent, SocialIdentity,
+                     UserProfile)
+from .revocation import revoke_all_tokens
+from .verifier import InvalidToken, TokenVerifier
 
 User = get_user_model()
 
@@ -70,12 +115,7 @@ class RegistrationTests(TestCase):
 
     def test_registration_duplicate_email(self):
         """Test registration with duplicate email"""
-        User.objects.create_user(
-            email="existing@example.com",
-            password="testpass123",
-            first_name="Existing",
-            last_name="User",
-        )
+        make_user("existing@example.com", password="testpass123", first_name="Existing")
         data = {
             "email": "existing@example.com",
             "first_name": "Test",
@@ -104,15 +144,13 @@ class RegistrationTests(TestCase):
 class LoginTests(TestCase):
     """Tests for user login endpoint"""
 
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user("testuser@example.com", password="testpass123")
+
     def setUp(self):
         self.client = APIClient()
         self.login_url = "/api/v1/accounts/login/"
-        self.user = User.objects.create_user(
-            email="testuser@example.com",
-            password="testpass123",
-            first_name="Test",
-            last_name="User",
-        )
 
     def test_successful_login(self):
         """Test successful user login"""
@@ -153,15 +191,13 @@ class LoginTests(TestCase):
 class LogoutTests(TestCase):
     """Tests for user logout endpoint"""
 
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user("testuser@example.com", password="testpass123")
+
     def setUp(self):
         self.client = APIClient()
         self.logout_url = "/api/v1/accounts/logout/"
-        self.user = User.objects.create_user(
-            email="testuser@example.com",
-            password="testpass123",
-            first_name="Test",
-            last_name="User",
-        )
         self.refresh_token = RefreshToken.for_user(self.user)
 
     def test_successful_logout(self):
@@ -182,15 +218,13 @@ class LogoutTests(TestCase):
 class UserDetailTests(TestCase):
     """Tests for user detail endpoint"""
 
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user("testuser@example.com", password="testpass123")
+
     def setUp(self):
         self.client = APIClient()
         self.user_url = "/api/v1/accounts/user/"
-        self.user = User.objects.create_user(
-            email="testuser@example.com",
-            password="testpass123",
-            first_name="Test",
-            last_name="User",
-        )
 
     def test_get_user_details(self):
         """Test retrieving user details"""
@@ -213,19 +247,59 @@ class UserDetailTests(TestCase):
         self.user.refresh_from_db()
         self.assertEqual(self.user.first_name, "Updated")
 
+    def test_update_writes_only_changed_fields(self):
+        """Test that an update writes one UPDATE of the changed columns"""
+        self.client.force_authenticate(user=self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.put(
+                self.user_url, {"first_name": "Updated"}, format="json"
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        updates = [q["sql"] for q in queries if q["sql"].startswith("UPDATE")]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('"first_name"', updates[0])
+        self.assertNotIn('"email"', updates[0])
+        self.assertNotIn('"password"', updates[0])
+
+    def test_unchanged_update_skips_write(self):
+        """Test that an update that changes nothing issues no write"""
+        self.client.force_authenticate(user=self.user)
+        with self.assertNumQueries(0):
+            response = self.client.put(
+                self.user_url, {"first_name": "Test", "role": "user"}, format="json"
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_dirty_fields_tracked(self):
+        """Test change tracking across loads, saves and refreshes"""
+        user = User.objects.get(pk=self.user.pk)
+        self.assertEqual(user.get_dirty_fields(), [])
+        user.last_name = "Changed"
+        self.assertEqual(user.get_dirty_fields(), ["last_name"])
+        with mock.patch("django.db.models.signals.post_save.send") as post_save:
+            user.save()
+        self.assertEqual(
+            set(post_save.call_args.kwargs["update_fields"]), {"last_name"}
+        )
+        self.assertEqual(user.get_dirty_fields(), [])
+
+        User.objects.filter(pk=user.pk).update(first_name="Elsewhere")
+        user.refresh_from_db(fields=["first_name"])
+        self.assertEqual(user.get_dirty_fields(), [])
+        with self.assertNumQueries(0):
+            user.save()
+
 
 class ChangePasswordTests(TestCase):
     """Tests for change password endpoint"""
 
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user("testuser@example.com", password="oldpassword123")
+
     def setUp(self):
         self.client = APIClient()
         self.change_password_url = "/api/v1/accounts/password/change/"
-        self.user = User.objects.create_user(
-            email="testuser@example.com",
-            password="oldpassword123",
-            first_name="Test",
-            last_name="User",
-        )
 
     def test_successful_password_change(self):
         """Test successful password change"""
@@ -285,15 +359,13 @@ class ChangePasswordTests(TestCase):
 class PasswordResetTests(TestCase):
     """Tests for password reset endpoints"""
 
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user("testuser@example.com", password="testpass123")
+
     def setUp(self):
         self.client = APIClient()
         self.reset_request_url = "/api/v1/accounts/password/reset/"
-        self.user = User.objects.create_user(
-            email="testuser@example.com",
-            password="testpass123",
-            first_name="Test",
-            last_name="User",
-        )
 
     def test_password_reset_request_valid_email(self):
         """Test password reset request with valid email"""
@@ -311,15 +383,13 @@ class PasswordResetTests(TestCase):
 class UserProfileTests(TestCase):
     """Tests for user profile endpoint"""
 
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user("testuser@example.com", password="testpass123")
+
     def setUp(self):
         self.client = APIClient()
         self.profile_url = "/api/v1/accounts/user/profile/"
-        self.user = User.objects.create_user(
-            email="testuser@example.com",
-            password="testpass123",
-            first_name="Test",
-            last_name="User",
-        )
 
     def test_get_user_profile(self):
         """Test retrieving user profile"""
@@ -336,8 +406,1940 @@ class UserProfileTests(TestCase):
         self.user.userprofile.refresh_from_db()
         self.assertEqual(self.user.userprofile.bio, "Test bio")
 
+    def test_profile_update_writes_only_changed_fields(self):
+        """Test that a profile update writes only the changed columns"""
+        UserProfile.objects.filter(user=self.user).update(bio="Old bio")
+        self.client.force_authenticate(user=User.objects.get(pk=self.user.pk))
+        with CaptureQueriesContext(connection) as queries:
+            self.client.put(self.profile_url, {"bio": "New bio"}, format="json")
+        updates = [q["sql"] for q in queries if q["sql"].startswith("UPDATE")]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('"bio"', updates[0])
+        self.assertNotIn('"address"', updates[0])
+
+        self.client.force_authenticate(user=User.objects.get(pk=self.user.pk))
+        # Reading the profile is the only query when nothing changes.
+        with self.assertNumQueries(1):
+            self.client.put(self.profile_url, {"bio": "New bio"}, format="json")
+
     def test_update_profile_unauthorized(self):
         """Test updating profile without authentication"""
         data = {"bio": "Test bio"}
         response = self.client.put(self.profile_url, data, format="json")
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+def generate_private_key_pem(algorithm="RS256"):
+    if algorithm == "EdDSA":
+        key = ed25519.Ed25519PrivateKey.generate()
+    else:
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    return key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption(),
+    ).decode()
+
+
+RSA_KEY = generate_private_key_pem("RS256")
+ED_KEY = generate_private_key_pem("EdDSA")
+
+
+@override_settings(
+    JWT_SIGNING_KEYS=[
+        {"kid": "new", "algorithm": "RS256", "private_key": RSA_KEY},
+        {"kid": "old", "algorithm": "EdDSA", "private_key": ED_KEY},
+    ]
+)
+class AsymmetricSigningTests(TestCase):
+    """Tests for key-ring signed tokens and the JWKS endpoint"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user("testuser@example.com", password="testpass123")
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.jwks_url = "/.well-known/jwks.json"
+
+    def test_jwks_publishes_every_key(self):
+        """Test that the JWKS endpoint lists all keys and is cacheable"""
+        response = self.client.get(self.jwks_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        kids = [key["kid"] for key in response.data["keys"]]
+        self.assertEqual(kids, ["new", "old"])
+        self.assertNotIn("d", response.data["keys"][0])
+        self.assertIn("public", response["Cache-Control"])
+
+    def test_login_token_signed_with_active_key(self):
+        """Test that login issues tokens signed with the first key"""
+        data = {"email": "testuser@example.com", "password": "testpass123"}
+        response = self.client.post("/api/v1/accounts/login/", data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        header = jwt.get_unverified_header(response.data["access"])
+        self.assertEqual(header, {"alg": "RS256", "kid": "new", "typ": "JWT"})
+
+    def test_token_signed_with_rotated_key_still_refreshes(self):
+        """Test that tokens signed with an older key keep verifying"""
+        with override_settings(
+            JWT_SIGNING_KEYS=[
+                {"kid": "old", "algorithm": "EdDSA", "private_key": ED_KEY}
+            ]
+        ):
+            refresh = str(tokens.RefreshToken.for_user(self.user))
+        response = self.client.post(
+            "/api/v1/accounts/token/refresh/", {"refresh": refresh}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            jwt.get_unverified_header(response.data["access"])["kid"], "new"
+        )
+
+    def test_unknown_kid_rejected(self):
+        """Test that a token naming a key outside the ring is rejected"""
+        forged = jwt.encode(
+            {"token_type": "refresh", "user_id": str(self.user.id)},
+            generate_private_key_pem("RS256"),
+            algorithm="RS256",
+            headers={"kid": "forged"},
+        )
+        response = self.client.post(
+            "/api/v1/accounts/token/refresh/", {"refresh": forged}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_verifier_validates_locally(self):
+        """Test the downstream verifier against the published key set"""
+        jwks = self.client.get(self.jwks_url).json()
+        access = str(tokens.RefreshToken.for_user(self.user).access_token)
+        verifier = TokenVerifier("https://accounts.invalid/.well-known/jwks.json")
+        with mock.patch(
+            "jwt.jwks_client.urllib.request.urlopen",
+            side_effect=lambda *args, **kwargs: io.BytesIO(json.dumps(jwks).encode()),
+        ) as urlopen:
+            claims = verifier.verify(access)
+            verifier.verify(access)
+        self.assertEqual(claims["user_id"], str(self.user.id))
+        self.assertEqual(urlopen.call_count, 1)
+
+    def test_verifier_rejects_refresh_token(self):
+        """Test that the verifier only accepts access tokens by default"""
+        jwks = self.client.get(self.jwks_url).json()
+        refresh = str(tokens.RefreshToken.for_user(self.user))
+        verifier = TokenVerifier("https://accounts.invalid/.well-known/jwks.json")
+        with mock.patch.object(verifier._jwks_client, "fetch_data", return_value=jwks):
+            with self.assertRaises(InvalidToken):
+                verifier.verify(refresh)
+
+
+@override_settings(INTERNAL_SERVICE_TOKENS=["service-secret"])
+class TokenIntrospectionTests(TestCase):
+    """Tests for the batch token introspection endpoint"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            make_user(f"user{i}@example.com", password="testpass123") for i in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.introspect_url = "/api/v1/accounts/token/introspect/"
+
+    def introspect(self, raw_tokens, service_token="service-secret"):
+        return self.client.post(
+            self.introspect_url,
+            {"tokens": raw_tokens},
+            format="json",
+            HTTP_X_SERVICE_TOKEN=service_token,
+        )
+
+    def test_introspection_requires_service_token(self):
+        """Test that callers without a valid service token are rejected"""
+        response = self.introspect(["abc"], service_token="wrong")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_batch_resolved_with_two_queries(self):
+        """Test that a batch costs one user query and one blacklist query"""
+        refresh_tokens = [tokens.RefreshToken.for_user(user) for user in self.users]
+        refresh_tokens[1].blacklist()
+        raw_tokens = [str(token) for token in refresh_tokens]
+        raw_tokens += [str(token.access_token) for token in refresh_tokens]
+        raw_tokens.append("not-a-token")
+
+        with self.assertNumQueries(2):
+            response = self.introspect(raw_tokens)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data["results"]
+        self.assertEqual(len(results), 7)
+        self.assertTrue(results[0]["valid"])
+        self.assertEqual(results[0]["user_id"], str(self.users[0].id))
+        self.assertEqual(results[0]["role"], "user")
+        self.assertEqual(results[0]["token_type"], "refresh")
+        self.assertFalse(results[1]["valid"])
+        self.assertTrue(results[1]["revoked"])
+        self.assertTrue(results[4]["valid"])
+        self.assertEqual(results[4]["token_type"], "access")
+        self.assertFalse(results[6]["valid"])
+        self.assertEqual(results[6]["error"], "Token is invalid")
+
+    def test_revoked_generation_reported(self):
+        """Test that tokens issued before a revoke-all are reported revoked"""
+        raw_token = str(tokens.RefreshToken.for_user(self.users[0]))
+        revoke_all_tokens(self.users[0])
+        result = self.introspect([raw_token]).data["results"][0]
+        self.assertFalse(result["valid"])
+        self.assertTrue(result["revoked"])
+
+    def test_inactive_user_token_invalid(self):
+        """Test that tokens of inactive users are reported invalid"""
+        raw_token = str(tokens.RefreshToken.for_user(self.users[0]).access_token)
+        self.users[0].is_active = False
+        self.users[0].save()
+        response = self.introspect([raw_token])
+        self.assertFalse(response.data["results"][0]["valid"])
+        self.assertEqual(response.data["results"][0]["error"], "User is inactive")
+
+    def test_empty_batch_rejected(self):
+        """Test that an empty token list is a validation error"""
+        response = self.introspect([])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@mock.patch.object(
+    jwt_authentication.api_settings, "AUTH_TOKEN_CLASSES", (tokens.AccessToken,)
+)
+class DeviceSessionTests(TestCase):
+    """Tests for device listing and token revocation"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user("testuser@example.com", password="oldpassword123")
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.login_url = "/api/v1/accounts/login/"
+        self.devices_url = "/api/v1/accounts/devices/"
+
+    def login(self, user_agent="test-agent"):
+        data = {"email": "testuser@example.com", "password": "oldpassword123"}
+        response = self.client.post(
+            self.login_url, data, format="json", HTTP_USER_AGENT=user_agent
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def get_devices(self, access):
+        return self.client.get(self.devices_url, HTTP_AUTHORIZATION=f"Bearer {access}")
+
+    def test_login_creates_device_session(self):
+        """Test that each login shows up as a device"""
+        self.login("phone")
+        tokens_ = self.login("laptop")
+        response = self.get_devices(tokens_["access"])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([d["user_agent"] for d in response.data], ["laptop", "phone"])
+        self.assertEqual([d["current"] for d in response.data], [True, False])
+
+    def test_revoke_all_invalidates_every_token(self):
+        """Test that revoke-all is a single increment rejecting old tokens"""
+        phone = self.login("phone")
+        laptop = self.login("laptop")
+        with self.assertNumQueries(2):
+            revoke_all_tokens(self.user)
+        self.assertEqual(self.get_devices(phone["access"]).status_code, 401)
+        self.assertEqual(self.get_devices(laptop["access"]).status_code, 401)
+        response = self.client.post(
+            "/api/v1/accounts/token/refresh/",
+            {"refresh": laptop["refresh"]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_revoke_single_device(self):
+        """Test that revoking one device leaves the others signed in"""
+        phone = self.login("phone")
+        laptop = self.login("laptop")
+        session = DeviceSession.objects.get(user_agent="phone")
+        response = self.client.delete(
+            f"{self.devices_url}{session.session_id}/",
+            HTTP_AUTHORIZATION=f"Bearer {laptop['access']}",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.get_devices(phone["access"]).status_code, 401)
+        self.assertEqual(self.get_devices(laptop["access"]).status_code, 200)
+
+        cache.clear()
+        response = self.client.post(
+            "/api/v1/accounts/token/refresh/",
+            {"refresh": phone["refresh"]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_change_password_signs_out_other_devices(self):
+        """Test that changing the password revokes existing sessions"""
+        phone = self.login("phone")
+        laptop = self.login("laptop")
+        data = {
+            "old_password": "oldpassword123",
+            "new_password": "newpassword123",
+            "new_password2": "newpassword123",
+        }
+        response = self.client.post(
+            "/api/v1/accounts/password/change/",
+            data,
+            format="json",
+            HTTP_AUTHORIZATION=f"Bearer {laptop['access']}",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.get_devices(phone["access"]).status_code, 401)
+        self.assertEqual(self.get_devices(response.data["access"]).status_code, 200)
+
+    def test_password_reset_confirm_revokes_tokens(self):
+        """Test that a confirmed password reset revokes existing sessions"""
+        phone = self.login("phone")
+        uidb64 = urlsafe_base64_encode(force_bytes(self.user.pk))
+        token = default_token_generator.make_token(self.user)
+        data = {"password": "resetpassword123", "password2": "resetpassword123"}
+        response = self.client.post(
+            f"/api/v1/accounts/password/reset/confirm/{uidb64}/{token}/",
+            data,
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.get_devices(phone["access"]).status_code, 401)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password("resetpassword123"))
+
+    def test_password_reset_confirm_invalid_token(self):
+        """Test that a forged reset link is rejected"""
+        uidb64 = urlsafe_base64_encode(force_bytes(self.user.pk))
+        data = {"password": "resetpassword123", "password2": "resetpassword123"}
+        response = self.client.post(
+            f"/api/v1/accounts/password/reset/confirm/{uidb64}/bad-token/",
+            data,
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class GoogleAccountUpsertTests(TestCase):
+    """Tests for the Google account upsert keyed on the subject"""
+
+    def setUp(self):
+        cache.clear()
+        self.google_user = {
+            "sub": "1234567890",
+            "email": "googleuser@example.com",
+            "email_verified": True,
+            "given_name": "Google",
+            "family_name": "User",
+        }
+
+    def test_first_login_creates_user_profile_and_identity(self):
+        """Test that a first Google login creates every related row"""
+        user, created = GoogleAuthHandler.get_or_create_user(self.google_user)
+        self.assertTrue(created)
+        self.assertEqual(user.email, "googleuser@example.com")
+        self.assertFalse(user.has_usable_password())
+        self.assertTrue(UserProfile.objects.filter(user=user).exists())
+        self.assertTrue(
+            SocialIdentity.objects.filter(
+                user=user, provider="google", subject="1234567890"
+            ).exists()
+        )
+
+    def test_first_login_publishes_user_created(self):
+        """Test that a Google sign-up writes one user.created event"""
+        user, _ = GoogleAuthHandler.get_or_create_user(self.google_user)
+        cache.clear()
+        GoogleAuthHandler.get_or_create_user(self.google_user)
+        GoogleAuthHandler._create_identity(self.google_user)
+        event = OutboxEvent.objects.get(aggregate_id=user.pk)
+        self.assertEqual(event.event_type, OutboxEvent.USER_CREATED)
+        self.assertEqual(event.payload["email"], "googleuser@example.com")
+        self.assertEqual(event.payload["first_name"], "Google")
+
+    def test_repeat_login_is_one_lookup(self):
+        """Test that a cached repeat login costs a single query"""
+        user, _ = GoogleAuthHandler.get_or_create_user(self.google_user)
+        with self.assertNumQueries(1):
+            again, created = GoogleAuthHandler.get_or_create_user(self.google_user)
+        self.assertFalse(created)
+        self.assertEqual(again.pk, user.pk)
+
+    def test_email_change_keeps_account(self):
+        """Test that a changed Google email resolves to the same user"""
+        user, _ = GoogleAuthHandler.get_or_create_user(self.google_user)
+        cache.clear()
+        self.google_user["email"] = "renamed@example.com"
+        again, created = GoogleAuthHandler.get_or_create_user(self.google_user)
+        self.assertFalse(created)
+        self.assertEqual(again.pk, user.pk)
+        self.assertEqual(User.objects.count(), 1)
+        self.assertEqual(SocialIdentity.objects.get().email, "renamed@example.com")
+
+    def test_links_existing_account_with_verified_email(self):
+        """Test that a verified Google email links to an existing account"""
+        existing = make_user(
+            "googleuser@example.com", password="testpass123", first_name="Existing"
+        )
+        user, created = GoogleAuthHandler.get_or_create_user(self.google_user)
+        self.assertFalse(created)
+        self.assertEqual(user.pk, existing.pk)
+        self.assertTrue(user.check_password("testpass123"))
+
+    def test_unverified_email_does_not_link(self):
+        """Test that an unverified Google email cannot take over an account"""
+        make_user(
+            "googleuser@example.com", password="testpass123", first_name="Existing"
+        )
+        self.google_user["email_verified"] = False
+        with self.assertRaises(ValueError):
+            GoogleAuthHandler.get_or_create_user(self.google_user)
+        self.assertFalse(SocialIdentity.objects.exists())
+
+    def test_lost_insert_race_converges(self):
+        """Test that a first login racing an existing insert reuses its rows"""
+        user, _ = GoogleAuthHandler.get_or_create_user(self.google_user)
+        # A concurrent request that missed the identity lookup inserts again.
+        identity, created = GoogleAuthHandler._create_identity(self.google_user)
+        self.assertFalse(created)
+        self.assertEqual(identity.user_id, user.pk)
+        self.assertEqual(User.objects.count(), 1)
+        self.assertEqual(SocialIdentity.objects.count(), 1)
+
+
+class GoogleSignInTests(TestCase):
+    """Tests for the Google sign-in endpoints against the fake provider"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.provider = FakeGoogleProvider("test-client-id").start()
+        cls.addClassCleanup(cls.provider.stop)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.provider.failure_rate = 0.0
+        overrides = override_settings(
+            GOOGLE_OAUTH2_CLIENT_ID="test-client-id",
+            GOOGLE_OAUTH2_CERTS_URL=self.provider.certs_url,
+            GOOGLE_OAUTH2_TOKEN_URL=self.provider.token_url,
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def test_id_token_sign_in(self):
+        """Test signing in with a provider-issued ID token"""
+        token = self.provider.issue_id_token("sub-1", "first@example.com")
+        response = self.client.post(
+            "/api/v1/accounts/google/", {"token": token}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data["created"])
+        self.assertEqual(response.data["user"]["email"], "first@example.com")
+        self.assertIn("access", response.data)
+
+    def test_code_sign_in(self):
+        """Test signing in with an authorization code"""
+        code = self.provider.make_code("sub-2", "second@example.com")
+        response = self.client.post(
+            "/api/v1/accounts/google/callback/", {"code": code}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["user"]["email"], "second@example.com")
+
+    def test_certificates_cached(self):
+        """Test that repeat sign-ins reuse the provider's certificates"""
+        google_certs_cache.clear_local()
+        with mock.patch.object(
+            google_oauth, "_fetch_certs", wraps=google_oauth._fetch_certs
+        ) as fetch_certs:
+            for sub in ("sub-5", "sub-6"):
+                token = self.provider.issue_id_token(sub)
+                response = self.client.post(
+                    "/api/v1/accounts/google/", {"token": token}, format="json"
+                )
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(fetch_certs.call_count, 1)
+
+    def test_wrong_audience_rejected(self):
+        """Test that ID tokens for another client are rejected"""
+        other = FakeGoogleProvider("other-client")
+        token = other.issue_id_token("sub-3")
+        other.server.server_close()
+        response = self.client.post(
+            "/api/v1/accounts/google/", {"token": token}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_provider_failure_rejected(self):
+        """Test that an unavailable provider fails the sign-in cleanly"""
+        self.provider.failure_rate = 1.0
+        code = self.provider.make_code("sub-4")
+        response = self.client.post(
+            "/api/v1/accounts/google/callback/", {"code": code}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class GraphQLTests(TestCase):
+    """Tests for the GraphQL read API"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = make_user(
+            "staff@example.com",
+            password="testpass123",
+            first_name="Staff",
+            is_staff=True,
+        )
+        for i in range(5):
+            user = make_user(f"user{i}@example.com", password="testpass123")
+            UserProfile.objects.filter(user=user).update(bio=f"Bio {i}")
+
+    def setUp(self):
+        self.client = APIClient()
+        self.graphql_url = "/graphql/"
+        self.client.force_authenticate(user=self.staff)
+
+    def execute(self, query, variables=None):
+        return self.client.post(
+            self.graphql_url,
+            {"query": query, "variables": variables or {}},
+            format="json",
+        )
+
+    def test_non_staff_rejected(self):
+        """Test that regular users cannot query the GraphQL API"""
+        self.client.force_authenticate(user=User.objects.get(email="user0@example.com"))
+        response = self.execute("{ users { email } }")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_users_with_profiles_batched(self):
+        """Test that nested users and profiles cost a fixed number of queries"""
+        query = """
+            {
+              users(first: 20) {
+                email
+                profile { bio user { email profile { bio } } }
+              }
+            }
+        """
+        with self.assertNumQueries(2):
+            response = self.execute(query)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        users = response.json()["data"]["users"]
+        self.assertEqual(len(users), 6)
+        self.assertEqual(users[0]["profile"]["bio"], "")
+        self.assertEqual(users[1]["profile"]["bio"], "Bio 0")
+        self.assertEqual(users[1]["profile"]["user"]["email"], "user0@example.com")
+
+    def test_profiles_with_users_batched(self):
+        """Test that listing profiles loads their users in one query"""
+        with self.assertNumQueries(2):
+            response = self.execute("{ profiles { bio user { email } } }")
+
+        profiles = response.json()["data"]["profiles"]
+        self.assertEqual(len(profiles), 6)
+        self.assertEqual(profiles[5]["user"]["email"], "user4@example.com")
+
+    def test_single_user(self):
+        """Test fetching one user by id"""
+        user = User.objects.get(email="user2@example.com")
+        response = self.execute(
+            "query ($id: ID!) { user(id: $id) { email profile { bio } } }",
+            {"id": user.id},
+        )
+        data = response.json()["data"]["user"]
+        self.assertEqual(data["email"], "user2@example.com")
+        self.assertEqual(data["profile"]["bio"], "Bio 2")
+
+    def test_complexity_limit(self):
+        """Test that queries fanning out to too many objects are rejected"""
+        query = """
+            {
+              users(first: 100) {
+                email firstName lastName role
+                profile {
+                  bio phoneNumber address
+                  user { email firstName lastName profile { bio } }
+                }
+              }
+            }
+        """
+        with self.assertNumQueries(0):
+            response = self.execute(query)
+
+        errors = response.json()["errors"]
+        self.assertIn("complexity", errors[0]["message"])
+
+    def test_depth_limit(self):
+        """Test that deeply nested queries are rejected"""
+        query = """
+            {
+              users(first: 1) {
+                profile { user { profile { user { profile { user { email } } } } } }
+              }
+            }
+        """
+        response = self.execute(query)
+        errors = response.json()["errors"]
+        self.assertIn("exceeds maximum operation depth", errors[0]["message"])
+
+
+@override_settings(
+    DATABASE_REPLICAS=["replica"],
+    DATABASE_ROUTERS=["e_commerce_api.replicas.ReplicaRouter"],
+)
+@modify_settings(MIDDLEWARE={"append": "e_commerce_api.replicas.ReplicaMiddleware"})
+class ReplicaRoutingTests(TestCase):
+    """Tests for read replica routing, with a second database as the replica"""
+
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user_url = "/api/v1/accounts/user/"
+        self.user = make_user(
+            "testuser@example.com", password="testpass123", first_name="Primary"
+        )
+        # The replica holds a stale copy of the user.
+        User.objects.using("replica").create(
+            id=self.user.id,
+            email=self.user.email,
+            password=self.user.password,
+            first_name="Replica",
+            last_name="User",
+        )
+        access = RefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+
+    def test_safe_requests_read_from_replica(self):
+        """Test that GET requests are served from the replica"""
+        response = self.client.get(self.user_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["first_name"], "Replica")
+
+    def test_write_pins_user_to_primary(self):
+        """Test that a user reads their own writes right after writing"""
+        response = self.client.put(
+            self.user_url, {"first_name": "Updated"}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            User.objects.using("replica").get(id=self.user.id).first_name, "Replica"
+        )
+
+        response = self.client.get(self.user_url)
+        self.assertEqual(response.data["first_name"], "Updated")
+
+        # Once the pin expires, reads go back to the replica.
+        cache.clear()
+        user_payload_cache.clear_local()
+        response = self.client.get(self.user_url)
+        self.assertEqual(response.data["first_name"], "Replica")
+
+    def test_reads_outside_requests_use_primary(self):
+        """Test that code outside a request and use_primary blocks read the primary"""
+        self.assertEqual(router.db_for_read(User), "default")
+        self.assertEqual(User.objects.get(id=self.user.id).first_name, "Primary")
+
+    def test_persistent_connections(self):
+        """Test that database entries are configured for connection reuse"""
+        database = {"ENGINE": "django.db.backends.sqlite3", "NAME": "db.sqlite3"}
+        configured = replicas.persistent_connections(database, max_age=30)
+        self.assertEqual(configured["CONN_MAX_AGE"], 30)
+        self.assertTrue(configured["CONN_HEALTH_CHECKS"])
+        self.assertNotIn("CONN_MAX_AGE", database)
+
+
+class TieredCacheTests(TestCase):
+    """Tests for the two-tier cache, with two instances standing in for workers"""
+
+    def setUp(self):
+        cache.clear()
+        self.worker_a = TieredCache("tests:tiered")
+        self.worker_b = TieredCache("tests:tiered")
+        self.loads = 0
+
+    def loader(self, value="value"):
+        def load():
+            self.loads += 1
+            return value
+
+        return load
+
+    def test_repeat_reads_served_locally(self):
+        """Test that only the first read calls the loader"""
+        self.assertEqual(self.worker_a.get_or_set("key", self.loader()), "value")
+        self.assertEqual(self.worker_a.get_or_set("key", self.loader()), "value")
+        self.assertEqual(self.loads, 1)
+        stats = self.worker_a.stats.snapshot()
+        self.assertEqual(stats["local_hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["hit_rate"], 0.5)
+
+    def test_shared_tier_used_across_workers(self):
+        """Test that a value loaded by one worker is reused by another"""
+        self.worker_a.get_or_set("key", self.loader())
+        self.assertEqual(self.worker_b.get_or_set("key", self.loader()), "value")
+        self.assertEqual(self.loads, 1)
+        self.assertEqual(self.worker_b.stats.snapshot()["remote_hits"], 1)
+
+    def test_invalidation_reaches_every_worker(self):
+        """Test that invalidating a key evicts it from every worker"""
+        self.worker_a.get_or_set("key", self.loader())
+        self.worker_b.get_or_set("key", self.loader())
+        self.worker_a.invalidate("key")
+        self.assertIsNone(self.worker_b.get("key"))
+        self.assertEqual(self.worker_b.get_or_set("key", self.loader("new")), "new")
+        self.assertEqual(self.worker_a.get("key"), "new")
+
+    def test_invalidate_many_broadcasts_once(self):
+        """Test that invalidating many keys sends a single broadcast"""
+        keys = ["k1", "k2", "k3"]
+        for key in keys:
+            self.worker_a.get_or_set(key, self.loader())
+            self.worker_b.get_or_set(key, self.loader())
+        with mock.patch.object(
+            tiered_cache, "dispatch", wraps=tiered_cache.dispatch
+        ) as dispatch:
+            self.worker_a.invalidate_many(keys)
+        dispatch.assert_called_once_with("tests:tiered", {key: 1 for key in keys})
+        for key in keys:
+            self.assertIsNone(self.worker_b.get(key))
+        self.assertEqual(self.worker_b.get_or_set("k1", self.loader("new")), "new")
+
+    def test_new_cache_subscribes_before_any_invalidation(self):
+        """Test that a process subscribes when its first cache is created"""
+        self.addCleanup(
+            setattr, tiered_cache, "_broadcaster", tiered_cache._broadcaster
+        )
+        self.addCleanup(
+            setattr, tiered_cache, "_broadcaster_pid", tiered_cache._broadcaster_pid
+        )
+        tiered_cache._broadcaster = None
+        with override_settings(TIERED_CACHE_BROADCAST="redis"):
+            with mock.patch.object(tiered_cache, "RedisBroadcaster") as broadcaster:
+                reader = TieredCache("tests:reader")
+                broadcaster.assert_called_once()
+                reader.get_or_set("key", self.loader())
+
+                # A forked worker subscribes again on its first read and
+                # drops what it copied from the parent.
+                with mock.patch.object(
+                    tiered_cache.os, "getpid", return_value=os.getpid() + 1
+                ):
+                    self.assertEqual(reader.get("key"), "value")
+        self.assertEqual(broadcaster.call_count, 2)
+        self.assertEqual(reader.stats.snapshot()["remote_hits"], 1)
+
+    def test_shared_store_built_on_first_use(self):
+        """Test that a shared store is picked lazily and rebuilt on new settings"""
+        make_redis, make_local = mock.Mock(), mock.Mock()
+        get_store = tiered_cache.shared_store("TESTS_BACKEND", make_redis, make_local)
+        make_local.assert_not_called()
+
+        # Unset, the backend follows the cache: locmem here.
+        self.assertIs(get_store(), make_local.return_value)
+        self.assertIs(get_store(), make_local.return_value)
+        make_local.assert_called_once_with()
+
+        with override_settings(TESTS_BACKEND="redis"):
+            with mock.patch("django_redis.get_redis_connection") as connection:
+                self.assertIs(get_store(), make_redis.return_value)
+        make_redis.assert_called_once_with(connection.return_value)
+        self.assertIs(get_store(), make_local.return_value)
+        self.assertEqual(make_local.call_count, 2)
+
+    def test_redis_versions_bumped_in_one_round_trip(self):
+        """Test that django-redis versions are incremented in one pipeline"""
+        client = mock.Mock()
+        pipeline = client.pipeline.return_value
+        pipeline.execute.return_value = [4, True, 1, True]
+        with mock.patch.object(tiered_cache, "_redis_client", return_value=client):
+            self.worker_a.invalidate_many(["k1", "k2"])
+        pipeline.execute.assert_called_once_with()
+        self.assertEqual(pipeline.incr.call_count, 2)
+        self.assertEqual(pipeline.expire.call_count, 2)
+        self.assertEqual(dict(self.worker_a._invalidated), {"k1": 4, "k2": 1})
+
+    def test_load_racing_invalidation_not_reused(self):
+        """Test that a value loaded before an invalidation is not served later"""
+
+        def stale_loader():
+            self.worker_b.invalidate("key")
+            return "stale"
+
+        self.assertEqual(self.worker_a.get_or_set("key", stale_loader), "stale")
+        self.assertIsNone(self.worker_a.get("key"))
+        self.assertIsNone(self.worker_b.get("key"))
+
+    def test_concurrent_misses_coalesced(self):
+        """Test that concurrent misses for one key call the loader once"""
+        release = threading.Event()
+
+        def slow_loader():
+            release.wait(5)
+            self.loads += 1
+            return "value"
+
+        results = []
+        threads = [
+            threading.Thread(
+                target=lambda: results.append(
+                    self.worker_a.get_or_set("key", slow_loader)
+                )
+            )
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        while self.worker_a.stats.snapshot()["coalesced"] < 7:
+            time.sleep(0.01)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, ["value"] * 8)
+        self.assertEqual(self.loads, 1)
+
+    def test_loader_errors_not_cached(self):
+        """Test that a failing loader caches nothing"""
+
+        def failing_loader():
+            raise RuntimeError("unavailable")
+
+        with self.assertRaises(RuntimeError):
+            self.worker_a.get_or_set("key", failing_loader)
+        self.assertEqual(self.worker_a.get_or_set("key", self.loader()), "value")
+
+
+@mock.patch.object(
+    views.UserDetailView, "authentication_classes", [CachedJWTAuthentication]
+)
+class CachedAuthenticationTests(TestCase):
+    """Tests for JWT authentication and user details served from the cache"""
+
+    def setUp(self):
+        cache.clear()
+        user_cache.clear_local()
+        user_payload_cache.clear_local()
+        self.client = APIClient()
+        self.user_url = "/api/v1/accounts/user/"
+        self.user = make_user("testuser@example.com", password="testpass123")
+        UserProfile.objects.filter(user=self.user).update(bio="Hello")
+        access = RefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+
+    def test_repeat_requests_skip_database(self):
+        """Test that a repeat request is answered without queries"""
+        response = self.client.get(self.user_url)
+        self.assertEqual(response.data["profile"]["bio"], "Hello")
+        with self.assertNumQueries(0):
+            response = self.client.get(self.user_url)
+        self.assertEqual(response.data["email"], "testuser@example.com")
+
+    def test_updates_invalidate_cache(self):
+        """Test that changes to the user and profile are visible immediately"""
+        self.client.get(self.user_url)
+        self.client.put(self.user_url, {"first_name": "Updated"}, format="json")
+        self.assertEqual(self.client.get(self.user_url).data["first_name"], "Updated")
+
+        profile = UserProfile.objects.get(user=self.user)
+        profile.bio = "Changed"
+        profile.save()
+        self.assertEqual(
+            self.client.get(self.user_url).data["profile"]["bio"], "Changed"
+        )
+
+    def test_deactivated_user_rejected(self):
+        """Test that deactivating a cached user takes effect immediately"""
+        self.client.get(self.user_url)
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get(self.user_url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class BreachedPasswordTests(TestCase):
+    """Tests for the memory-mapped breached-password corpus"""
+
+    breached = ["password123", "letmein2024", "qwertyuiop1"]
+
+    def setUp(self):
+        workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(workdir.cleanup)
+        self.workdir = workdir.name
+        self.corpus_path = os.path.join(self.workdir, "corpus.bin")
+
+    def write_input(self, name, lines):
+        path = os.path.join(self.workdir, name)
+        with open(path, "w") as input_file:
+            input_file.write("\n".join(lines) + "\n")
+        return path
+
+    def build(self, *inputs, **options):
+        call_command(
+            "build_breached_passwords",
+            *inputs,
+            output=self.corpus_path,
+            stdout=io.StringIO(),
+            **options,
+        )
+        corpus = BreachedPasswordFile(self.corpus_path)
+        self.addCleanup(corpus.close)
+        return corpus
+
+    def test_lookup_across_sorted_runs(self):
+        """Test that unsorted, duplicated input is compacted and searchable"""
+        digests = [random.randbytes(20) for _ in range(5000)]
+        lines = [f"{digest.hex().upper()}:{i + 1}" for i, digest in enumerate(digests)]
+        first = self.write_input("first.txt", lines[:3000])
+        second = self.write_input("second.txt", lines[2000:])
+
+        corpus = self.build(first, second, chunk_size=700)
+
+        self.assertEqual(len(corpus), 5000)
+        for digest in digests:
+            self.assertIn(digest, corpus)
+        for _ in range(1000):
+            self.assertNotIn(random.randbytes(20), corpus)
+
+    def test_min_count_and_plaintext(self):
+        """Test building from counted digests and from plain passwords"""
+        rare = hashlib.sha1(b"rare-password").hexdigest()
+        common = hashlib.sha1(b"common-password").hexdigest()
+        digests = self.write_input("digests.txt", [f"{rare}:1", f"{common}:50"])
+        corpus = self.build(digests, min_count=10)
+        self.assertFalse(corpus.contains_password("rare-password"))
+        self.assertTrue(corpus.contains_password("common-password"))
+
+        plaintext = self.write_input("plain.txt", self.breached)
+        corpus = self.build(plaintext, plaintext=True)
+        self.assertTrue(corpus.contains_password("letmein2024"))
+        self.assertFalse(corpus.contains_password("letmein2025"))
+
+    def test_invalid_input_rejected(self):
+        """Test that malformed digest lines abort the build"""
+        path = self.write_input("bad.txt", ["not-a-digest"])
+        with self.assertRaises(CommandError):
+            self.build(path)
+
+    def test_breached_password_rejected_on_registration(self):
+        """Test that registration refuses passwords from the corpus"""
+        self.build(self.write_input("plain.txt", self.breached), plaintext=True)
+        data = {
+            "email": "testuser@example.com",
+            "first_name": "Test",
+            "last_name": "User",
+            "password": "password123",
+            "password2": "password123",
+        }
+        with override_settings(BREACHED_PASSWORDS_FILE=self.corpus_path):
+            response = APIClient().post(
+                "/api/v1/accounts/register/", data, format="json"
+            )
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn("data breach", str(response.data["password"]))
+
+            data["password"] = data["password2"] = "securepassword123"
+            response = APIClient().post(
+                "/api/v1/accounts/register/", data, format="json"
+            )
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_django_password_validator(self):
+        """Test the validator through AUTH_PASSWORD_VALIDATORS"""
+        self.build(self.write_input("plain.txt", self.breached), plaintext=True)
+        with override_settings(
+            BREACHED_PASSWORDS_FILE=self.corpus_path,
+            AUTH_PASSWORD_VALIDATORS=[
+                {"NAME": ("accounts.breached_passwords.BreachedPasswordValidator")}
+            ],
+        ):
+            with self.assertRaises(ValidationError):
+                validate_password("qwertyuiop1")
+            validate_password("securepassword123")
+
+
+class AuthAuditTests(TestCase):
+    """Tests for the buffered authentication audit log"""
+
+    def setUp(self):
+        # A log of this test's own, written only when the test flushes it.
+        patcher = mock.patch.object(
+            audit, "audit_log", audit.AuditLog(backend="manual")
+        )
+        self.audit_log = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = APIClient()
+        self.user = make_user("testuser@example.com", password="testpass123")
+
+    def login(self, password):
+        return self.client.post(
+            "/api/v1/accounts/login/",
+            {"email": "testuser@example.com", "password": password},
+            format="json",
+            HTTP_USER_AGENT="tests",
+        )
+
+    def test_events_buffered_and_written_in_one_query(self):
+        """Test that auth events are written together when flushed"""
+        self.login("wrongpassword")
+        self.login("testpass123")
+        self.assertFalse(AuthEvent.objects.exists())
+
+        with self.assertNumQueries(1):
+            self.audit_log.flush()
+
+        failed, login = AuthEvent.objects.order_by("created_at")
+        self.assertEqual(failed.event_type, AuthEvent.LOGIN_FAILED)
+        self.assertIsNone(failed.user_id)
+        self.assertEqual(failed.email, "testuser@example.com")
+        self.assertEqual(login.event_type, AuthEvent.LOGIN)
+        self.assertEqual(login.user_id, self.user.id)
+        self.assertEqual(login.ip_address, "127.0.0.1")
+        self.assertEqual(login.user_agent, "tests")
+
+    def test_password_change_and_logout_recorded(self):
+        """Test that password changes and logouts are audited"""
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post(
+            "/api/v1/accounts/password/change/",
+            {
+                "old_password": "testpass123",
+                "new_password": "newsecurepass456",
+                "new_password2": "newsecurepass456",
+            },
+            format="json",
+        )
+        self.client.post(
+            "/api/v1/accounts/logout/", {"refresh": response.data["refresh"]}
+        )
+        self.audit_log.flush()
+
+        self.assertEqual(
+            list(
+                AuthEvent.objects.order_by("created_at").values_list(
+                    "event_type", flat=True
+                )
+            ),
+            [AuthEvent.PASSWORD_CHANGE, AuthEvent.LOGOUT],
+        )
+
+    def test_full_queue_drops_events(self):
+        """Test that events beyond the queue bound are dropped and counted"""
+        log = audit.AuditLog(backend="manual", queue_size=2, block_timeout=0)
+        for _ in range(3):
+            log.record({"event_type": AuthEvent.LOGIN, "user_id": self.user.id})
+        self.assertEqual(log.stats()["dropped"], 1)
+        self.assertEqual(log.stats()["pending"], 2)
+
+        log.flush()
+        self.assertEqual(log.stats()["written"], 2)
+        self.assertEqual(AuthEvent.objects.count(), 2)
+
+    def test_background_flusher_batches(self):
+        """Test that the background flusher writes full batches, then the rest"""
+        batches = []
+        log = audit.AuditLog(backend="thread", batch_size=3, flush_interval=0.05)
+        with mock.patch.object(audit, "write_auth_events_batch", batches.append):
+            for i in range(5):
+                log.record({"event_type": AuthEvent.LOGIN, "email": f"{i}@x.com"})
+            deadline = time.monotonic() + 5
+            while log.stats()["written"] < 5 and time.monotonic() < deadline:
+                time.sleep(0.01)
+
+        self.assertEqual([len(batch) for batch in batches], [3, 2])
+        self.assertEqual(log.stats()["pending"], 0)
+
+    def test_purge_deletes_expired_events_in_batches(self):
+        """Test that the purge command only removes events past retention"""
+        old = timezone.now() - timedelta(days=100)
+        events = [
+            AuthEvent(event_type=AuthEvent.LOGIN, created_at=old) for _ in range(7)
+        ]
+        events += [AuthEvent(event_type=AuthEvent.LOGOUT) for _ in range(2)]
+        AuthEvent.objects.bulk_create(events)
+        call_command(
+            "purge_auth_events",
+            days=90,
+            batch_size=3,
+            sleep=0,
+            stdout=io.StringIO(),
+        )
+        self.assertEqual(
+            set(AuthEvent.objects.values_list("event_type", flat=True)),
+            {AuthEvent.LOGOUT},
+        )
+        self.assertEqual(AuthEvent.objects.count(), 2)
+
+
+class ActivityTrackingTests(TestCase):
+    """Tests for coalesced last-login and last-seen tracking"""
+
+    def setUp(self):
+        self.tracker = activity.ActivityTracker(
+            activity.LocalActivityStore(), debounce=60
+        )
+        self.users = [
+            make_user(f"user{i}@example.com", password="testpass123") for i in range(3)
+        ]
+
+    def test_activity_debounced_and_flushed_in_one_query(self):
+        """Test that repeat activity is coalesced into a single UPDATE"""
+        for _ in range(3):
+            for user in self.users:
+                self.tracker.record_seen(user.pk)
+        user_ids = [user.pk for user in self.users]
+        self.assertEqual(len(self.tracker.store.pending("last_seen", user_ids)), 3)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.tracker.flush(), 3)
+        self.assertFalse(
+            User.objects.filter(last_seen__isnull=True, pk__in=user_ids).exists()
+        )
+
+    def test_query_merges_pending_and_persisted(self):
+        """Test that unflushed activity is visible to readers"""
+        earlier = timezone.now() - timedelta(hours=1)
+        User.objects.filter(pk=self.users[0].pk).update(last_seen=earlier)
+        User.objects.filter(pk=self.users[1].pk).update(last_seen=earlier)
+        self.tracker.record_seen(self.users[0].pk)
+
+        result = self.tracker.get_last_activity([u.pk for u in self.users])
+        self.assertGreater(result[self.users[0].pk]["last_seen"], earlier)
+        self.assertEqual(result[self.users[1].pk]["last_seen"], earlier)
+        self.assertIsNone(result[self.users[2].pk]["last_seen"])
+
+    def test_timestamps_never_move_backwards(self):
+        """Test that flushing an older timestamp keeps the newer one"""
+        now = timezone.now()
+        User.objects.filter(pk=self.users[0].pk).update(last_seen=now)
+        stale = (now - timedelta(minutes=5)).timestamp()
+        self.tracker.record("last_seen", self.users[0].pk, stale)
+        self.tracker.flush()
+        self.users[0].refresh_from_db()
+        self.assertEqual(self.users[0].last_seen, now)
+
+    def test_login_recorded(self):
+        """Test that logging in records last_login without writing the user"""
+        with mock.patch.object(views, "activity_tracker", self.tracker):
+            response = APIClient().post(
+                "/api/v1/accounts/login/",
+                {"email": "user0@example.com", "password": "testpass123"},
+                format="json",
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.users[0].refresh_from_db()
+        self.assertIsNone(self.users[0].last_login)
+
+        self.tracker.flush()
+        self.users[0].refresh_from_db()
+        self.assertIsNotNone(self.users[0].last_login)
+        self.assertIsNotNone(self.users[0].last_seen)
+
+    @modify_settings(MIDDLEWARE={"append": "accounts.activity.ActivityMiddleware"})
+    def test_authenticated_requests_recorded(self):
+        """Test that the middleware records activity of authenticated users"""
+        client = APIClient()
+        client.force_authenticate(user=self.users[1])
+        with mock.patch.object(activity, "activity_tracker", self.tracker):
+            client.get("/api/v1/accounts/user/")
+            APIClient().get("/api/v1/accounts/user/")
+        self.assertEqual(
+            list(self.tracker.store.pending("last_seen", [u.pk for u in self.users])),
+            [self.users[1].pk],
+        )
+
+
+class OutboxTests(TestCase):
+    """Tests for the transactional outbox of user lifecycle events"""
+
+    def setUp(self):
+        self.user = make_user("outbox@example.com", password="testpass123")
+        self.published = []
+
+    def event_types(self):
+        return list(
+            OutboxEvent.objects.filter(aggregate_id=self.user.pk)
+            .order_by("id")
+            .values_list("event_type", flat=True)
+        )
+
+    def test_lifecycle_events_written(self):
+        """Test that creating, updating and deactivating users add events"""
+        self.user.first_name = "Changed"
+        self.user.save()
+        self.user.set_password("newpass456")
+        self.user.save()
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(
+            self.event_types(),
+            [
+                OutboxEvent.USER_CREATED,
+                OutboxEvent.USER_UPDATED,
+                OutboxEvent.USER_PASSWORD_CHANGED,
+                OutboxEvent.USER_DEACTIVATED,
+            ],
+        )
+        updated = OutboxEvent.objects.get(event_type=OutboxEvent.USER_UPDATED)
+        self.assertEqual(updated.payload["changed"], ["first_name"])
+        self.assertEqual(updated.payload["first_name"], "Changed")
+
+    def test_unpublished_fields_add_no_event(self):
+        """Test that saving only internal fields writes no event"""
+        user = User.objects.get(pk=self.user.pk)
+        user.last_login = timezone.now()
+        user.save(update_fields=["last_login"])
+        user.save()
+        self.assertEqual(self.event_types(), [OutboxEvent.USER_CREATED])
+
+    def test_events_rolled_back_with_change(self):
+        """Test that an event is only kept if the change is committed"""
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                self.user.role = "admin"
+                self.user.save()
+                raise RuntimeError
+        self.assertEqual(self.event_types(), [OutboxEvent.USER_CREATED])
+
+    def test_relay_publishes_in_order_once(self):
+        """Test that the relay publishes every event once, in id order"""
+        self.user.last_name = "Changed"
+        self.user.save()
+        relay = outbox.OutboxRelay(self.published.append, batch_size=1)
+
+        self.assertEqual(relay.drain(), 2)
+        self.assertEqual(
+            [message["type"] for message in self.published],
+            [OutboxEvent.USER_CREATED, OutboxEvent.USER_UPDATED],
+        )
+        self.assertEqual(relay.relay_batch(), 0)
+        self.assertEqual(len(self.published), 2)
+        self.assertFalse(OutboxEvent.objects.filter(published_at__isnull=True).exists())
+        self.assertEqual(relay.stats()["published"], 2)
+
+    def test_failed_publish_retried_without_skipping(self):
+        """Test that a failed event blocks later ones until it is sent"""
+        self.user.last_name = "Changed"
+        self.user.save()
+
+        def publish(message):
+            raise ConnectionError("broker unavailable")
+
+        self.assertEqual(outbox.OutboxRelay(publish).relay_batch(), 0)
+        lag = outbox.outbox_lag()
+        self.assertEqual(lag["pending"], 2)
+        self.assertEqual(lag["failing"], 1)
+        self.assertIn("broker unavailable", OutboxEvent.objects.first().last_error)
+
+        outbox.OutboxRelay(self.published.append).drain()
+        self.assertEqual(len(self.published), 2)
+        self.assertEqual(outbox.outbox_lag()["pending"], 0)
+
+    def test_overlapping_relay_runs_skipped(self):
+        """Test that a relay run does nothing while another holds the lock"""
+        cache.clear()
+        relay = outbox.OutboxRelay(self.published.append)
+        cache.add(outbox.RELAY_LOCK_KEY, True)
+        self.assertIsNone(outbox.drain_alone(relay))
+        self.assertEqual(self.published, [])
+
+        cache.delete(outbox.RELAY_LOCK_KEY)
+        self.assertEqual(outbox.drain_alone(relay), 1)
+        self.assertIsNone(cache.get(outbox.RELAY_LOCK_KEY))
+
+    def test_partitions_split_events_by_user(self):
+        """Test that partitioned relays each publish their own users' events"""
+        other = make_user(
+            "other@example.com", password="testpass123", first_name="Other"
+        )
+        for partition in range(2):
+            outbox.OutboxRelay(
+                self.published.append, partition=partition, partitions=2
+            ).drain()
+        self.assertEqual(
+            sorted(message["aggregate_id"] for message in self.published),
+            sorted([self.user.pk, other.pk]),
+        )
+        self.assertEqual(
+            [message["aggregate_id"] % 2 for message in self.published],
+            sorted(message["aggregate_id"] % 2 for message in self.published),
+        )
+
+
+class IdempotencyTests(TestCase):
+    """Tests for Idempotency-Key handling of unsafe requests"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.register_url = "/api/v1/accounts/register/"
+        self.data = {
+            "email": "retry@example.com",
+            "first_name": "Test",
+            "last_name": "User",
+            "password": "securepassword123",
+            "password2": "securepassword123",
+        }
+
+    def test_retried_registration_replayed(self):
+        """Test that a retry gets the first response without re-running"""
+        first = self.client.post(
+            self.register_url, self.data, format="json", HTTP_IDEMPOTENCY_KEY="k1"
+        )
+        with mock.patch.object(
+            views.RegistrationSerializer, "save", side_effect=AssertionError
+        ):
+            second = self.client.post(
+                self.register_url, self.data, format="json", HTTP_IDEMPOTENCY_KEY="k1"
+            )
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second["Idempotency-Replayed"], "true")
+        self.assertEqual(User.objects.filter(email="retry@example.com").count(), 1)
+
+    def test_key_reused_with_different_body(self):
+        """Test that a key cannot be replayed for a different request"""
+        self.client.post(
+            self.register_url, self.data, format="json", HTTP_IDEMPOTENCY_KEY="k2"
+        )
+        self.data["email"] = "other@example.com"
+        response = self.client.post(
+            self.register_url, self.data, format="json", HTTP_IDEMPOTENCY_KEY="k2"
+        )
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertFalse(User.objects.filter(email="other@example.com").exists())
+
+    @override_settings(IDEMPOTENCY_WAIT=0.1)
+    def test_in_flight_duplicate_conflicts(self):
+        """Test that a duplicate of a running request does not run the view"""
+        request = mock.Mock(method="POST", path=self.register_url)
+        request.user.is_authenticated = False
+        scope = request_scope(request, "k3")
+        store = IdempotencyStore()
+        token = store.acquire(scope)
+
+        response = self.client.post(
+            self.register_url, self.data, format="json", HTTP_IDEMPOTENCY_KEY="k3"
+        )
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertFalse(User.objects.filter(email="retry@example.com").exists())
+
+        store.release(scope, token)
+        response = self.client.post(
+            self.register_url, self.data, format="json", HTTP_IDEMPOTENCY_KEY="k3"
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    @mock.patch.object(
+        jwt_authentication.api_settings, "AUTH_TOKEN_CLASSES", (tokens.AccessToken,)
+    )
+    def test_password_change_retried_with_revoked_token(self):
+        """Test that a retry gets the tokens issued by the change it repeats"""
+        users = [
+            make_user(f"user{i}@example.com", password="oldpass123") for i in range(2)
+        ]
+        bearers = [
+            f"Bearer {tokens.RefreshToken.for_user(user).access_token}"
+            for user in users
+        ]
+        data = {
+            "old_password": "oldpass123",
+            "new_password": "newsecurepass456",
+            "new_password2": "newsecurepass456",
+        }
+
+        def change(bearer, key="k4", body=data):
+            return self.client.post(
+                "/api/v1/accounts/password/change/",
+                body,
+                format="json",
+                HTTP_AUTHORIZATION=bearer,
+                HTTP_IDEMPOTENCY_KEY=key,
+            )
+
+        first = change(bearers[0])
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        # The change revoked the token the retry is sent with.
+        retry = change(bearers[0])
+        self.assertEqual(retry.status_code, status.HTTP_200_OK)
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(retry["Idempotency-Replayed"], "true")
+
+        # The revoked token gets nothing else.
+        self.assertEqual(
+            change(bearers[0], key="k5").status_code, status.HTTP_401_UNAUTHORIZED
+        )
+        self.assertEqual(
+            change(bearers[0], body={**data, "new_password": "other"}).status_code,
+            status.HTTP_401_UNAUTHORIZED,
+        )
+
+        # Keys are scoped to the user.
+        other = change(bearers[1])
+        self.assertEqual(other.status_code, status.HTTP_200_OK)
+        self.assertFalse(other.has_header("Idempotency-Replayed"))
+        self.assertNotEqual(other.data["access"], first.data["access"])
+
+        response = self.client.get(
+            "/api/v1/accounts/user/",
+            HTTP_AUTHORIZATION=f"Bearer {retry.data['access']}",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_mixin_wraps_unsafe_methods(self):
+        """Test that the mixin makes unsafe handlers idempotent"""
+
+        class View(IdempotentMixin, views.APIView):
+            def get(self, request):
+                pass
+
+            def post(self, request):
+                pass
+
+        self.assertTrue(getattr(View.post, "idempotent", False))
+        self.assertFalse(getattr(View.get, "idempotent", False))
+
+
+class BulkUserActionTests(TestCase):
+    """Tests for staff bulk changes to users"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = make_user(
+            "staff@example.com",
+            password="testpass123",
+            first_name="Staff",
+            is_staff=True,
+        )
+        cls.users = [
+            make_user(f"user{i}@spam.example", password="testpass123") for i in range(5)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.url = "/api/v1/accounts/users/bulk/"
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.staff)
+
+    def test_deactivate_in_chunks(self):
+        """Test that users are changed per chunk with one event per chunk"""
+        OutboxEvent.objects.all().delete()
+        summary = bulk.apply_bulk_action(
+            User.objects.filter(email__endswith="@spam.example"),
+            bulk.DEACTIVATE,
+            actor=self.staff,
+            chunk_size=2,
+        )
+        self.assertEqual(summary, {"matched": 5, "updated": 5, "batches": 3})
+        self.assertEqual(User.objects.filter(is_active=False).count(), 5)
+        events = list(OutboxEvent.objects.order_by("id"))
+        self.assertEqual(
+            [event.event_type for event in events],
+            [OutboxEvent.USERS_BULK_UPDATED] * 3,
+        )
+        self.assertEqual(
+            [uid for event in events for uid in event.payload["user_ids"]],
+            [user.pk for user in self.users],
+        )
+
+    def test_caches_invalidated_per_chunk(self):
+        """Test that each chunk is invalidated with one broadcast per cache"""
+        with mock.patch.object(
+            tiered_cache, "dispatch", wraps=tiered_cache.dispatch
+        ) as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                bulk.apply_bulk_action(
+                    User.objects.filter(email__endswith="@spam.example"),
+                    bulk.DEACTIVATE,
+                    chunk_size=2,
+                )
+        # Three chunks, two user caches, once now and once on commit.
+        self.assertEqual(publish.call_count, 12)
+        self.assertEqual(
+            {int(key) for call in publish.call_args_list for key in call.args[1]},
+            {user.pk for user in self.users},
+        )
+
+    def test_deactivated_users_tokens_revoked(self):
+        """Test that deactivation revokes tokens with set-based queries"""
+        refresh = tokens.RefreshToken.for_user(self.users[0])
+        with self.assertNumQueries(8):
+            bulk.apply_bulk_action(
+                User.objects.filter(pk__in=[u.pk for u in self.users]),
+                bulk.DEACTIVATE,
+            )
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {refresh.access_token}")
+        response = client.get("/api/v1/accounts/user/")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.users[0].refresh_from_db()
+        self.assertEqual(self.users[0].token_generation, 1)
+
+    def test_unchanged_users_skipped(self):
+        """Test that users already in the target state are not updated"""
+        summary = bulk.apply_bulk_action(User.objects.all(), bulk.ACTIVATE)
+        self.assertEqual(summary["updated"], 0)
+        self.assertEqual(summary["batches"], 0)
+
+    def test_endpoint_by_ids_and_filters(self):
+        """Test the staff endpoint with ids and filters"""
+        response = self.client.post(
+            self.url,
+            {
+                "action": "set_role",
+                "role": "admin",
+                "ids": [self.users[0].pk, self.users[1].pk, self.staff.pk],
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["updated"], 2)
+        self.assertEqual(User.objects.filter(role="admin").count(), 2)
+
+        response = self.client.post(
+            self.url,
+            {"action": "deactivate", "filters": {"email_domain": "spam.example"}},
+            format="json",
+        )
+        self.assertEqual(response.data["updated"], 5)
+        self.staff.refresh_from_db()
+        self.assertTrue(self.staff.is_active)
+
+    def test_endpoint_requires_selection_and_staff(self):
+        """Test that an empty selection and non-staff users are rejected"""
+        response = self.client.post(self.url, {"action": "activate"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(
+            self.url, {"action": "set_role", "ids": [1]}, format="json"
+        )
+        self.assertIn("role", response.data)
+
+        client = APIClient()
+        client.force_authenticate(user=self.users[0])
+        response = client.post(
+            self.url, {"action": "deactivate", "ids": [self.staff.pk]}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+@override_settings(ACCOUNT_RETENTION_TRACKED_SINCE=timezone.now() - timedelta(days=500))
+class AccountRetentionTests(TestCase):
+    """Tests for the cleanup of accounts that were never used"""
+
+    @classmethod
+    def setUpTestData(cls):
+        old = timezone.now() - timedelta(days=400)
+        cls.expired = []
+        for i in range(3):
+            user = make_user(f"unused{i}@example.com", date_joined=old)
+            UserProfile.objects.filter(user=user).update(bio="bio", phone_number="123")
+            cls.expired.append(user)
+        cls.inactive = make_user(
+            "inactive@example.com",
+            date_joined=timezone.now() - timedelta(days=40),
+            is_active=False,
+        )
+        cls.expired.append(cls.inactive)
+        cls.kept = [
+            make_user("new@example.com"),
+            make_user("staff@example.com", date_joined=old, is_staff=True),
+            make_user("used@example.com", date_joined=old, last_login=old),
+            make_user("device@example.com", date_joined=old),
+            make_user("token@example.com", date_joined=old),
+            # Joined before sign-ins were tracked, with no session left.
+            make_user(
+                "legacy@example.com",
+                date_joined=timezone.now() - timedelta(days=600),
+            ),
+        ]
+        # Signed in before sign-ins were recorded on the user row.
+        DeviceSession.objects.create(
+            user=cls.kept[3],
+            session_id="s1",
+            expires_at=timezone.now() - timedelta(days=300),
+        )
+        RefreshToken.for_user(cls.kept[4])
+
+    def setUp(self):
+        cache.clear()
+        self.cleanup = retention.AccountCleanup(
+            mode=retention.DELETE, batch_size=2, sleep=0
+        )
+
+    def test_expired_accounts_deleted_with_related_rows(self):
+        """Test that only expired accounts and their rows are deleted"""
+        progress = self.cleanup.run()
+        self.assertTrue(progress["finished"])
+        self.assertEqual(progress["removed"], 4)
+        self.assertEqual(progress["batches"], 2)
+        self.assertEqual(
+            set(User.objects.values_list("email", flat=True)),
+            {user.email for user in self.kept},
+        )
+        self.assertEqual(
+            set(UserProfile.objects.values_list("user__email", flat=True)),
+            {user.email for user in self.kept},
+        )
+        self.assertTrue(DeviceSession.objects.filter(user=self.kept[3]).exists())
+
+    def test_registration_counts_as_use(self):
+        """Test that a registered account is kept though it never signs in"""
+        tracker = activity.ActivityTracker(activity.LocalActivityStore())
+        with mock.patch.object(views, "activity_tracker", tracker):
+            response = APIClient().post(
+                "/api/v1/accounts/register/",
+                {
+                    "email": "registered@example.com",
+                    "password": "securepass123",
+                    "password2": "securepass123",
+                    "first_name": "New",
+                    "last_name": "User",
+                },
+                format="json",
+            )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        user = User.objects.get(email="registered@example.com")
+        # Only the recorded sign-in is left to show the account was used.
+        DeviceSession.objects.filter(user=user).delete()
+        OutstandingToken.objects.filter(user=user).delete()
+        tracker.flush()
+        user.refresh_from_db()
+        self.assertIsNotNone(user.last_login)
+        User.objects.filter(pk=user.pk).update(
+            date_joined=timezone.now() - timedelta(days=400)
+        )
+        self.assertFalse(retention.expired_accounts().filter(pk=user.pk).exists())
+
+    def test_nothing_removed_until_tracking_date_set(self):
+        """Test that the policy applies only once the tracking date is set"""
+        with override_settings(ACCOUNT_RETENTION_TRACKED_SINCE=None):
+            self.assertFalse(retention.expired_accounts().exists())
+            with self.assertRaises(CommandError):
+                call_command("cleanup_inactive_accounts", stdout=io.StringIO())
+        with override_settings(ACCOUNT_RETENTION_TRACKED_SINCE="2000-01-01"):
+            self.assertIn(self.kept[5], retention.expired_accounts())
+        with override_settings(ACCOUNT_RETENTION_TRACKED_SINCE="last year"):
+            with self.assertRaises(ImproperlyConfigured):
+                retention.tracked_since()
+
+    def test_default_mode_anonymizes(self):
+        """Test that accounts are anonymized unless deletion is configured"""
+        self.assertEqual(retention.AccountCleanup().mode, retention.ANONYMIZE)
+
+    def test_anonymized_accounts_kept_once(self):
+        """Test that anonymized accounts lose personal data and stay put"""
+        cleanup = retention.AccountCleanup(mode=retention.ANONYMIZE, sleep=0)
+        self.assertEqual(cleanup.run()["removed"], 4)
+        user = User.objects.get(pk=self.expired[0].pk)
+        self.assertEqual(user.email, f"deleted-{user.pk}@anonymized.invalid")
+        self.assertEqual(user.first_name, "")
+        self.assertFalse(user.is_active)
+        self.assertFalse(user.has_usable_password())
+        self.assertEqual(user.token_generation, 1)
+        self.assertEqual(UserProfile.objects.get(user=user).bio, "")
+        self.assertEqual(cleanup.run()["removed"], 0)
+
+    def test_run_resumes_from_checkpoint(self):
+        """Test that a run stopped by its budget continues where it stopped"""
+        progress = self.cleanup.run(max_batches=1)
+        self.assertFalse(progress["finished"])
+        self.assertEqual(progress["removed"], 2)
+        self.assertEqual(retention.get_progress()["last_pk"], progress["last_pk"])
+
+        with mock.patch.object(self.cleanup, "process_batch", return_value=2) as batch:
+            progress = self.cleanup.run()
+        batch.assert_called_once_with([self.expired[2].pk, self.inactive.pk])
+        self.assertTrue(progress["finished"])
+        self.assertEqual(progress["removed"], 4)
+
+    def test_pending_activity_spares_account(self):
+        """Test that a sign-in not yet flushed keeps the account"""
+        tracker = activity.ActivityTracker(activity.LocalActivityStore())
+        tracker.record_login(self.expired[0])
+        with mock.patch.object(retention, "activity_tracker", tracker):
+            self.cleanup.run()
+        self.assertTrue(User.objects.filter(pk=self.expired[0].pk).exists())
+
+    def test_concurrent_run_refused(self):
+        """Test that only one cleanup runs at a time"""
+        cache.add(retention.LOCK_KEY, True)
+        self.assertIsNone(self.cleanup.run())
+        with self.assertRaises(CommandError):
+            call_command("cleanup_inactive_accounts", stdout=io.StringIO())
+
+    def test_command(self):
+        """Test the dry run, progress and schedule options of the command"""
+        out = io.StringIO()
+        call_command("cleanup_inactive_accounts", "--dry-run", stdout=out)
+        self.assertIn("4 removed of 4 scanned", out.getvalue())
+        self.assertEqual(User.objects.count(), 10)
+
+        call_command("cleanup_inactive_accounts", "--sleep", "0", stdout=out)
+        call_command("cleanup_inactive_accounts", "--progress", stdout=out)
+        self.assertIn("anonymize pass finished: 4 removed", out.getvalue())
+
+        from django_celery_beat.models import PeriodicTask
+
+        call_command("cleanup_inactive_accounts", "--install-schedule", stdout=out)
+        call_command("cleanup_inactive_accounts", "--install-schedule", stdout=out)
+        task = PeriodicTask.objects.get()
+        self.assertEqual(task.task, "accounts.tasks.cleanup_inactive_accounts")
+
+
+def encode_mmdb(value):
+    """Encode a value in the MaxMind DB data format (small values only)"""
+
+    def control(type_, size):
+        extra = b""
+        if size >= 29:
+            size, extra = 29, bytes([size - 29])
+        if type_ > 7:
+            return bytes([size, type_ - 7]) + extra
+        return bytes([(type_ << 5) | size]) + extra
+
+    if isinstance(value, dict):
+        return control(7, len(value)) + b"".join(
+            encode_mmdb(key) + encode_mmdb(item) for key, item in value.items()
+        )
+    if isinstance(value, list):
+        return control(11, len(value)) + b"".join(map(encode_mmdb, value))
+    if isinstance(value, str):
+        raw = value.encode("utf-8")
+        return control(2, len(raw)) + raw
+    raw = value.to_bytes((value.bit_length() + 7) // 8, "big")
+    return control(6, len(raw)) + raw
+
+
+def write_mmdb(path, networks, database_type="GeoLite2-Country"):
+    """Write an IPv4 .mmdb file mapping networks to records"""
+    tree, data, pointers = [[None, None]], b"", {}
+    for network, record in networks.items():
+        network = ipaddress.ip_network(network)
+        pointers[network] = len(data)
+        data += encode_mmdb(record)
+        node, address = 0, int(network.network_address)
+        for depth in range(network.prefixlen):
+            bit = (address >> (31 - depth)) & 1
+            if depth == network.prefixlen - 1:
+                tree[node][bit] = ("data", pointers[network])
+            else:
+                if tree[node][bit] is None:
+                    tree.append([None, None])
+                    tree[node][bit] = len(tree) - 1
+                node = tree[node][bit]
+
+    node_count = len(tree)
+
+    def record_value(record):
+        if record is None:
+            return node_count
+        if isinstance(record, tuple):
+            return node_count + 16 + record[1]
+        return record
+
+    metadata = {
+        "node_count": node_count,
+        "record_size": 24,
+        "ip_version": 4,
+        "database_type": database_type,
+        "languages": ["en"],
+        "binary_format_major_version": 2,
+        "binary_format_minor_version": 0,
+        "build_epoch": int(time.time()),
+        "description": {"en": "Test database"},
+    }
+    with open(path, "wb") as database:
+        for left, right in tree:
+            database.write(record_value(left).to_bytes(3, "big"))
+            database.write(record_value(right).to_bytes(3, "big"))
+        database.write(bytes(16) + data)
+        database.write(b"\xab\xcd\xefMaxMind.com" + encode_mmdb(metadata))
+
+
+class GeoIPTests(TestCase):
+    """Tests for GeoIP enrichment of sign-in events"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.country_db = os.path.join(directory.name, "country.mmdb")
+        self.asn_db = os.path.join(directory.name, "asn.mmdb")
+        write_mmdb(self.country_db, {"81.0.0.0/8": {"country": {"iso_code": "FR"}}})
+        write_mmdb(
+            self.asn_db,
+            {
+                "81.2.0.0/16": {
+                    "autonomous_system_number": 3215,
+                    "autonomous_system_organization": "Orange",
+                }
+            },
+            database_type="GeoLite2-ASN",
+        )
+        self.reader = geoip.GeoIPReader(self.country_db, self.asn_db)
+
+    def test_lookup(self):
+        """Test that country and ASN are combined, and misses are empty"""
+        self.assertEqual(
+            self.reader.lookup("81.2.69.160"),
+            {"country": "FR", "asn": 3215, "as_org": "Orange"},
+        )
+        self.assertEqual(self.reader.lookup("81.9.0.1"), {"country": "FR"})
+        self.assertEqual(self.reader.lookup("10.0.0.1"), {})
+        self.assertEqual(self.reader.lookup("not an address"), {})
+        self.assertEqual(geoip.GeoIPReader().lookup("81.2.69.160"), {})
+
+    def test_hot_addresses_cached(self):
+        """Test that repeated lookups are answered from the LRU"""
+        self.reader.lookup("81.2.69.160")
+        with mock.patch.object(geoip.MappedDatabase, "get") as get:
+            self.assertEqual(self.reader.lookup("81.2.69.160")["country"], "FR")
+        get.assert_not_called()
+
+    def test_reloaded_when_file_replaced(self):
+        """Test that a replaced database is picked up without failing lookups"""
+        reader = geoip.GeoIPReader(self.country_db, check_interval=0)
+        self.assertEqual(reader.lookup("81.2.69.160"), {"country": "FR"})
+
+        replacement = self.country_db + ".new"
+        write_mmdb(replacement, {"81.0.0.0/8": {"country": {"iso_code": "DE"}}})
+        os.replace(replacement, self.country_db)
+        self.assertEqual(reader.lookup("81.2.69.160"), {"country": "DE"})
+
+        # A broken update keeps the working database.
+        with open(replacement, "wb") as broken:
+            broken.write(b"not a database")
+        os.replace(replacement, self.country_db)
+        self.assertEqual(reader.lookup("81.2.69.161"), {"country": "DE"})
+
+    def test_login_events_enriched(self):
+        """Test that sign-in audit records carry the client location"""
+        make_user("geo@example.com", password="testpass123")
+        log = audit.AuditLog(backend="manual")
+        with override_settings(GEOIP_COUNTRY_DB=self.country_db):
+            with mock.patch.object(audit, "audit_log", log):
+                APIClient().post(
+                    "/api/v1/accounts/login/",
+                    {"email": "geo@example.com", "password": "testpass123"},
+                    format="json",
+                    REMOTE_ADDR="81.2.69.160",
+                )
+        log.flush()
+        event = AuthEvent.objects.get(event_type=AuthEvent.LOGIN)
+        self.assertEqual(event.metadata["geo"], {"country": "FR"})
+
+
+class FastTestModeTests(TestCase):
+    """Tests for the user factories and the fast test runner"""
+
+    def test_made_users_sign_in(self):
+        """Test that a made user signs in and is published like any other"""
+        user = make_user("made@example.com")
+        self.assertTrue(
+            OutboxEvent.objects.filter(
+                aggregate_id=user.pk, event_type=OutboxEvent.USER_CREATED
+            ).exists()
+        )
+        response = APIClient().post(
+            "/api/v1/accounts/login/",
+            {"email": "made@example.com", "password": factories.DEFAULT_PASSWORD},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_password_hashed_once(self):
+        """Test that users with the same password share one hash"""
+        with mock.patch.object(
+            factories, "make_password", wraps=factories.make_password
+        ) as make_password:
+            users = [make_user(password="HashedOnce123!") for _ in range(3)]
+            factories.make_users(3, password="HashedOnce123!")
+        self.assertEqual(make_password.call_count, 1)
+        self.assertEqual(len({user.password for user in users}), 1)
+        self.assertTrue(users[0].check_password("HashedOnce123!"))
+
+    def test_make_users_in_one_query(self):
+        """Test that many users are inserted with a single query"""
+        with self.assertNumQueries(1):
+            users = factories.make_users(5)
+        self.assertEqual(len({user.email for user in users}), 5)
+
+    def test_sqlite_test_databases(self):
+        """Test that every alias moves to SQLite and keeps its mirror"""
+        databases = testing.sqlite_test_databases(
+            {
+                "default": {
+                    "ENGINE": "django.db.backends.postgresql",
+                    "NAME": "shop",
+                    "TEST": {"NAME": "test_shop"},
+                },
+                "replica": {
+                    "ENGINE": "django.db.backends.postgresql",
+                    "NAME": "shop",
+                    "TEST": {"MIRROR": "default"},
+                },
+            }
+        )
+        self.assertEqual(
+            {database["ENGINE"] for database in databases.values()},
+            {"django.db.backends.sqlite3"},
+        )
+        self.assertEqual(databases["default"]["TEST"], {})
+        self.assertEqual(databases["replica"]["TEST"], {"MIRROR": "default"})
+
+    def test_manual_audit_log_until_stopped(self):
+        """Test that the runner's audit log writes nothing until flushed"""
+        original = audit.audit_log
+        patcher = testing.use_manual_audit_log()
+        try:
+            self.assertIsNot(audit.audit_log, original)
+            self.assertEqual(audit.audit_log.backend, "manual")
+            audit.record(
+                RequestFactory().post("/"), AuthEvent.LOGIN_FAILED, email="a@b.c"
+            )
+            self.assertEqual(audit.audit_log.stats()["pending"], 1)
+            self.assertFalse(AuthEvent.objects.exists())
+        finally:
+            patcher.stop()
+        self.assertIs(audit.audit_log, original)
+
+    def test_slowest_tests_reported(self):
+        """Test that the runner lists the slowest tests, slowest first"""
+        suite = unittest.TestSuite(
+            [
+                unittest.FunctionTestCase(lambda: time.sleep(0.05)),
+                unittest.FunctionTestCase(lambda: None),
+            ]
+        )
+        result = unittest.TextTestRunner(
+            stream=io.StringIO(), resultclass=testing.TimedTextTestResult
+        ).run(suite)
+        self.assertEqual(len(result.collectedDurations), 2)
+        logger = mock.Mock()
+        testing.FastTestRunner(slowest=1, logger=logger).report_slowest(result)
+        lines = [call.args[1] for call in logger.log.call_args_list]
+        self.assertEqual(lines[0], "\nSlowest 1 tests:")
+        self.assertEqual(len(lines), 2)
+        self.assertGreaterEqual(float(lines[1].split("s")[0]), 0.05)
+
+    def test_worker_durations_sent_to_main_process(self):
+        """Test that parallel workers report how long each test took"""
+        result = testing.TimedRemoteTestResult()
+        unittest.FunctionTestCase(lambda: None)(result)
+        events = [event[0] for event in result.events]
+        self.assertEqual(events, ["startTest", "addSuccess", "addDuration", "stopTest"])
@@ -0,0 +1,197 @@
+"""
+JWT token classes used by the accounts service.
+
+They behave like the simplejwt tokens they extend, but are signed with the
+active key of the signing key ring (see ``accounts.jwks``) when one is
+configured, and are checked against the revocation state kept in
+``accounts.revocation``. Point simplejwt at them so authentication verifies with the
+same keys:
+
+    SIMPLE_JWT = {
+        "AUTH_TOKEN_CLASSES": ("accounts.tokens.AccessToken",),
+        ...
+    }
+"""
+
+from functools import lru_cache
+from uuid import uuid4
+
+import jwt
+from django.core.signals import setting_changed
+from django.dispatch import Signal, receiver
+from django.utils.translation import gettext_lazy as _
+from ipware import get_client_ip
+from jwt import ExpiredSignatureError, InvalidTokenError
+from rest_framework_simplejwt import tokens
+from rest_framework_simplejwt.backends import TokenBackend
+from rest_framework_simplejwt.exceptions import (TokenBackendError,
+                                                 TokenBackendExpiredToken,
+                                                 TokenError)
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.state import token_backend as hmac_token_backend
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+from .jwks import get_key_ring
+from .models import DeviceSession
+from .revocation import GENERATION_CLAIM, SESSION_CLAIM, get_revocation_state
+
+# Sent with ``user`` and ``request`` when tokens are issued for a new device
+# session: on registration, sign-in (password or Google) and password change.
+signed_in = Signal()
+
+
+class KeyRingTokenBackend(TokenBackend):
+    """
+    Token backend that signs with the active key of a key ring and verifies
+    with whichever key the token's ``kid`` header names.
+    """
+
+    def __init__(self, key_ring):
+        super().__init__(
+            key_ring.active.algorithm,
+            audience=api_settings.AUDIENCE,
+            issuer=api_settings.ISSUER,
+            leeway=api_settings.LEEWAY,
+            json_encoder=api_settings.JSON_ENCODER,
+        )
+        self.key_ring = key_ring
+
+    def get_signing_key(self, token):
+        try:
+            kid = jwt.get_unverified_header(token).get("kid")
+        except InvalidTokenError as e:
+            raise TokenBackendError(_("Token is invalid")) from e
+
+        key = self.key_ring.get(kid)
+        if key is None:
+            raise TokenBackendError(_("Token is invalid"))
+        return key
+
+    def encode(self, payload):
+        jwt_payload = payload.copy()
+        if self.audience is not None:
+            jwt_payload["aud"] = self.audience
+        if self.issuer is not None:
+            jwt_payload["iss"] = self.issuer
+
+        key = self.key_ring.active
+        return jwt.encode(
+            jwt_payload,
+            key.private_key,
+            algorithm=key.algorithm,
+            headers={"kid": key.kid},
+            json_encoder=self.json_encoder,
+        )
+
+    def decode(self, token, verify=True):
+        key = self.get_signing_key(token)
+        try:
+            return jwt.decode(
+                token,
+                key.public_key,
+                algorithms=[key.algorithm],
+                audience=self.audience,
+                issuer=self.issuer,
+                leeway=self.get_leeway(),
+                options={
+                    "verify_aud": self.audience is not None,
+                    "verify_signature": verify,
+                },
+            )
+        except ExpiredSignatureError as e:
+            raise TokenBackendExpiredToken(_("Token is expired")) from e
+        except InvalidTokenError as e:
+            raise TokenBackendError(_("Token is invalid")) from e
+
+
+@lru_cache(maxsize=None)
+def get_token_backend():
+    key_ring = get_key_ring()
+    if key_ring is None:
+        return hmac_token_backend
+    return KeyRingTokenBackend(key_ring)
+
+
+@receiver(setting_changed)
+def reset_token_backend(*, setting, **kwargs):
+    if setting in ("JWT_SIGNING_KEYS", "SIMPLE_JWT"):
+        get_token_backend.cache_clear()
+
+
+class KeyRingTokenMixin:
+    @property
+    def token_backend(self):
+        return get_token_backend()
+
+
+class RevocationMixin:
+    """
+    Embed the user's token generation in new tokens and reject tokens whose
+    generation or device session has since been revoked.
+    """
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token[GENERATION_CLAIM] = user.token_generation
+        return token
+
+    def verify(self, *args, **kwargs):
+        super().verify(*args, **kwargs)
+        self.check_revocation()
+
+    def check_revocation(self):
+        user_id = self.payload.get(api_settings.USER_ID_CLAIM)
+        if user_id is None:
+            return
+
+        generation, session_revoked = get_revocation_state(
+            user_id, self.payload.get(SESSION_CLAIM)
+        )
+        if session_revoked:
+            raise TokenError(_("Token has been revoked"))
+        if generation is None:
+            return
+        if self.payload.get(GENERATION_CLAIM, 0) != generation:
+            raise TokenError(_("Token has been revoked"))
+
+
+class AccessToken(KeyRingTokenMixin, RevocationMixin, tokens.AccessToken):
+    pass
+
+
+class RefreshToken(KeyRingTokenMixin, RevocationMixin, tokens.RefreshToken):
+    access_token_class = AccessToken
+
+    @classmethod
+    def for_device(cls, user, request):
+        """
+        Return a refresh token for the user bound to a new device session
+        describing the client that made the request.
+        """
+        token = cls.for_user(user)
+        client_ip, _routable = get_client_ip(request)
+        session = DeviceSession.objects.create(
+            user=user,
+            session_id=uuid4().hex,
+            generation=user.token_generation,
+            user_agent=request.META.get("HTTP_USER_AGENT", "")[:255],
+            ip_address=client_ip,
+            expires_at=datetime_from_epoch(token["exp"]),
+        )
+        token[SESSION_CLAIM] = session.session_id
+        signed_in.send(sender=cls, user=user, request=request)
+        return token
+
+    def check_revocation(self):
+        super().check_revocation()
+
+        # Refresh tokens outlive the cached revocation flag, so confirm
+        # against the session record itself.
+        session_id = self.payload.get(SESSION_CLAIM)
+        if not session_id:
+            return
+        if DeviceSession.objects.filter(
+            session_id=session_id, revoked_at__isnull=False
+        ).exists():
+            raise TokenError(_("Token has been revoked"))
@@ -1,7 +1,7 @@
 from django.urls import path
 from rest_framework_simplejwt.views import TokenBlacklistView, TokenRefreshView
 
-from . import views
+from . import serializers, views
 
 app_name = "accounts"
 
@@ -17,6 +17,16 @@ urlpatterns = [
         views.LoginView.as_view(),
         name="login",
     ),
+    path(
+        "google/",
+        views.GoogleLoginView.as_view(),
+        name="google-login",
+    ),
+    path(
+        "google/callback/",
+        views.GoogleCallbackView.as_view(),
+        name="google-callback",
+    ),
     path(
         "logout/",
         views.LogoutView.as_view(),
@@ -25,14 +35,21 @@ urlpatterns = [
     # Token management
     path(
         "token/refresh/",
-        TokenRefreshView.as_view(),
+        TokenRefreshView.as_view(serializer_class=serializers.TokenRefreshSerializer),
         name="token-refresh",
     ),
     path(
         "token/blacklist/",
-        TokenBlacklistView.as_view(),
+        TokenBlacklistView.as_view(
+            serializer_class=serializers.TokenBlacklistSerializer
+        ),
         name="token-blacklist",
     ),
+    path(
+        "token/introspect/",
+        views.TokenIntrospectionView.as_view(),
+        name="token-introspect",
+    ),
     # User management
     path(
         "user/",
@@ -44,6 +61,27 @@ urlpatterns = [
         views.UserProfileView.as_view(),
         name="user-profile",
     ),
+    path(
+        "users/bulk/",
+        views.BulkUserActionView.as_view(),
+        name="user-bulk-action",
+    ),
+    # Device sessions
+    path(
+        "devices/",
+        views.DeviceListView.as_view(),
+        name="device-list",
+    ),
+    path(
+        "devices/revoke-all/",
+        views.RevokeAllDevicesView.as_view(),
+        name="device-revoke-all",
+    ),
+    path(
+        "devices/<str:session_id>/",
+        views.DeviceRevokeView.as_view(),
+        name="device-revoke",
+    ),
     # Password management
     path(
         "password/change/",
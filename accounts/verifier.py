@@ -0,0 +1,77 @@
+"""
+Local verification of tokens issued by the accounts service.
+
+Downstream services (catalog, orders, ...) use this to check access tokens
+without calling back into the accounts API. It only depends on PyJWT, so it
+can be copied into a service that does not run Django:
+
+    verifier = TokenVerifier("https://accounts.example.com/.well-known/jwks.json")
+    claims = verifier.verify(raw_token)
+
+The key set is fetched once and cached for ``cache_lifespan`` seconds. A
+token signed with a key that is not in the cache (after a rotation) triggers
+a single refetch before it is rejected.
+"""
+
+import jwt
+
+
+class InvalidToken(Exception):
+    """Raised when a token cannot be verified"""
+
+
+class TokenVerifier:
+    """Verify accounts JWTs against the published JWKS document"""
+
+    def __init__(
+        self,
+        jwks_url,
+        audience=None,
+        issuer=None,
+        token_type="access",
+        leeway=0,
+        cache_lifespan=300,
+        timeout=5,
+    ):
+        self.audience = audience
+        self.issuer = issuer
+        self.token_type = token_type
+        self.leeway = leeway
+        self._jwks_client = jwt.PyJWKClient(
+            jwks_url,
+            cache_jwk_set=True,
+            lifespan=cache_lifespan,
+            timeout=timeout,
+        )
+
+    def verify(self, token):
+        """
+        Verify the token signature, expiry and type.
+
+        Args:
+            token: Encoded JWT
+
+        Returns:
+            dict: The token claims
+
+        Raises:
+            InvalidToken: If the token is malformed, expired, signed with an
+                unknown key or of the wrong type
+        """
+        try:
+            signing_key = self._jwks_client.get_signing_key_from_jwt(token)
+            claims = jwt.decode(
+                token,
+                signing_key.key,
+                algorithms=[signing_key.algorithm_name],
+                audience=self.audience,
+                issuer=self.issuer,
+                leeway=self.leeway,
+                options={"verify_aud": self.audience is not None},
+            )
+        except jwt.PyJWTError as e:
+            raise InvalidToken(str(e)) from e
+
+        if self.token_type and claims.get("token_type") != self.token_type:
+            raise InvalidToken("Token has wrong type")
+        return claims
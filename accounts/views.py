@@ -1,17 +1,34 @@
+from django.conf import settings
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework import status
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework_simplejwt.tokens import RefreshToken
 
-from .models import CustomUser, UserProfile
-from .serializers import (ChangePasswordSerializer, LoginSerializer,
+from e_commerce_api.idempotency import (IDEMPOTENCY_KEY_PARAMETER,
+                                        IdempotentMixin, idempotent)
+
+from . import audit
+from .activity import activity_tracker
+from .bulk import apply_bulk_action
+from .caching import get_cached_user_payload
+from .google_oauth import GoogleAuthHandler
+from .introspection import introspect_tokens
+from .jwks import get_key_ring
+from .models import AuthEvent, CustomUser, DeviceSession, UserProfile
+from .permissions import IsInternalService
+from .revocation import revoke_all_tokens, revoke_session
+from .serializers import (BulkUserActionSerializer, ChangePasswordSerializer,
+                          DeviceSessionSerializer, GoogleAuthSerializer,
+                          GoogleCallbackSerializer, LoginSerializer,
                           PasswordResetConfirmSerializer,
                           PasswordResetRequestSerializer,
-                          RegistrationSerializer, UserDetailSerializer,
-                          UserProfileSerializer)
+                          RegistrationSerializer, TokenIntrospectionSerializer,
+                          UserDetailSerializer, UserProfileSerializer)
+from .tokens import RefreshToken
 
 
 class RegistrationView(APIView):
@@ -26,6 +43,7 @@ class RegistrationView(APIView):
     @swagger_auto_schema(
         operation_description="Register a new user",
         request_body=RegistrationSerializer,
+        manual_parameters=[IDEMPOTENCY_KEY_PARAMETER],
         responses={
             201: openapi.Response(
                 description="User registered successfully",
@@ -42,11 +60,13 @@ class RegistrationView(APIView):
             400: "Bad request - validation errors",
         },
     )
+    @idempotent
     def post(self, request):
         serializer = RegistrationSerializer(data=request.data)
         if serializer.is_valid():
             user = serializer.save()
-            refresh = RefreshToken.for_user(user)
+            refresh = RefreshToken.for_device(user, request)
+            activity_tracker.record_login(user)
             return Response(
                 {
                     "message": "User registered successfully",
@@ -91,7 +111,9 @@ class LoginView(APIView):
         serializer = LoginSerializer(data=request.data)
         if serializer.is_valid():
             user = serializer.validated_data["user"]
-            refresh = RefreshToken.for_user(user)
+            refresh = RefreshToken.for_device(user, request)
+            activity_tracker.record_login(user)
+            audit.record(request, AuthEvent.LOGIN, user=user)
             return Response(
                 {
                     "message": "Login successful",
@@ -101,6 +123,138 @@ class LoginView(APIView):
                 },
                 status=status.HTTP_200_OK,
             )
+        audit.record(
+            request, AuthEvent.LOGIN_FAILED, email=str(request.data.get("email", ""))
+        )
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class GoogleLoginView(APIView):
+    """
+    Google sign-in endpoint.
+
+    POST: Authenticate with a Google ID token, returns JWT tokens.
+    Creates the account on first sign-in.
+    """
+
+    permission_classes = [AllowAny]
+
+    @swagger_auto_schema(
+        operation_description="Login with a Google ID token",
+        request_body=GoogleAuthSerializer,
+        responses={
+            200: openapi.Response(
+                description="Login successful",
+                schema=openapi.Schema(
+                    type=openapi.TYPE_OBJECT,
+                    properties={
+                        "message": openapi.Schema(type=openapi.TYPE_STRING),
+                        "user": openapi.Schema(type=openapi.TYPE_OBJECT),
+                        "created": openapi.Schema(type=openapi.TYPE_BOOLEAN),
+                        "refresh": openapi.Schema(type=openapi.TYPE_STRING),
+                        "access": openapi.Schema(type=openapi.TYPE_STRING),
+                    },
+                ),
+            ),
+            400: "Invalid Google token",
+        },
+    )
+    def post(self, request):
+        serializer = GoogleAuthSerializer(data=request.data)
+        if serializer.is_valid():
+            idinfo = GoogleAuthHandler.verify_google_token(
+                serializer.validated_data["token"]
+            )
+            return self.login(request, idinfo)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    def login(self, request, idinfo):
+        """Sign in the user behind a verified Google ID token"""
+        if idinfo is None:
+            audit.record(request, AuthEvent.GOOGLE_LOGIN_FAILED, reason="invalid_token")
+            return Response(
+                {"error": "Invalid Google token"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            user, created = GoogleAuthHandler.get_or_create_user(idinfo)
+        except ValueError as e:
+            audit.record(
+                request,
+                AuthEvent.GOOGLE_LOGIN_FAILED,
+                email=idinfo.get("email", ""),
+                reason=str(e),
+            )
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if not user.is_active:
+            audit.record(
+                request, AuthEvent.GOOGLE_LOGIN_FAILED, user=user, reason="inactive"
+            )
+            return Response(
+                {"error": "User account is inactive."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        activity_tracker.record_login(user)
+        audit.record(request, AuthEvent.GOOGLE_LOGIN, user=user, created=created)
+        return Response(
+            {
+                "message": "Google login successful",
+                "user": UserDetailSerializer(user).data,
+                "created": created,
+                **GoogleAuthHandler.get_tokens_for_user(user, request),
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
+class GoogleCallbackView(GoogleLoginView):
+    """
+    Google OAuth callback endpoint.
+
+    POST: Exchange a Google authorization code for an ID token and sign in
+    with it, returns JWT tokens.
+    """
+
+    permission_classes = [AllowAny]
+
+    @swagger_auto_schema(
+        operation_description="Login with a Google authorization code",
+        request_body=GoogleCallbackSerializer,
+        responses={
+            200: openapi.Response(
+                description="Login successful",
+                schema=openapi.Schema(
+                    type=openapi.TYPE_OBJECT,
+                    properties={
+                        "message": openapi.Schema(type=openapi.TYPE_STRING),
+                        "user": openapi.Schema(type=openapi.TYPE_OBJECT),
+                        "created": openapi.Schema(type=openapi.TYPE_BOOLEAN),
+                        "refresh": openapi.Schema(type=openapi.TYPE_STRING),
+                        "access": openapi.Schema(type=openapi.TYPE_STRING),
+                    },
+                ),
+            ),
+            400: "Invalid authorization code",
+        },
+    )
+    def post(self, request):
+        serializer = GoogleCallbackSerializer(data=request.data)
+        if serializer.is_valid():
+            token_response = GoogleAuthHandler.exchange_code_for_token(
+                serializer.validated_data["code"],
+                getattr(settings, "GOOGLE_OAUTH2_REDIRECT_URI", "postmessage"),
+            )
+            if not token_response or "id_token" not in token_response:
+                audit.record(
+                    request, AuthEvent.GOOGLE_LOGIN_FAILED, reason="invalid_code"
+                )
+                return Response(
+                    {"error": "Invalid authorization code"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            idinfo = GoogleAuthHandler.verify_google_token(token_response["id_token"])
+            return self.login(request, idinfo)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
@@ -131,6 +285,7 @@ class LogoutView(APIView):
             if refresh_token:
                 token = RefreshToken(refresh_token)
                 token.blacklist()
+            audit.record(request, AuthEvent.LOGOUT, user=request.user)
             return Response(
                 {"message": "Logout successful"},
                 status=status.HTTP_200_OK,
@@ -158,8 +313,10 @@ class UserDetailView(APIView):
         responses={200: UserDetailSerializer},
     )
     def get(self, request):
-        serializer = UserDetailSerializer(request.user)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        payload = get_cached_user_payload(
+            request.user.pk, lambda: UserDetailSerializer(request.user).data
+        )
+        return Response(payload, status=status.HTTP_200_OK)
 
     @swagger_auto_schema(
         operation_description="Update authenticated user details",
@@ -193,12 +350,13 @@ class UserDetailView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class ChangePasswordView(APIView):
+class ChangePasswordView(IdempotentMixin, APIView):
     """
     Change password endpoint.
 
     POST: Change the authenticated user's password.
     Requires old password and new password confirmation.
+    Signs out every other device and returns fresh tokens for this one.
     Requires authentication.
     """
 
@@ -207,6 +365,7 @@ class ChangePasswordView(APIView):
     @swagger_auto_schema(
         operation_description="Change authenticated user password",
         request_body=ChangePasswordSerializer,
+        manual_parameters=[IDEMPOTENCY_KEY_PARAMETER],
         responses={
             200: "Password changed successfully",
             400: "Invalid password or validation error",
@@ -218,9 +377,16 @@ class ChangePasswordView(APIView):
             context={"request": request},
         )
         if serializer.is_valid():
-            serializer.save()
+            user = serializer.save()
+            audit.record(request, AuthEvent.PASSWORD_CHANGE, user=user)
+            # Every existing session was revoked; keep this device signed in.
+            refresh = RefreshToken.for_device(user, request)
             return Response(
-                {"message": "Password changed successfully"},
+                {
+                    "message": "Password changed successfully",
+                    "refresh": str(refresh),
+                    "access": str(refresh.access_token),
+                },
                 status=status.HTTP_200_OK,
             )
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -247,6 +413,11 @@ class PasswordResetRequestView(APIView):
     def post(self, request):
         serializer = PasswordResetRequestSerializer(data=request.data)
         if serializer.is_valid():
+            audit.record(
+                request,
+                AuthEvent.PASSWORD_RESET_REQUEST,
+                email=serializer.validated_data["email"],
+            )
             return Response(
                 {"message": "Password reset link sent to your email"},
                 status=status.HTTP_200_OK,
@@ -260,6 +431,7 @@ class PasswordResetConfirmView(APIView):
 
     POST: Confirm password reset using the token sent via email.
     Requires uidb64 and token from the password reset link.
+    Signs the user out of every device.
     """
 
     permission_classes = [AllowAny]
@@ -273,10 +445,13 @@ class PasswordResetConfirmView(APIView):
         },
     )
     def post(self, request, uidb64, token):
-        serializer = PasswordResetConfirmSerializer(data=request.data)
+        serializer = PasswordResetConfirmSerializer(
+            data=request.data,
+            context={"uidb64": uidb64, "token": token},
+        )
         if serializer.is_valid():
-            # TODO: Implement token validation and user lookup
-            # For now, this is a placeholder for your password reset logic
+            user = serializer.save()
+            audit.record(request, AuthEvent.PASSWORD_RESET, user=user)
             return Response(
                 {"message": "Password reset successfully"},
                 status=status.HTTP_200_OK,
@@ -354,3 +529,205 @@ class UserProfileView(APIView):
                 {"error": "Profile not found"},
                 status=status.HTTP_404_NOT_FOUND,
             )
+
+
+class JWKSView(APIView):
+    """
+    JSON Web Key Set endpoint.
+
+    GET: Publish the public keys used to sign access and refresh tokens so
+    other services can verify them locally.
+    """
+
+    permission_classes = [AllowAny]
+    authentication_classes = []
+
+    @swagger_auto_schema(
+        operation_description="Get the public JWT signing keys",
+        responses={200: "JSON Web Key Set"},
+    )
+    def get(self, request):
+        key_ring = get_key_ring()
+        response = Response(
+            key_ring.jwks() if key_ring else {"keys": []},
+            status=status.HTTP_200_OK,
+        )
+        patch_cache_control(
+            response,
+            public=True,
+            max_age=getattr(settings, "JWKS_CACHE_MAX_AGE", 3600),
+        )
+        return response
+
+
+class TokenIntrospectionView(APIView):
+    """
+    Batch token introspection endpoint for internal services.
+
+    POST: Report validity, user id, role and revocation status for each of
+    the given access or refresh tokens.
+    Requires a service token in the X-Service-Token header.
+    """
+
+    permission_classes = [IsInternalService]
+    authentication_classes = []
+
+    @swagger_auto_schema(
+        operation_description="Introspect a batch of JWTs",
+        request_body=TokenIntrospectionSerializer,
+        responses={
+            200: openapi.Response(
+                description="One result per token, in request order",
+                schema=openapi.Schema(
+                    type=openapi.TYPE_OBJECT,
+                    properties={
+                        "results": openapi.Schema(
+                            type=openapi.TYPE_ARRAY,
+                            items=openapi.Schema(type=openapi.TYPE_OBJECT),
+                        ),
+                    },
+                ),
+            ),
+            400: "Validation error",
+            403: "Missing or invalid service token",
+        },
+    )
+    def post(self, request):
+        serializer = TokenIntrospectionSerializer(data=request.data)
+        if serializer.is_valid():
+            return Response(
+                {"results": introspect_tokens(serializer.validated_data["tokens"])},
+                status=status.HTTP_200_OK,
+            )
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class DeviceListView(APIView):
+    """
+    Active devices endpoint.
+
+    GET: List the devices currently signed in to the authenticated user's
+    account.
+    Requires authentication.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description="List signed-in devices",
+        responses={200: DeviceSessionSerializer(many=True)},
+    )
+    def get(self, request):
+        sessions = DeviceSession.objects.filter(
+            user=request.user,
+            generation=request.user.token_generation,
+            revoked_at__isnull=True,
+            expires_at__gt=timezone.now(),
+        ).order_by("-created_at")
+        serializer = DeviceSessionSerializer(
+            sessions, many=True, context={"request": request}
+        )
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class DeviceRevokeView(APIView):
+    """
+    Device revocation endpoint.
+
+    DELETE: Sign out a single device of the authenticated user.
+    Requires authentication.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description="Sign out a single device",
+        responses={
+            200: "Device signed out",
+            404: "Device not found",
+        },
+    )
+    def delete(self, request, session_id):
+        try:
+            session = DeviceSession.objects.get(
+                user=request.user, session_id=session_id, revoked_at__isnull=True
+            )
+        except DeviceSession.DoesNotExist:
+            return Response(
+                {"error": "Device not found"},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        revoke_session(session)
+        return Response({"message": "Device signed out"}, status=status.HTTP_200_OK)
+
+
+class RevokeAllDevicesView(APIView):
+    """
+    Sign out everywhere endpoint.
+
+    POST: Revoke every token issued to the authenticated user, including
+    the one used for this request.
+    Requires authentication.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description="Sign out of every device",
+        responses={200: "Signed out of every device"},
+    )
+    def post(self, request):
+        revoke_all_tokens(request.user)
+        return Response(
+            {"message": "Signed out of every device"},
+            status=status.HTTP_200_OK,
+        )
+
+
+class BulkUserActionView(APIView):
+    """
+    Bulk user state changes for staff.
+
+    POST: Activate, deactivate or change the role of the users selected by
+    ``ids`` and/or ``filters``. Users are changed in chunks with set-based
+    UPDATEs; deactivated users are signed out everywhere. The requesting
+    user is never included.
+    Requires a staff account.
+    """
+
+    permission_classes = [IsAdminUser]
+
+    @swagger_auto_schema(
+        operation_description="Apply a state change to many users",
+        request_body=BulkUserActionSerializer,
+        manual_parameters=[IDEMPOTENCY_KEY_PARAMETER],
+        responses={
+            200: openapi.Response(
+                description="Summary of the change",
+                schema=openapi.Schema(
+                    type=openapi.TYPE_OBJECT,
+                    properties={
+                        "matched": openapi.Schema(type=openapi.TYPE_INTEGER),
+                        "updated": openapi.Schema(type=openapi.TYPE_INTEGER),
+                        "batches": openapi.Schema(type=openapi.TYPE_INTEGER),
+                    },
+                ),
+            ),
+            400: "Validation error",
+            403: "Staff account required",
+        },
+    )
+    @idempotent
+    def post(self, request):
+        serializer = BulkUserActionSerializer(
+            data=request.data, context={"request": request}
+        )
+        if serializer.is_valid():
+            summary = apply_bulk_action(
+                serializer.get_queryset(),
+                serializer.validated_data["action"],
+                role=serializer.validated_data.get("role"),
+                actor=request.user,
+            )
+            return Response(summary, status=status.HTTP_200_OK)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,17 @@
+from django.contrib import admin
+
+from .models import Cart, CartItem
+
+
+class CartItemInline(admin.TabularInline):
+    model = CartItem
+    raw_id_fields = ("product",)
+    extra = 0
+
+
+@admin.register(Cart)
+class CartAdmin(admin.ModelAdmin):
+    list_display = ("user", "updated_at")
+    search_fields = ("user__email",)
+    raw_id_fields = ("user",)
+    inlines = [CartItemInline]
@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class CartConfig(AppConfig):
+    default_auto_field = "django.db.models.BigAutoField"
+    name = "cart"
+
+    def ready(self):
+        # Connect the receiver that merges anonymous carts on sign-in.
+        from . import signals  # noqa: F401
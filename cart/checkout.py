@@ -0,0 +1,39 @@
+"""Writing carts from the cart store to the database at checkout"""
+
+from django.db import transaction
+
+from catalog.models import Product
+
+from .models import Cart, CartItem
+from .store import get_cart_store, user_key
+
+
+def persist_cart(user):
+    """
+    Save ``user``'s cart from the cart store as their Cart, replacing the
+    one saved by an earlier checkout, and return it. Products that were
+    deleted or are no longer available are dropped from the stored cart.
+    """
+    key = user_key(user.pk)
+    items = get_cart_store().items(key)
+    products = Product.objects.filter(is_available=True).in_bulk(list(items))
+    gone = [product_id for product_id in items if product_id not in products]
+    if gone:
+        get_cart_store().remove(key, *gone)
+
+    with transaction.atomic():
+        cart, created = Cart.objects.get_or_create(user=user)
+        if not created:
+            cart.items.all().delete()
+            cart.save(update_fields=["updated_at"])
+        CartItem.objects.bulk_create(
+            CartItem(
+                cart=cart,
+                product=products[product_id],
+                quantity=quantity,
+                unit_price=products[product_id].price,
+            )
+            for product_id, quantity in items.items()
+            if product_id in products
+        )
+    return cart
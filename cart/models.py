@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.db import models
+
+
+class Cart(models.Model):
+    """
+    The cart a user last checked out with. Carts being filled live in the
+    cart store (see cart.store) and are written here at checkout.
+    """
+
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="cart"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Cart of {self.user}"
+
+    @property
+    def total(self):
+        return sum((item.subtotal for item in self.items.all()), 0)
+
+
+class CartItem(models.Model):
+    cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name="items")
+    product = models.ForeignKey(
+        "catalog.Product", on_delete=models.CASCADE, related_name="+"
+    )
+    quantity = models.PositiveIntegerField()
+    # Price when the cart was checked out.
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["cart", "product"], name="cart_item_product_unique"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id}"
+
+    @property
+    def subtotal(self):
+        return self.unit_price * self.quantity
@@ -0,0 +1,58 @@
+from rest_framework import serializers
+
+from catalog.models import Product
+
+from .models import Cart, CartItem
+from .store import get_cart_store
+
+
+class CartProductSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Product
+        fields = ["id", "name", "slug", "price", "is_available"]
+
+
+def validate_max_quantity(value):
+    """Check ``value`` against the cart store's cap, read when validating"""
+    max_quantity = get_cart_store().max_quantity
+    if value > max_quantity:
+        raise serializers.ValidationError(
+            serializers.IntegerField.default_error_messages["max_value"].format(
+                max_value=max_quantity
+            ),
+            code="max_value",
+        )
+    return value
+
+
+class AddCartItemSerializer(serializers.Serializer):
+    product = serializers.PrimaryKeyRelatedField(
+        queryset=Product.objects.filter(is_available=True)
+    )
+    quantity = serializers.IntegerField(
+        min_value=1, default=1, validators=[validate_max_quantity]
+    )
+
+
+class CartQuantitySerializer(serializers.Serializer):
+    """New quantity of a product in the cart; 0 removes it"""
+
+    quantity = serializers.IntegerField(min_value=0, validators=[validate_max_quantity])
+
+
+class CartItemSerializer(serializers.ModelSerializer):
+    product = CartProductSerializer(read_only=True)
+    subtotal = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+
+    class Meta:
+        model = CartItem
+        fields = ["product", "quantity", "unit_price", "subtotal"]
+
+
+class CheckedOutCartSerializer(serializers.ModelSerializer):
+    items = CartItemSerializer(many=True, read_only=True)
+    total = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+
+    class Meta:
+        model = Cart
+        fields = ["id", "items", "total", "updated_at"]
@@ -0,0 +1,21 @@
+import logging
+
+from django.dispatch import receiver
+
+from accounts.tokens import signed_in
+
+from .store import merge_session_cart
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(signed_in)
+def merge_anonymous_cart(sender, user, request, **kwargs):
+    """
+    Move the cart the client filled before signing in into the user's cart
+    """
+    try:
+        merge_session_cart(request, user)
+    except Exception:
+        # Signing in must not fail because the cart store is unavailable.
+        logger.exception("Failed to merge the anonymous cart of user %s", user.pk)
@@ -0,0 +1,265 @@
+"""
+Shopping carts kept outside the database.
+
+Adding to or changing a cart is the most frequent write of a shop, so carts
+live in Redis, one hash per cart mapping product ids to quantities, and
+reach the database only at checkout (see cart.checkout). A signed-in user's
+cart is keyed by the user id. An anonymous cart is keyed by a cart session
+id, handed to the client in the ``X-Cart-Session`` response header and sent
+back in the request header of the same name. On sign-in the anonymous cart
+is merged into the user's cart by a Lua script, so the move is atomic: no
+item is lost or counted twice when requests race.
+
+Carts expire after ``CART_ANONYMOUS_TTL`` or ``CART_USER_TTL`` seconds
+without changes. ``LocalCartStore`` keeps carts in process memory with the
+same behaviour, for development and tests.
+
+Settings:
+
+    CART_BACKEND = "redis"              # or "local" (one process only);
+                                        # default: "redis" on django-redis
+    CART_ANONYMOUS_TTL = 7 * 86400
+    CART_USER_TTL = 30 * 86400
+    CART_MAX_QUANTITY = 99              # per product
+"""
+
+import re
+import secrets
+import threading
+import time
+
+from django.conf import settings
+
+from e_commerce_api.tiered_cache import shared_store
+
+SESSION_HEADER = "X-Cart-Session"
+SESSION_ID_RE = re.compile(r"^[A-Za-z0-9_-]{22,64}$")
+
+# KEYS[1]: cart; ARGV: product id, quantity to add, cap, ttl.
+ADD_SCRIPT = """
+local quantity = redis.call('HINCRBY', KEYS[1], ARGV[1], ARGV[2])
+local cap = tonumber(ARGV[3])
+if quantity > cap then
+  redis.call('HSET', KEYS[1], ARGV[1], cap)
+  quantity = cap
+elseif quantity <= 0 then
+  redis.call('HDEL', KEYS[1], ARGV[1])
+  quantity = 0
+end
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+return quantity
+"""
+
+# KEYS[1]: anonymous cart, KEYS[2]: user cart; ARGV: cap, ttl.
+MERGE_SCRIPT = """
+local items = redis.call('HGETALL', KEYS[1])
+local cap = tonumber(ARGV[1])
+for i = 1, #items, 2 do
+  local quantity = redis.call('HINCRBY', KEYS[2], items[i], items[i + 1])
+  if quantity > cap then
+    redis.call('HSET', KEYS[2], items[i], cap)
+  end
+end
+if #items > 0 then
+  redis.call('DEL', KEYS[1])
+  redis.call('EXPIRE', KEYS[2], ARGV[2])
+end
+return #items / 2
+"""
+
+
+def new_session_id():
+    return secrets.token_urlsafe(24)
+
+
+def user_key(user_id):
+    return f"cart:user:{user_id}"
+
+
+def session_key(session_id):
+    return f"cart:session:{session_id}"
+
+
+def request_session_id(request):
+    """The valid cart session id sent with ``request``, or None"""
+    session_id = request.headers.get(SESSION_HEADER, "")
+    return session_id if SESSION_ID_RE.match(session_id) else None
+
+
+class BaseCartStore:
+    def __init__(self, anonymous_ttl=7 * 86400, user_ttl=30 * 86400, max_quantity=99):
+        self.anonymous_ttl = anonymous_ttl
+        self.user_ttl = user_ttl
+        self.max_quantity = max_quantity
+
+    def ttl(self, key):
+        return self.user_ttl if key.startswith("cart:user:") else self.anonymous_ttl
+
+
+class LocalCartStore(BaseCartStore):
+    """Carts kept in this process"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._lock = threading.Lock()
+        self._carts = {}
+        self._expires = {}
+
+    def _cart(self, key):
+        # Called with the lock held.
+        if self._expires.get(key, float("inf")) <= time.monotonic():
+            self._carts.pop(key, None)
+            self._expires.pop(key, None)
+        return self._carts.setdefault(key, {})
+
+    def _touch(self, key):
+        if self._carts.get(key):
+            self._expires[key] = time.monotonic() + self.ttl(key)
+        else:
+            self._carts.pop(key, None)
+            self._expires.pop(key, None)
+
+    def items(self, key):
+        with self._lock:
+            items = dict(self._cart(key))
+            self._touch(key)
+            return items
+
+    def add(self, key, product_id, quantity):
+        with self._lock:
+            cart = self._cart(key)
+            total = min(cart.get(product_id, 0) + quantity, self.max_quantity)
+            if total > 0:
+                cart[product_id] = total
+            else:
+                cart.pop(product_id, None)
+            self._touch(key)
+            return max(total, 0)
+
+    def set(self, key, product_id, quantity):
+        with self._lock:
+            cart = self._cart(key)
+            if quantity > 0:
+                cart[product_id] = min(quantity, self.max_quantity)
+            else:
+                cart.pop(product_id, None)
+            self._touch(key)
+
+    def remove(self, key, *product_ids):
+        with self._lock:
+            cart = self._cart(key)
+            for product_id in product_ids:
+                cart.pop(product_id, None)
+            self._touch(key)
+
+    def clear(self, key):
+        with self._lock:
+            self._carts.pop(key, None)
+            self._expires.pop(key, None)
+
+    def merge(self, source, target):
+        with self._lock:
+            items = self._cart(source)
+            del self._carts[source]
+            self._expires.pop(source, None)
+            cart = self._cart(target)
+            for product_id, quantity in items.items():
+                cart[product_id] = min(
+                    cart.get(product_id, 0) + quantity, self.max_quantity
+                )
+            if items:
+                self._touch(target)
+            return len(items)
+
+
+class RedisCartStore(BaseCartStore):
+    """Carts kept in Redis hashes shared by every process"""
+
+    def __init__(self, client, **kwargs):
+        super().__init__(**kwargs)
+        self.client = client
+        self._add = client.register_script(ADD_SCRIPT)
+        self._merge = client.register_script(MERGE_SCRIPT)
+
+    def items(self, key):
+        with self.client.pipeline() as pipe:
+            pipe.hgetall(key)
+            pipe.expire(key, self.ttl(key))
+            items, _ = pipe.execute()
+        return {
+            int(product_id): int(quantity) for product_id, quantity in items.items()
+        }
+
+    def add(self, key, product_id, quantity):
+        return int(
+            self._add(
+                keys=[key],
+                args=[product_id, quantity, self.max_quantity, self.ttl(key)],
+            )
+        )
+
+    def set(self, key, product_id, quantity):
+        if quantity <= 0:
+            self.remove(key, product_id)
+            return
+        with self.client.pipeline() as pipe:
+            pipe.hset(key, product_id, min(quantity, self.max_quantity))
+            pipe.expire(key, self.ttl(key))
+            pipe.execute()
+
+    def remove(self, key, *product_ids):
+        if product_ids:
+            self.client.hdel(key, *product_ids)
+
+    def clear(self, key):
+        self.client.delete(key)
+
+    def merge(self, source, target):
+        # Both keys must map to the same slot on Redis Cluster.
+        return int(
+            self._merge(
+                keys=[source, target],
+                args=[self.max_quantity, self.ttl(target)],
+            )
+        )
+
+
+def _options():
+    return {
+        "anonymous_ttl": getattr(settings, "CART_ANONYMOUS_TTL", 7 * 86400),
+        "user_ttl": getattr(settings, "CART_USER_TTL", 30 * 86400),
+        "max_quantity": getattr(settings, "CART_MAX_QUANTITY", 99),
+    }
+
+
+get_cart_store = shared_store(
+    "CART_BACKEND",
+    lambda client: RedisCartStore(client, **_options()),
+    lambda: LocalCartStore(**_options()),
+    depends_on=("CART_ANONYMOUS_TTL", "CART_USER_TTL", "CART_MAX_QUANTITY"),
+)
+
+
+def cart_key(request, create=False):
+    """
+    The key of the cart of ``request``: the user's cart when signed in,
+    else the cart of the session sent in the ``X-Cart-Session`` header.
+    Without a session, returns None, or a key for a new session id stored
+    on ``request.new_cart_session`` when ``create`` is true.
+    """
+    if request.user.is_authenticated:
+        return user_key(request.user.pk)
+    session_id = request_session_id(request)
+    if session_id is None:
+        if not create:
+            return None
+        session_id = request.new_cart_session = new_session_id()
+    return session_key(session_id)
+
+
+def merge_session_cart(request, user):
+    """Move the anonymous cart sent with ``request`` into ``user``'s cart"""
+    session_id = request_session_id(request)
+    if session_id is None:
+        return 0
+    return get_cart_store().merge(session_key(session_id), user_key(user.pk))
@@ -0,0 +1,290 @@
+import os
+import threading
+from decimal import Decimal
+from unittest import mock, skipUnless
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from accounts.factories import make_user
+from accounts.google_oauth import GoogleAuthHandler
+from catalog.models import Category, Product
+
+from . import store
+from .models import Cart
+from .store import SESSION_HEADER, LocalCartStore, get_cart_store, user_key
+
+
+class CartStoreContract:
+    """Behaviour every cart store must have; mixed into a TestCase"""
+
+    def make_store(self, **kwargs):
+        raise NotImplementedError
+
+    def setUp(self):
+        self.store = self.make_store(max_quantity=5)
+        self.anonymous = store.session_key(store.new_session_id())
+        self.user = user_key(f"test-{store.new_session_id()}")
+        self.addCleanup(self.store.clear, self.anonymous)
+        self.addCleanup(self.store.clear, self.user)
+
+    def test_add_sums_and_caps_quantities(self):
+        self.assertEqual(self.store.add(self.anonymous, 1, 2), 2)
+        self.assertEqual(self.store.add(self.anonymous, 1, 2), 4)
+        self.assertEqual(self.store.add(self.anonymous, 1, 2), 5)
+        self.assertEqual(self.store.items(self.anonymous), {1: 5})
+
+    def test_set_and_remove(self):
+        self.store.add(self.anonymous, 1, 1)
+        self.store.add(self.anonymous, 2, 1)
+        self.store.set(self.anonymous, 1, 3)
+        self.store.set(self.anonymous, 2, 0)
+        self.assertEqual(self.store.items(self.anonymous), {1: 3})
+        self.store.remove(self.anonymous, 1)
+        self.assertEqual(self.store.items(self.anonymous), {})
+
+    def test_merge_moves_items_and_caps(self):
+        self.store.add(self.anonymous, 1, 4)
+        self.store.add(self.anonymous, 2, 1)
+        self.store.add(self.user, 1, 3)
+        self.assertEqual(self.store.merge(self.anonymous, self.user), 2)
+        self.assertEqual(self.store.items(self.user), {1: 5, 2: 1})
+        self.assertEqual(self.store.items(self.anonymous), {})
+        # Merging again finds nothing to move.
+        self.assertEqual(self.store.merge(self.anonymous, self.user), 0)
+
+    def test_concurrent_adds_are_not_lost(self):
+        self.store.max_quantity = 1000
+
+        def add():
+            for _ in range(50):
+                self.store.add(self.user, 7, 1)
+
+        threads = [threading.Thread(target=add) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.store.items(self.user), {7: 200})
+
+
+class LocalCartStoreTests(CartStoreContract, SimpleTestCase):
+    """Tests for the in-process cart store"""
+
+    def make_store(self, **kwargs):
+        return LocalCartStore(**kwargs)
+
+    def test_carts_expire(self):
+        self.store.anonymous_ttl = 60
+        with mock.patch.object(store.time, "monotonic", return_value=1000.0):
+            self.store.add(self.anonymous, 1, 1)
+        with mock.patch.object(store.time, "monotonic", return_value=1059.0):
+            self.assertEqual(self.store.items(self.anonymous), {1: 1})
+        with mock.patch.object(store.time, "monotonic", return_value=1120.0):
+            self.assertEqual(self.store.items(self.anonymous), {})
+
+
+@skipUnless(os.environ.get("CART_TEST_REDIS_URL"), "CART_TEST_REDIS_URL not set")
+class RedisCartStoreTests(CartStoreContract, SimpleTestCase):
+    """Tests for the Redis cart store, against the server at CART_TEST_REDIS_URL"""
+
+    def make_store(self, **kwargs):
+        import redis
+
+        client = redis.Redis.from_url(os.environ["CART_TEST_REDIS_URL"])
+        return store.RedisCartStore(client, **kwargs)
+
+
+class CartAPITests(TestCase):
+    """Tests for the cart endpoints and merging on sign-in"""
+
+    url = "/api/v1/cart/"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user(
+            "shopper@example.com",
+            password="ShopperPass123!",
+            first_name="Shop",
+            last_name="Per",
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.addCleanup(get_cart_store().clear, user_key(self.user.pk))
+        category = Category.objects.create(name="Phones", slug="phones")
+        self.phone = Product.objects.create(
+            category=category, name="Phone", slug="phone", price=Decimal("100.00")
+        )
+        self.case = Product.objects.create(
+            category=category, name="Case", slug="case", price=Decimal("10.50")
+        )
+
+    def add(self, product, quantity=1, session=None):
+        headers = {SESSION_HEADER: session} if session else {}
+        return self.client.post(
+            f"{self.url}items/",
+            {"product": product.pk, "quantity": quantity},
+            format="json",
+            headers=headers,
+        )
+
+    def anonymous_cart(self):
+        response = self.add(self.phone)
+        session = response[SESSION_HEADER]
+        self.addCleanup(get_cart_store().clear, store.session_key(session))
+        self.add(self.case, 2, session=session)
+        return session
+
+    def test_anonymous_cart_uses_session_header(self):
+        session = self.anonymous_cart()
+        response = self.client.get(self.url, headers={SESSION_HEADER: session})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["count"], 3)
+        self.assertEqual(response.data["total"], "121.00")
+        self.assertEqual(
+            [
+                (line["product"]["slug"], line["quantity"])
+                for line in response.data["items"]
+            ],
+            [("phone", 1), ("case", 2)],
+        )
+        # Without the header there is no cart, and no new session either.
+        response = self.client.get(self.url)
+        self.assertEqual(response.data["items"], [])
+        self.assertNotIn(SESSION_HEADER, response)
+
+    def test_invalid_session_header_is_ignored(self):
+        response = self.add(self.phone, session="not a session")
+        new_session = response[SESSION_HEADER]
+        self.addCleanup(get_cart_store().clear, store.session_key(new_session))
+        self.assertNotEqual(new_session, "not a session")
+
+    def test_change_and_remove_items(self):
+        self.client.force_authenticate(user=self.user)
+        self.add(self.phone)
+        response = self.client.put(
+            f"{self.url}items/{self.phone.pk}/", {"quantity": 3}, format="json"
+        )
+        self.assertEqual(response.data["items"][0]["quantity"], 3)
+
+        response = self.client.put(
+            f"{self.url}items/{self.case.pk}/", {"quantity": 3}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        response = self.client.delete(f"{self.url}items/{self.phone.pk}/")
+        self.assertEqual(response.data["items"], [])
+
+    def test_unavailable_product_cannot_be_added(self):
+        self.phone.is_available = False
+        self.phone.save()
+        response = self.add(self.phone)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("product", response.data)
+
+    @override_settings(CART_MAX_QUANTITY=3)
+    def test_quantity_capped_by_current_settings(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.add(self.phone, 4)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data["quantity"][0].code, "max_value")
+        response = self.add(self.phone, 3)
+        self.assertEqual(response.data["items"][0]["quantity"], 3)
+
+    def test_deleted_products_leave_the_cart(self):
+        self.client.force_authenticate(user=self.user)
+        self.add(self.phone)
+        self.add(self.case)
+        self.case.delete()
+        response = self.client.get(self.url)
+        self.assertEqual(len(response.data["items"]), 1)
+        self.assertEqual(
+            get_cart_store().items(user_key(self.user.pk)), {self.phone.pk: 1}
+        )
+
+    def test_login_merges_anonymous_cart(self):
+        get_cart_store().add(user_key(self.user.pk), self.phone.pk, 2)
+        session = self.anonymous_cart()
+        response = self.client.post(
+            "/api/v1/accounts/login/",
+            {"email": "shopper@example.com", "password": "ShopperPass123!"},
+            format="json",
+            headers={SESSION_HEADER: session},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            get_cart_store().items(user_key(self.user.pk)),
+            {self.phone.pk: 3, self.case.pk: 2},
+        )
+        self.assertEqual(get_cart_store().items(store.session_key(session)), {})
+
+    def test_google_login_merges_anonymous_cart(self):
+        session = self.anonymous_cart()
+        idinfo = {
+            "sub": "google-shopper",
+            "email": "shopper@example.com",
+            "email_verified": True,
+            "given_name": "Shop",
+            "family_name": "Per",
+        }
+        with mock.patch.object(
+            GoogleAuthHandler, "verify_google_token", return_value=idinfo
+        ):
+            response = self.client.post(
+                "/api/v1/accounts/google/",
+                {"token": "token"},
+                format="json",
+                headers={SESSION_HEADER: session},
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            get_cart_store().items(user_key(self.user.pk)),
+            {self.phone.pk: 1, self.case.pk: 2},
+        )
+
+    def test_store_failure_does_not_block_login(self):
+        session = self.anonymous_cart()
+        with mock.patch.object(get_cart_store(), "merge", side_effect=ConnectionError):
+            with self.assertLogs("cart.signals", "ERROR"):
+                response = self.client.post(
+                    "/api/v1/accounts/login/",
+                    {"email": "shopper@example.com", "password": "ShopperPass123!"},
+                    format="json",
+                    headers={SESSION_HEADER: session},
+                )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_checkout_persists_cart_at_current_prices(self):
+        self.client.force_authenticate(user=self.user)
+        self.add(self.phone, 2)
+        self.add(self.case)
+        Product.objects.filter(pk=self.case.pk).update(is_available=False)
+
+        response = self.client.post(f"{self.url}checkout/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["total"], "200.00")
+        cart = Cart.objects.get(user=self.user)
+        self.assertEqual(
+            list(cart.items.values_list("product_id", "quantity", "unit_price")),
+            [(self.phone.pk, 2, Decimal("100.00"))],
+        )
+        self.assertEqual(
+            get_cart_store().items(user_key(self.user.pk)), {self.phone.pk: 2}
+        )
+
+        # A later checkout replaces the saved cart.
+        self.client.put(
+            f"{self.url}items/{self.phone.pk}/", {"quantity": 1}, format="json"
+        )
+        self.client.post(f"{self.url}checkout/")
+        self.assertEqual(cart.items.get().quantity, 1)
+
+    def test_checkout_requires_items_and_sign_in(self):
+        response = self.client.post(f"{self.url}checkout/")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post(f"{self.url}checkout/")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,16 @@
+from django.urls import path
+
+from . import views
+
+app_name = "cart"
+
+urlpatterns = [
+    path("", views.CartView.as_view(), name="cart"),
+    path("items/", views.CartItemListView.as_view(), name="cart-items"),
+    path(
+        "items/<int:product_id>/",
+        views.CartItemDetailView.as_view(),
+        name="cart-item",
+    ),
+    path("checkout/", views.CheckoutView.as_view(), name="checkout"),
+]
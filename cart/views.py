@@ -0,0 +1,205 @@
+from decimal import Decimal
+
+from django.db.models import Prefetch, prefetch_related_objects
+from drf_yasg import openapi
+from drf_yasg.utils import swagger_auto_schema
+from rest_framework import status
+from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from catalog.models import Product
+
+from .checkout import persist_cart
+from .models import CartItem
+from .serializers import (AddCartItemSerializer, CartProductSerializer,
+                          CartQuantitySerializer, CheckedOutCartSerializer)
+from .store import SESSION_HEADER, cart_key, get_cart_store
+
+CART_SESSION_PARAMETER = openapi.Parameter(
+    SESSION_HEADER,
+    openapi.IN_HEADER,
+    description="Cart session id of an anonymous cart, as returned when "
+    "the first item was added",
+    type=openapi.TYPE_STRING,
+)
+
+CART_RESPONSE = openapi.Response(
+    description="Cart contents",
+    schema=openapi.Schema(
+        type=openapi.TYPE_OBJECT,
+        properties={
+            "items": openapi.Schema(
+                type=openapi.TYPE_ARRAY,
+                items=openapi.Schema(type=openapi.TYPE_OBJECT),
+            ),
+            "count": openapi.Schema(type=openapi.TYPE_INTEGER),
+            "total": openapi.Schema(type=openapi.TYPE_STRING),
+        },
+    ),
+)
+
+
+def cart_response(request, key):
+    """The contents of cart ``key``, priced at current prices"""
+    items = get_cart_store().items(key) if key else {}
+    products = Product.objects.in_bulk(list(items))
+    gone = [product_id for product_id in items if product_id not in products]
+    if gone:
+        get_cart_store().remove(key, *gone)
+
+    lines, total = [], Decimal("0.00")
+    for product_id in sorted(products):
+        product, quantity = products[product_id], items[product_id]
+        subtotal = product.price * quantity
+        if product.is_available:
+            total += subtotal
+        lines.append(
+            {
+                "product": CartProductSerializer(product).data,
+                "quantity": quantity,
+                "subtotal": str(subtotal),
+            }
+        )
+    response = Response(
+        {
+            "items": lines,
+            "count": sum(line["quantity"] for line in lines),
+            "total": str(total),
+        },
+        status=status.HTTP_200_OK,
+    )
+    new_session = getattr(request, "new_cart_session", None)
+    if new_session:
+        response[SESSION_HEADER] = new_session
+    return response
+
+
+class CartView(APIView):
+    """
+    Shopping cart endpoint.
+
+    GET: The cart of the signed-in user, or of the anonymous cart session
+    sent in the X-Cart-Session header.
+    DELETE: Empty the cart.
+    """
+
+    permission_classes = [AllowAny]
+
+    @swagger_auto_schema(
+        operation_description="Get the cart",
+        manual_parameters=[CART_SESSION_PARAMETER],
+        responses={200: CART_RESPONSE},
+    )
+    def get(self, request):
+        return cart_response(request, cart_key(request))
+
+    @swagger_auto_schema(
+        operation_description="Empty the cart",
+        manual_parameters=[CART_SESSION_PARAMETER],
+        responses={204: "Cart emptied"},
+    )
+    def delete(self, request):
+        key = cart_key(request)
+        if key:
+            get_cart_store().clear(key)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class CartItemListView(APIView):
+    """
+    Cart items endpoint.
+
+    POST: Add a quantity of a product to the cart. Anonymous clients without
+    a cart session get a new one in the X-Cart-Session response header; send
+    it with later cart requests, and with the sign-in request to keep the
+    cart.
+    """
+
+    permission_classes = [AllowAny]
+
+    @swagger_auto_schema(
+        operation_description="Add a product to the cart",
+        request_body=AddCartItemSerializer,
+        manual_parameters=[CART_SESSION_PARAMETER],
+        responses={200: CART_RESPONSE, 400: "Validation error"},
+    )
+    def post(self, request):
+        serializer = AddCartItemSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        key = cart_key(request, create=True)
+        get_cart_store().add(
+            key,
+            serializer.validated_data["product"].pk,
+            serializer.validated_data["quantity"],
+        )
+        return cart_response(request, key)
+
+
+class CartItemDetailView(APIView):
+    """
+    Cart item endpoint.
+
+    PUT: Set the quantity of a product in the cart; 0 removes it.
+    DELETE: Remove a product from the cart.
+    """
+
+    permission_classes = [AllowAny]
+
+    @swagger_auto_schema(
+        operation_description="Change the quantity of a product in the cart",
+        request_body=CartQuantitySerializer,
+        manual_parameters=[CART_SESSION_PARAMETER],
+        responses={200: CART_RESPONSE, 400: "Validation error", 404: "No cart"},
+    )
+    def put(self, request, product_id):
+        serializer = CartQuantitySerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        key = cart_key(request)
+        if key is None or product_id not in get_cart_store().items(key):
+            return Response(
+                {"error": "Product is not in the cart."},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        get_cart_store().set(key, product_id, serializer.validated_data["quantity"])
+        return cart_response(request, key)
+
+    @swagger_auto_schema(
+        operation_description="Remove a product from the cart",
+        manual_parameters=[CART_SESSION_PARAMETER],
+        responses={200: CART_RESPONSE},
+    )
+    def delete(self, request, product_id):
+        key = cart_key(request)
+        if key:
+            get_cart_store().remove(key, product_id)
+        return cart_response(request, key)
+
+
+class CheckoutView(APIView):
+    """
+    Checkout endpoint.
+
+    POST: Save the signed-in user's cart, at current prices, for ordering.
+    Requires authentication.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description="Check out the cart",
+        responses={200: CheckedOutCartSerializer, 400: "Cart is empty"},
+    )
+    def post(self, request):
+        cart = persist_cart(request.user)
+        prefetch_related_objects(
+            [cart],
+            Prefetch("items", queryset=CartItem.objects.select_related("product")),
+        )
+        if not cart.items.all():
+            return Response(
+                {"error": "Cart is empty."}, status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(CheckedOutCartSerializer(cart).data, status=status.HTTP_200_OK)
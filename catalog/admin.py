@@ -0,0 +1,21 @@
+from django.contrib import admin
+
+from .models import Category, Product
+
+
+@admin.register(Category)
+class CategoryAdmin(admin.ModelAdmin):
+    list_display = ("name", "slug", "path", "depth", "created_at")
+    search_fields = ("name", "slug")
+    raw_id_fields = ("parent",)
+    prepopulated_fields = {"slug": ("name",)}
+
+
+@admin.register(Product)
+class ProductAdmin(admin.ModelAdmin):
+    list_display = ("name", "category", "price", "stock", "is_available")
+    list_filter = ("is_available", "category")
+    search_fields = ("name", "slug")
+    list_select_related = ("category",)
+    raw_id_fields = ("category",)
+    prepopulated_fields = {"slug": ("name",)}
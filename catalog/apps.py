@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+
+
+class CatalogConfig(AppConfig):
+    default_auto_field = "django.db.models.BigAutoField"
+    name = "catalog"
+
+    def ready(self):
+        # Connect the receivers that keep the in-memory search index, the
+        # cached category tree and the cached responses fresh.
+        from . import caching, search, tree  # noqa: F401
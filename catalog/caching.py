@@ -0,0 +1,90 @@
+"""
+Cache tags of the public catalog responses.
+
+The category and product GET endpoints are cached with
+e_commerce_api.response_cache. A page is tagged with every product and
+category it shows, so changing a product drops only the pages showing it.
+Listings are also tagged with the collections their rows are drawn from:
+
+- ``catalog.products``: which products a listing or search can return,
+  invalidated when a product is added or removed, or its category,
+  availability, name or description changes.
+- ``catalog.products.price``: the same for listings filtered or ordered
+  by price, invalidated when a price changes.
+- ``catalog.categories``: every category page, and product listings
+  filtered by a category subtree; invalidated by any category change.
+
+Writes that bypass ``save()``, such as the stock reservations of orders,
+call ``invalidate_products()`` themselves.
+"""
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from e_commerce_api.response_cache import invalidate_tags, tag_response
+
+from .models import Category, Product
+
+PRODUCTS_TAG = "catalog.products"
+PRICES_TAG = "catalog.products.price"
+CATEGORIES_TAG = "catalog.categories"
+
+# Fields deciding which listings and searches return a product.
+LISTED_FIELDS = {"category", "category_id", "is_available", "name", "description"}
+
+
+def product_tag(pk):
+    return f"catalog.product:{pk}"
+
+
+def category_tag(pk):
+    return f"catalog.category:{pk}"
+
+
+def tag_products(request, products, listing=False, by_price=False, by_category=False):
+    """Tag the response to ``request`` with ``products`` and their categories"""
+    tags = set()
+    for product in products:
+        tags.update((product_tag(product.pk), category_tag(product.category_id)))
+    if listing:
+        tags.add(PRODUCTS_TAG)
+    if by_price:
+        tags.add(PRICES_TAG)
+    if by_category:
+        tags.add(CATEGORIES_TAG)
+    tag_response(request, *tags)
+
+
+def tag_categories(request):
+    tag_response(request, CATEGORIES_TAG)
+
+
+def invalidate_products(product_ids):
+    """Drop the cached pages showing any of ``product_ids``"""
+    invalidate_tags(*(product_tag(pk) for pk in product_ids))
+
+
+def invalidate_categories():
+    invalidate_tags(CATEGORIES_TAG)
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, created, update_fields, **kwargs):
+    # Every listing carries PRODUCTS_TAG.
+    tags = [product_tag(instance.pk)]
+    if created or update_fields is None or LISTED_FIELDS.intersection(update_fields):
+        tags.append(PRODUCTS_TAG)
+    elif "price" in update_fields:
+        tags.append(PRICES_TAG)
+    invalidate_tags(*tags)
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    invalidate_tags(product_tag(instance.pk), PRODUCTS_TAG)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed(sender, instance, **kwargs):
+    invalidate_tags(category_tag(instance.pk), CATEGORIES_TAG)
@@ -0,0 +1,86 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.models import Product
+from catalog.pagination import seek
+from catalog.serializers import ORDERINGS
+from catalog.tree import get_category_tree
+
+
+class Command(BaseCommand):
+    help = (
+        "Time product listing pages at increasing depths, with keyset "
+        "pagination (as served by the API) and with OFFSET for comparison. "
+        "Seed a large catalog first with seed_catalog."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--depths",
+            type=int,
+            nargs="+",
+            default=[1, 10, 100, 1000, 10000],
+            help="Page numbers to time",
+        )
+        parser.add_argument("--page-size", type=int, default=20)
+        parser.add_argument("--repeat", type=int, default=5, help="Runs per page")
+        parser.add_argument("--ordering", choices=ORDERINGS, default="-created_at")
+        parser.add_argument(
+            "--category", help="Slug of a category whose subtree to filter on"
+        )
+        parser.add_argument(
+            "--explain",
+            action="store_true",
+            help="Print the query plan of the deepest keyset page",
+        )
+
+    def handle(self, *args, **options):
+        queryset = Product.objects.filter(is_available=True)
+        if options["category"]:
+            # The subtree, as the product list filters it.
+            tree = get_category_tree()
+            node = tree.get(options["category"])
+            if node is None:
+                raise CommandError(f"No category {options['category']!r}")
+            queryset = queryset.filter(category_id__in=tree.subtree_ids(node))
+
+        ordering, size = options["ordering"], options["page_size"]
+        field = ordering.lstrip("-")
+        self.stdout.write(
+            f"{queryset.count():,} matching products, ordering={ordering}, "
+            f"page size {size}"
+        )
+        self.stdout.write(f"{'page':>8} {'keyset ms':>10} {'offset ms':>10}")
+
+        for depth in sorted(options["depths"]):
+            offset = (depth - 1) * size
+            position = None
+            if offset:
+                # The cursor a client would hold: the previous page's last row.
+                previous = offset - 1
+                boundary = next(iter(seek(queryset, ordering)[previous:offset]), None)
+                if boundary is None:
+                    self.stdout.write(f"{depth:>8} {'past the end':>21}")
+                    break
+                position = (getattr(boundary, field), boundary.pk)
+
+            keyset_page = seek(queryset, ordering, position)[:size]
+            end = offset + size
+            offset_page = seek(queryset, ordering)[offset:end]
+            self.stdout.write(
+                f"{depth:>8} {self.time(keyset_page, options['repeat']):>10.2f} "
+                f"{self.time(offset_page, options['repeat']):>10.2f}"
+            )
+
+        if options["explain"]:
+            self.stdout.write(keyset_page.explain())
+
+    def time(self, page, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            list(page.all())
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
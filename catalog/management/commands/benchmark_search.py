@@ -0,0 +1,68 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from catalog import search
+from catalog.models import Product
+
+
+class Command(BaseCommand):
+    help = (
+        "Time product search against the naive icontains filter on name "
+        "and description. Seed a large catalog first with seed_catalog."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--queries",
+            nargs="+",
+            default=["wireless", "smart watch", "port", "vintage camera 12"],
+            help="Search queries to time",
+        )
+        parser.add_argument("--limit", type=int, default=20)
+        parser.add_argument("--repeat", type=int, default=5, help="Runs per query")
+        parser.add_argument(
+            "--explain",
+            action="store_true",
+            help="Print the query plan of each full-text search (PostgreSQL)",
+        )
+
+    def handle(self, *args, **options):
+        backend = search.backend_name()
+        limit, repeat = options["limit"], options["repeat"]
+        queryset = Product.objects.filter(is_available=True)
+        self.stdout.write(f"{Product.objects.count():,} products, backend {backend}")
+        if backend == "memory":
+            # Keep the one-off build out of the first timing.
+            search.memory_index.ensure_current()
+        self.stdout.write(
+            f"{'query':<24} {'hits':>5} {'search ms':>10} {'icontains ms':>13}"
+        )
+
+        for text in options["queries"]:
+            hits = len(search.search(text, queryset, limit=limit))
+            searched = self.time(
+                lambda: search.search(text, queryset, limit=limit), repeat
+            )
+            naive = queryset.filter(
+                Q(name__icontains=text) | Q(description__icontains=text)
+            ).order_by("-id")[:limit]
+            scanned = self.time(lambda: list(naive.all()), repeat)
+            self.stdout.write(
+                f"{text[:24]:<24} {hits:>5} {searched:>10.2f} {scanned:>13.2f}"
+            )
+            if options["explain"] and backend == "postgres":
+                words = search.tokenize(text)
+                self.stdout.write(
+                    search.postgres_search(queryset, words)[:limit].explain()
+                )
+
+    def time(self, run, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            run()
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
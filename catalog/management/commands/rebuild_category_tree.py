@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from catalog.models import Category
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the materialized path and depth of every category from "
+        "the parent links, e.g. after adding the tree columns to existing "
+        "rows or loading categories with bulk_create()."
+    )
+
+    def handle(self, *args, **options):
+        changed = Category.objects.rebuild_paths()
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt the paths of {changed} categories")
+        )
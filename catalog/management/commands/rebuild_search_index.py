@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from catalog import search
+from catalog.models import Product
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute product search vectors in batches of ids, e.g. after "
+        "loading products with bulk_create() or update(). On databases "
+        "without search vectors, build the in-memory index instead."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=10000, help="Products per UPDATE"
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        if search.backend_name() != "postgres":
+            search.memory_index.ensure_current()
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Built the in-memory index in {time.monotonic() - started:.1f}s"
+                )
+            )
+            return
+
+        batch_size, last_id, total = options["batch_size"], 0, 0
+        while True:
+            ids = list(
+                Product.objects.filter(pk__gt=last_id)
+                .order_by("pk")
+                .values_list("pk", flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            last_id = ids[-1]
+            total += Product.objects.filter(
+                pk__gte=ids[0], pk__lte=last_id
+            ).refresh_search_vectors()
+            self.stdout.write(f"{total} products up to id {last_id}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Refreshed {total} search vectors in "
+                f"{time.monotonic() - started:.1f}s"
+            )
+        )
@@ -0,0 +1,136 @@
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from catalog.caching import PRODUCTS_TAG
+from catalog.models import Category, Product
+from e_commerce_api.response_cache import invalidate_tags
+
+ADJECTIVES = [
+    "Classic",
+    "Compact",
+    "Deluxe",
+    "Eco",
+    "Essential",
+    "Lightweight",
+    "Modern",
+    "Portable",
+    "Premium",
+    "Rugged",
+    "Smart",
+    "Ultra",
+    "Vintage",
+    "Wireless",
+]
+NOUNS = [
+    "Backpack",
+    "Blender",
+    "Camera",
+    "Chair",
+    "Desk Lamp",
+    "Headphones",
+    "Jacket",
+    "Kettle",
+    "Keyboard",
+    "Monitor",
+    "Phone",
+    "Sneakers",
+    "Speaker",
+    "Tent",
+    "Watch",
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate categories and products for development and benchmarks. "
+        "Products are inserted in batches, each in its own transaction, and "
+        "the same --seed always produces the same data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--products", type=int, default=1_000_000, help="Products to add"
+        )
+        parser.add_argument(
+            "--categories", type=int, default=50, help="Categories to spread over"
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=5000, help="Products per INSERT"
+        )
+        parser.add_argument("--seed", type=int, default=42, help="Random seed")
+        parser.add_argument(
+            "--prefix", default="seed", help="Slug prefix of generated rows"
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        prefix = options["prefix"]
+        categories = self.ensure_categories(prefix, options["categories"])
+
+        # Continue numbering after products from an earlier run.
+        first = Product.objects.filter(slug__startswith=f"{prefix}-product-").count()
+        total, batch_size = options["products"], options["batch_size"]
+        now = timezone.now()
+        started = time.monotonic()
+        for start in range(0, total, batch_size):
+            end = min(start + batch_size, total)
+            batch = [
+                self.make_product(rng, prefix, first + number, categories, now)
+                for number in range(start, end)
+            ]
+            with transaction.atomic():
+                created = Product.objects.bulk_create(batch)
+                # bulk_create() bypasses save(), which maintains these.
+                Product.objects.filter(
+                    pk__in=[product.pk for product in created]
+                ).refresh_search_vectors()
+            rate = end / max(time.monotonic() - started, 1e-6)
+            self.stdout.write(f"{end}/{total} products ({rate:,.0f}/s)")
+        # New rows may belong on any cached listing.
+        invalidate_tags(PRODUCTS_TAG)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Added {total} products in {len(categories)} categories"
+            )
+        )
+
+    def ensure_categories(self, prefix, count):
+        existing = {
+            category.slug: category
+            for category in Category.objects.filter(
+                slug__startswith=f"{prefix}-category-"
+            )
+        }
+        missing = [
+            Category(name=f"Category {number}", slug=f"{prefix}-category-{number}")
+            for number in range(count)
+            if f"{prefix}-category-{number}" not in existing
+        ]
+        Category.objects.bulk_create(missing)
+        if missing:
+            Category.objects.rebuild_paths()
+        return list(
+            Category.objects.filter(slug__startswith=f"{prefix}-category-").order_by(
+                "id"
+            )[:count]
+        )
+
+    def make_product(self, rng, prefix, number, categories, now):
+        name = f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {number}"
+        return Product(
+            category=rng.choice(categories),
+            name=name,
+            slug=f"{prefix}-product-{number}",
+            description=f"{name}, generated for testing.",
+            price=Decimal(rng.randint(100, 200_000)) / 100,
+            stock=rng.randint(0, 500),
+            is_available=rng.random() < 0.9,
+            created_at=now - timedelta(seconds=rng.randint(0, 2 * 365 * 86400)),
+        )
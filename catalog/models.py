@@ -0,0 +1,289 @@
+from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+from django.core.exceptions import ValidationError
+from django.db import connections, models, router, transaction
+from django.db.models import F, OuterRef, Subquery, Value
+from django.db.models.functions import Concat, Substr
+from django.utils import timezone
+
+from accounts.models import DirtyFieldsMixin
+
+SEARCH_CONFIG = getattr(settings, "CATALOG_SEARCH_CONFIG", "english")
+
+# Product fields that make up its search vector.
+SEARCH_FIELDS = {"name", "description", "category_id"}
+
+
+def has_search_vector(using):
+    """Whether the search_vector column is maintained on this database"""
+    return connections[using].vendor == "postgresql"
+
+
+def search_vector(name, category, description):
+    """Weighted tsvector of a product: name (A), category (B), description (C)"""
+    vector = SearchVector(name, weight="A", config=SEARCH_CONFIG)
+    vector += SearchVector(category, weight="B", config=SEARCH_CONFIG)
+    vector += SearchVector(description, weight="C", config=SEARCH_CONFIG)
+    return vector
+
+
+class SearchVectorIndex(GinIndex):
+    """
+    GIN index on PostgreSQL, and a plain index elsewhere, so the schema
+    can still be created on SQLite for development and tests.
+    """
+
+    def create_sql(self, model, schema_editor, using="", **kwargs):
+        if schema_editor.connection.vendor != "postgresql":
+            return models.Index.create_sql(
+                self, model, schema_editor, using=using, **kwargs
+            )
+        return super().create_sql(model, schema_editor, using=using, **kwargs)
+
+
+class CategoryQuerySet(models.QuerySet):
+    def rebuild_paths(self):
+        """
+        Recompute the path and depth of every category from the parent
+        links, e.g. after loading categories with ``bulk_create()``.
+        Returns the number of categories changed.
+        """
+        rows = {
+            pk: (parent_id, path, depth)
+            for pk, parent_id, path, depth in self.model.objects.values_list(
+                "pk", "parent_id", "path", "depth"
+            )
+        }
+        computed = {}
+
+        def compute(pk):
+            if pk not in computed:
+                parent_id = rows[pk][0]
+                if parent_id is None:
+                    computed[pk] = (f"/{pk}/", 0)
+                else:
+                    path, depth = compute(parent_id)
+                    computed[pk] = (f"{path}{pk}/", depth + 1)
+            return computed[pk]
+
+        changed = []
+        for pk, (_parent_id, path, depth) in rows.items():
+            if compute(pk) != (path, depth):
+                new_path, new_depth = computed[pk]
+                changed.append(self.model(pk=pk, path=new_path, depth=new_depth))
+        self.model.objects.bulk_update(changed, ["path", "depth"], batch_size=500)
+        if changed:
+            from .caching import invalidate_categories
+            from .tree import invalidate_category_tree
+
+            invalidate_category_tree()
+            invalidate_categories()
+        return len(changed)
+
+
+class Category(DirtyFieldsMixin, models.Model):
+    """
+    A category in the category tree.
+
+    ``path`` lists the ids from the root down to the category, as in
+    ``/1/5/12/``, and ``depth`` counts its ancestors. A whole subtree is
+    then one indexed prefix query (``path__startswith``), and the ancestors
+    one query on the ids of the path. Moving a category, by saving it with
+    another parent, rewrites the paths of its subtree with one UPDATE.
+    Reads should mostly go through the cached tree in catalog.tree.
+    """
+
+    name = models.CharField(max_length=100)
+    slug = models.SlugField(max_length=120, unique=True)
+    description = models.TextField(blank=True)
+    parent = models.ForeignKey(
+        "self",
+        null=True,
+        blank=True,
+        on_delete=models.PROTECT,
+        related_name="children",
+    )
+    path = models.CharField(max_length=255, editable=False, default="")
+    depth = models.PositiveSmallIntegerField(editable=False, default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = CategoryQuerySet.as_manager()
+
+    class Meta:
+        ordering = ["name"]
+        verbose_name_plural = "categories"
+        indexes = [
+            # Prefix matches need the pattern operator class on PostgreSQL
+            # unless the database collation is "C"; ignored elsewhere.
+            models.Index(
+                fields=["path"],
+                name="category_path_idx",
+                opclasses=["varchar_pattern_ops"],
+            ),
+        ]
+
+    def __str__(self):
+        return self.name
+
+    @property
+    def ancestor_ids(self):
+        """Ids of the ancestors, root first"""
+        return [int(pk) for pk in self.path.strip("/").split("/")[:-1]]
+
+    def get_ancestors(self):
+        return Category.objects.filter(pk__in=self.ancestor_ids).order_by("depth")
+
+    def get_descendants(self, include_self=False):
+        descendants = Category.objects.filter(path__startswith=self.path)
+        if include_self:
+            return descendants
+        return descendants.exclude(pk=self.pk)
+
+    def clean(self):
+        if self.parent_id is not None and not self._state.adding:
+            if self.parent.path.startswith(self.path):
+                raise ValidationError(
+                    {"parent": "A category cannot be moved under itself."}
+                )
+
+    def _place_under_parent(self):
+        if self.parent_id is None:
+            self.path, self.depth = f"/{self.pk}/", 0
+        else:
+            self.path = f"{self.parent.path}{self.pk}/"
+            self.depth = self.parent.depth + 1
+
+    def save(self, *args, **kwargs):
+        using = kwargs.get("using") or router.db_for_write(Category, instance=self)
+        if self._state.adding:
+            with transaction.atomic(using=using):
+                super().save(*args, **kwargs)
+                # The path ends with the id, known only after the insert.
+                self._place_under_parent()
+                Category.objects.filter(pk=self.pk).update(
+                    path=self.path, depth=self.depth
+                )
+            self._remember_state(["path", "depth"])
+            return
+
+        dirty = self.get_dirty_fields(["name", "parent_id"])
+        if "parent_id" not in dirty:
+            super().save(*args, **kwargs)
+        else:
+            self.clean()
+            old_path, old_depth = self.path, self.depth
+            self._place_under_parent()
+            if kwargs.get("update_fields") is not None:
+                kwargs["update_fields"] = [*kwargs["update_fields"], "path", "depth"]
+            with transaction.atomic(using=using):
+                super().save(*args, **kwargs)
+                Category.objects.filter(path__startswith=old_path).exclude(
+                    pk=self.pk
+                ).update(
+                    path=Concat(
+                        Value(self.path),
+                        Substr("path", len(old_path) + 1),
+                        output_field=models.CharField(),
+                    ),
+                    depth=F("depth") + (self.depth - old_depth),
+                )
+        # Products carry the category name in their search vectors.
+        if "name" in dirty:
+            self.products.refresh_search_vectors()
+
+
+class ProductQuerySet(models.QuerySet):
+    def refresh_search_vectors(self):
+        """
+        Recompute the search vectors of these products in one UPDATE, for
+        rows written by ``bulk_create()`` or ``update()``. Returns the
+        number of rows updated (0 where search vectors are not kept).
+        """
+        if not has_search_vector(self.db):
+            return 0
+        category = Subquery(
+            Category.objects.filter(pk=OuterRef("category_id"))
+            .order_by()
+            .values("name")[:1]
+        )
+        return self.update(
+            search_vector=search_vector(F("name"), category, F("description"))
+        )
+
+
+class ProductManager(models.Manager.from_queryset(ProductQuerySet)):
+    def get_queryset(self):
+        # Search vectors are only read by the database.
+        return super().get_queryset().defer("search_vector")
+
+
+class Product(DirtyFieldsMixin, models.Model):
+    """
+    A product for sale.
+
+    The indexes follow the listing API: an optional category, availability
+    (filtered on by default), an optional price range, and ordering by
+    ``created_at`` or ``price`` with ``id`` as tie-breaker for keyset
+    pagination. Descending orders scan the same indexes backwards.
+
+    On PostgreSQL ``search_vector`` holds the weighted text of the product
+    for full-text search (see catalog.search). ``save()`` recomputes it in
+    the same INSERT or UPDATE whenever the name, description or category
+    changes; rows written with ``bulk_create()`` or ``update()`` need
+    ``refresh_search_vectors()``.
+    """
+
+    category = models.ForeignKey(
+        Category, on_delete=models.PROTECT, related_name="products"
+    )
+    name = models.CharField(max_length=200)
+    slug = models.SlugField(max_length=220, unique=True)
+    description = models.TextField(blank=True)
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    stock = models.PositiveIntegerField(default=0)
+    is_available = models.BooleanField(default=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = ProductManager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["category", "is_available", "created_at", "id"],
+                name="product_cat_new_idx",
+            ),
+            models.Index(
+                fields=["category", "is_available", "price", "id"],
+                name="product_cat_price_idx",
+            ),
+            models.Index(
+                fields=["is_available", "created_at", "id"], name="product_new_idx"
+            ),
+            models.Index(
+                fields=["is_available", "price", "id"], name="product_price_idx"
+            ),
+            SearchVectorIndex(fields=["search_vector"], name="product_search_idx"),
+        ]
+
+    def __str__(self):
+        return self.name
+
+    def save(self, *args, **kwargs):
+        using = kwargs.get("using") or router.db_for_write(Product, instance=self)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None:
+            changed = self.get_dirty_fields(list(SEARCH_FIELDS))
+        else:
+            changed = SEARCH_FIELDS.intersection(
+                self._meta.get_field(name).attname for name in update_fields
+            )
+        if changed and has_search_vector(using):
+            self.search_vector = search_vector(
+                Value(self.name), Value(self.category.name), Value(self.description)
+            )
+            if update_fields is not None:
+                kwargs["update_fields"] = [*update_fields, "search_vector"]
+        super().save(*args, **kwargs)
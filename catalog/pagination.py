@@ -0,0 +1,141 @@
+"""
+Keyset (cursor) pagination for catalog listings.
+
+A page is fetched by seeking past the last row of the previous page,
+``WHERE (price, id) > (last_price, last_id) ORDER BY price, id LIMIT n``,
+rather than with ``OFFSET``, so with a matching index every page costs the
+same however deep it is, and rows inserted meanwhile never shift pages.
+
+Cursors are opaque to clients: base64 of the direction and the sort key of
+the boundary row. The row comparison is written as ``price >= x AND (price
+> x OR (price = x AND id > y))``; the redundant first term lets the
+database start an index range scan at ``x``.
+"""
+
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+NEXT = "n"
+PREVIOUS = "p"
+
+
+def seek(queryset, ordering, position=None, reverse=False):
+    """
+    Order ``queryset`` by ``ordering`` (a field name, "-" for descending)
+    then id, starting after ``position``, a (value, id) pair.
+    ``reverse`` walks towards the start instead.
+    """
+    field = ordering.lstrip("-")
+    descending = ordering.startswith("-") != reverse
+    if descending:
+        queryset = queryset.order_by(f"-{field}", "-id")
+    else:
+        queryset = queryset.order_by(field, "id")
+    if position is None:
+        return queryset
+
+    value, pk = position
+    if descending:
+        return queryset.filter(**{f"{field}__lte": value}).filter(
+            Q(**{f"{field}__lt": value}) | Q(**{field: value, "id__lt": pk})
+        )
+    return queryset.filter(**{f"{field}__gte": value}).filter(
+        Q(**{f"{field}__gt": value}) | Q(**{field: value, "id__gt": pk})
+    )
+
+
+class KeysetPagination:
+    """Paginates a queryset ordered by one field plus id"""
+
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    page_size = 20
+    max_page_size = 100
+    invalid_cursor_message = "Invalid cursor"
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def decode_cursor(self, request, field):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            data = json.loads(base64.urlsafe_b64decode(encoded.encode("ascii")))
+            direction, value, pk = data["d"], data["v"], int(data["i"])
+            if direction not in (NEXT, PREVIOUS):
+                raise ValueError
+            return direction, (field.to_python(value), pk)
+        except (
+            binascii.Error,
+            KeyError,
+            TypeError,
+            UnicodeError,
+            ValueError,
+            ValidationError,
+        ):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, direction, row):
+        data = {
+            "d": direction,
+            "v": self.field.value_to_string(row),
+            "i": row.pk,
+        }
+        encoded = base64.urlsafe_b64encode(json.dumps(data).encode("utf-8"))
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, encoded.decode())
+
+    def paginate_queryset(self, queryset, request, ordering):
+        """Return the rows of the requested page"""
+        self.request = request
+        self.field = queryset.model._meta.get_field(ordering.lstrip("-"))
+        size = self.get_page_size(request)
+        cursor = self.decode_cursor(request, self.field)
+        direction, position = cursor or (NEXT, None)
+        backwards = direction == PREVIOUS
+
+        rows = list(seek(queryset, ordering, position, reverse=backwards)[: size + 1])
+        has_more = len(rows) > size
+        rows = rows[:size]
+        if backwards:
+            rows.reverse()
+            # There is at least the row the cursor was taken from.
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+        self.page = rows
+        return rows
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(NEXT, self.page[-1])
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            url = self.request.build_absolute_uri()
+            return remove_query_param(url, self.cursor_query_param)
+        return self.encode_cursor(PREVIOUS, self.page[0])
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
+                "results": data,
+            }
+        )
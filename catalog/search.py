@@ -0,0 +1,167 @@
+"""
+Full-text product search.
+
+On PostgreSQL every product keeps a weighted ``tsvector`` of its name (A),
+category name (B) and description (C) in ``Product.search_vector``,
+maintained by ``Product.save()`` and covered by a GIN index. A query
+matches products containing every query word as a prefix, so "wire head"
+finds "Wireless Headphones", ranked with ``ts_rank`` so name matches come
+before description matches.
+
+Other databases (SQLite in development and tests) use ``InvertedIndex``,
+an in-process index of the same weighted words with the same matching
+and similar ranking, but without stemming. It is built on first search
+and rebuilt when the product table changes, so it only suits small
+catalogs.
+
+Settings:
+
+    CATALOG_SEARCH_BACKEND = "auto"     # "postgres", "memory", or "auto":
+                                        #   postgres on PostgreSQL,
+                                        #   memory elsewhere
+    CATALOG_SEARCH_CONFIG = "english"   # text search configuration
+"""
+
+import bisect
+import re
+import threading
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connections, router
+from django.db.models import Count, F, Max
+from django.db.models.signals import post_delete, post_save
+
+from .models import SEARCH_CONFIG, Category, Product
+
+# Weights of the name, category and description, as ts_rank's defaults.
+WEIGHTS = {"A": 1.0, "B": 0.4, "C": 0.2}
+
+WORD_RE = re.compile(r"\w+")
+
+
+def tokenize(text):
+    """Lowercase words of ``text``"""
+    return WORD_RE.findall(text.lower())
+
+
+def backend_name(using=None):
+    backend = getattr(settings, "CATALOG_SEARCH_BACKEND", "auto")
+    if backend != "auto":
+        return backend
+    using = using or router.db_for_read(Product)
+    return "postgres" if connections[using].vendor == "postgresql" else "memory"
+
+
+def prefix_query(words):
+    """A tsquery matching documents that contain every word as a prefix"""
+    # Words are \w+ only, so they cannot carry tsquery operators.
+    raw = " & ".join(f"{word}:*" for word in words)
+    return SearchQuery(raw, search_type="raw", config=SEARCH_CONFIG)
+
+
+def postgres_search(queryset, words):
+    query = prefix_query(words)
+    return (
+        queryset.filter(search_vector=query)
+        .annotate(rank=SearchRank(F("search_vector"), query))
+        .order_by("-rank", "-id")
+    )
+
+
+class InvertedIndex:
+    """Weighted postings of every word of every product, held in memory"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings = {}
+        self._words = []
+        self._version = None
+
+    def invalidate(self, **kwargs):
+        with self._lock:
+            self._version = None
+
+    def _table_version(self):
+        # Changes on save, delete and bulk_create, and after a rollback.
+        return tuple(
+            Product.objects.aggregate(
+                count=Count("id"), last_id=Max("id"), updated=Max("updated_at")
+            ).values()
+        )
+
+    def _build(self, version):
+        postings = {}
+        rows = Product.objects.values_list(
+            "id", "name", "category__name", "description"
+        ).iterator()
+        for pk, *fields in rows:
+            for weight, text in zip(WEIGHTS.values(), fields):
+                for word in set(tokenize(text)):
+                    scores = postings.setdefault(word, {})
+                    scores[pk] = scores.get(pk, 0.0) + weight
+        self._postings = postings
+        self._words = sorted(postings)
+        self._version = version
+
+    def ensure_current(self):
+        version = self._table_version()
+        with self._lock:
+            if version != self._version:
+                self._build(version)
+
+    def match(self, words):
+        """Scores by product id of products containing every word as a prefix"""
+        self.ensure_current()
+        with self._lock:
+            scores = None
+            for word in words:
+                matches = {}
+                start = bisect.bisect_left(self._words, word)
+                for indexed in self._words[start:]:
+                    if not indexed.startswith(word):
+                        break
+                    for pk, score in self._postings[indexed].items():
+                        matches[pk] = max(matches.get(pk, 0.0), score)
+                if scores is not None:
+                    matches = {
+                        pk: scores[pk] + score
+                        for pk, score in matches.items()
+                        if pk in scores
+                    }
+                scores = matches
+                if not scores:
+                    break
+            return scores or {}
+
+    def search(self, queryset, words, limit):
+        scores = self.match(words)
+        ranked = sorted(scores, key=lambda pk: (-scores[pk], -pk))
+        rows = queryset.in_bulk(ranked)
+        products = [rows[pk] for pk in ranked if pk in rows][:limit]
+        for product in products:
+            product.rank = scores[product.pk]
+        return products
+
+
+memory_index = InvertedIndex()
+
+for model in (Category, Product):
+    post_save.connect(memory_index.invalidate, sender=model)
+    post_delete.connect(memory_index.invalidate, sender=model)
+
+
+def search(text, queryset=None, limit=20, offset=0):
+    """
+    Products in ``queryset`` (default: all) matching ``text``, best first,
+    each with a ``rank`` attribute.
+    """
+    if queryset is None:
+        queryset = Product.objects.all()
+    words = tokenize(text)
+    if not words:
+        return []
+    end = offset + limit
+    if backend_name(queryset.db) == "postgres":
+        return list(postgres_search(queryset, words)[offset:end])
+    return memory_index.search(queryset, words, end)[offset:]
@@ -0,0 +1,147 @@
+from rest_framework import serializers
+
+from .models import Category, Product
+from .search import tokenize
+from .tree import get_category_tree
+
+ORDERINGS = ["-created_at", "created_at", "price", "-price"]
+
+# Search results past this page are rarely useful and cost the most.
+SEARCH_MAX_PAGE = 10
+
+
+class CategorySerializer(serializers.ModelSerializer):
+    parent = serializers.SlugRelatedField(
+        slug_field="slug",
+        queryset=Category.objects.all(),
+        allow_null=True,
+        required=False,
+    )
+    breadcrumb = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Category
+        fields = [
+            "id",
+            "name",
+            "slug",
+            "description",
+            "parent",
+            "depth",
+            "breadcrumb",
+            "created_at",
+        ]
+        read_only_fields = ["id", "depth", "created_at"]
+
+    def get_breadcrumb(self, obj):
+        tree = get_category_tree()
+        node = tree.by_id.get(obj.pk)
+        return tree.breadcrumb(node) if node else []
+
+    def validate_parent(self, value):
+        if value is not None and self.instance is not None:
+            if value.path.startswith(self.instance.path):
+                raise serializers.ValidationError(
+                    "A category cannot be moved under itself."
+                )
+        return value
+
+
+class ProductSerializer(serializers.ModelSerializer):
+    category = serializers.SlugRelatedField(
+        slug_field="slug", queryset=Category.objects.all()
+    )
+
+    class Meta:
+        model = Product
+        fields = [
+            "id",
+            "name",
+            "slug",
+            "description",
+            "category",
+            "price",
+            "stock",
+            "is_available",
+            "created_at",
+            "updated_at",
+        ]
+        read_only_fields = ["id", "created_at", "updated_at"]
+
+    def validate_price(self, value):
+        if value < 0:
+            raise serializers.ValidationError("Price cannot be negative.")
+        return value
+
+
+class ProductFilterSerializer(serializers.Serializer):
+    """Query parameters of the product listing"""
+
+    # Includes the products of every subcategory.
+    category = serializers.SlugField(required=False)
+    min_price = serializers.DecimalField(
+        max_digits=10, decimal_places=2, min_value=0, required=False
+    )
+    max_price = serializers.DecimalField(
+        max_digits=10, decimal_places=2, min_value=0, required=False
+    )
+    available = serializers.ChoiceField(
+        choices=["true", "false", "any"], default="true"
+    )
+    ordering = serializers.ChoiceField(choices=ORDERINGS, default="-created_at")
+
+    def validate_category(self, value):
+        node = get_category_tree().get(value)
+        if node is None:
+            raise serializers.ValidationError(f'No category "{value}".')
+        return node
+
+    def validate(self, data):
+        min_price, max_price = data.get("min_price"), data.get("max_price")
+        if min_price is not None and max_price is not None and min_price > max_price:
+            raise serializers.ValidationError(
+                "min_price cannot be greater than max_price."
+            )
+        return data
+
+    @property
+    def by_price(self):
+        """Whether prices decide which products are listed, or their order"""
+        data = self.validated_data
+        ordered = data.get("ordering", "").lstrip("-") == "price"
+        return ordered or "min_price" in data or "max_price" in data
+
+    def filter_queryset(self, queryset):
+        data = self.validated_data
+        if "category" in data:
+            ids = get_category_tree().subtree_ids(data["category"])
+            queryset = queryset.filter(category_id__in=ids)
+        if data["available"] != "any":
+            queryset = queryset.filter(is_available=data["available"] == "true")
+        if "min_price" in data:
+            queryset = queryset.filter(price__gte=data["min_price"])
+        if "max_price" in data:
+            queryset = queryset.filter(price__lte=data["max_price"])
+        return queryset
+
+
+class ProductSearchSerializer(ProductFilterSerializer):
+    """Query parameters of product search"""
+
+    q = serializers.CharField(max_length=200)
+    page = serializers.IntegerField(min_value=1, max_value=SEARCH_MAX_PAGE, default=1)
+    page_size = serializers.IntegerField(min_value=1, max_value=50, default=20)
+    # Results are ordered by relevance.
+    ordering = None
+
+    def validate_q(self, value):
+        if not tokenize(value):
+            raise serializers.ValidationError("Enter at least one word to search for.")
+        return value
+
+
+class ProductSearchResultSerializer(ProductSerializer):
+    rank = serializers.FloatField(read_only=True)
+
+    class Meta(ProductSerializer.Meta):
+        fields = ProductSerializer.Meta.fields + ["rank"]
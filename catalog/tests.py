@@ -0,0 +1,629 @@
+import io
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from accounts.factories import make_user
+from e_commerce_api import response_cache
+from e_commerce_api.response_cache import get_response_store
+
+from . import search
+from .models import Category, Product
+
+
+class CatalogTestCase(TestCase):
+    """Shared fixtures: two categories and a handful of products"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = make_user(
+            "staff@example.com",
+            password="StaffPass123!",
+            first_name="Staff",
+            is_staff=True,
+        )
+        cls.customer = make_user(
+            "customer@example.com",
+            password="CustomerPass123!",
+            first_name="Customer",
+        )
+
+    def setUp(self):
+        # Ids are reused once a test's transaction rolls back.
+        get_response_store().clear()
+        self.client = APIClient()
+        self.phones = Category.objects.create(name="Phones", slug="phones")
+        self.laptops = Category.objects.create(name="Laptops", slug="laptops")
+
+    def make_products(self, count, category=None, prefix="product", **fields):
+        """Products with repeated prices and timestamps, to exercise ties"""
+        now = timezone.now()
+        products = [
+            Product(
+                category=category or self.phones,
+                name=f"Product {number}",
+                slug=f"{prefix}-{number}",
+                price=Decimal(number % 4 + 1),
+                created_at=now - timedelta(minutes=number % 3),
+                **fields,
+            )
+            for number in range(count)
+        ]
+        return Product.objects.bulk_create(products)
+
+
+class CategoryTests(CatalogTestCase):
+    """Tests for the category endpoints"""
+
+    url = "/api/v1/catalog/categories/"
+
+    def test_list_categories_by_name(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([c["slug"] for c in response.data], ["laptops", "phones"])
+
+    def test_only_staff_can_create(self):
+        data = {"name": "Tablets", "slug": "tablets"}
+        response = self.client.post(self.url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.client.force_authenticate(user=self.customer)
+        response = self.client.post(self.url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(user=self.staff)
+        response = self.client.post(self.url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(Category.objects.filter(slug="tablets").exists())
+
+    def test_delete_category_with_products_conflicts(self):
+        self.make_products(1)
+        self.client.force_authenticate(user=self.staff)
+        response = self.client.delete(f"{self.url}phones/")
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+        response = self.client.delete(f"{self.url}laptops/")
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(Category.objects.filter(slug="laptops").exists())
+
+
+class CategoryTreeTests(CatalogTestCase):
+    """Tests for materialized paths and the cached category tree"""
+
+    url = "/api/v1/catalog/categories/"
+
+    def setUp(self):
+        super().setUp()
+        # phones > android > foldables, phones > iphones
+        self.android = Category.objects.create(
+            name="Android", slug="android", parent=self.phones
+        )
+        self.foldables = Category.objects.create(
+            name="Foldables", slug="foldables", parent=self.android
+        )
+        self.iphones = Category.objects.create(
+            name="iPhones", slug="iphones", parent=self.phones
+        )
+
+    def test_paths_follow_parents(self):
+        self.assertEqual(self.phones.path, f"/{self.phones.pk}/")
+        self.assertEqual(
+            self.foldables.path,
+            f"/{self.phones.pk}/{self.android.pk}/{self.foldables.pk}/",
+        )
+        self.assertEqual(self.foldables.depth, 2)
+        self.assertEqual(
+            list(self.foldables.get_ancestors()), [self.phones, self.android]
+        )
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                {c.slug for c in self.phones.get_descendants()},
+                {"android", "foldables", "iphones"},
+            )
+
+    def test_move_rewrites_subtree_in_one_update(self):
+        self.android.parent = self.laptops
+        with CaptureQueriesContext(connection) as queries:
+            self.android.save()
+        updates = [q["sql"] for q in queries if q["sql"].startswith("UPDATE")]
+        # The category itself, then its whole subtree.
+        self.assertEqual(len(updates), 2)
+
+        self.foldables.refresh_from_db()
+        self.assertEqual(
+            self.foldables.path,
+            f"/{self.laptops.pk}/{self.android.pk}/{self.foldables.pk}/",
+        )
+        self.assertEqual(self.foldables.depth, 2)
+
+        self.android.parent = None
+        self.android.save()
+        self.foldables.refresh_from_db()
+        self.assertEqual(
+            self.foldables.path, f"/{self.android.pk}/{self.foldables.pk}/"
+        )
+        self.assertEqual(self.foldables.depth, 1)
+
+    def test_move_under_own_subtree_rejected(self):
+        self.client.force_authenticate(user=self.staff)
+        response = self.client.put(
+            f"{self.url}phones/", {"parent": "foldables"}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("parent", response.data)
+
+        response = self.client.put(
+            f"{self.url}android/", {"parent": "laptops"}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["depth"], 1)
+
+    def test_breadcrumb(self):
+        response = self.client.get(f"{self.url}foldables/")
+        self.assertEqual(
+            [crumb["slug"] for crumb in response.data["breadcrumb"]],
+            ["phones", "android", "foldables"],
+        )
+
+    def test_tree_is_served_from_cache_until_changed(self):
+        url = "/api/v1/catalog/category-tree/"
+        response = self.client.get(url)
+        self.assertEqual(
+            [node["slug"] for node in response.data], ["laptops", "phones"]
+        )
+        phones = response.data[1]
+        self.assertEqual(
+            [node["slug"] for node in phones["children"]], ["android", "iphones"]
+        )
+        with self.assertNumQueries(0):
+            self.client.get(url)
+
+        self.iphones.parent = self.android
+        self.iphones.save()
+        response = self.client.get(url)
+        android = response.data[1]["children"][0]
+        self.assertEqual(
+            [node["slug"] for node in android["children"]], ["foldables", "iphones"]
+        )
+
+        self.iphones.delete()
+        response = self.client.get(url)
+        self.assertEqual(len(response.data[1]["children"][0]["children"]), 1)
+
+    def test_category_filter_includes_subcategories(self):
+        self.make_products(2)
+        self.make_products(3, category=self.foldables, prefix="foldable")
+        self.make_products(1, category=self.iphones, prefix="iphone")
+
+        response = self.client.get("/api/v1/catalog/products/", {"category": "phones"})
+        self.assertEqual(len(response.data["results"]), 6)
+        response = self.client.get("/api/v1/catalog/products/", {"category": "android"})
+        self.assertEqual(len(response.data["results"]), 3)
+
+    def test_delete_category_with_children_conflicts(self):
+        self.client.force_authenticate(user=self.staff)
+        response = self.client.delete(f"{self.url}android/")
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+    def test_rebuild_paths(self):
+        Category.objects.update(path="", depth=0)
+        out = io.StringIO()
+        call_command("rebuild_category_tree", stdout=out)
+        self.assertIn("Rebuilt the paths of 5 categories", out.getvalue())
+        self.foldables.refresh_from_db()
+        self.assertEqual(self.foldables.depth, 2)
+        self.assertEqual(Category.objects.rebuild_paths(), 0)
+
+
+class ProductTests(CatalogTestCase):
+    """Tests for the product endpoints"""
+
+    url = "/api/v1/catalog/products/"
+
+    def test_staff_can_create_update_and_delete(self):
+        self.client.force_authenticate(user=self.staff)
+        response = self.client.post(
+            self.url,
+            {
+                "name": "Pixel",
+                "slug": "pixel",
+                "category": "phones",
+                "price": "499.00",
+                "stock": 3,
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        detail_url = f"{self.url}{response.data['id']}/"
+
+        response = self.client.put(detail_url, {"price": "449.00"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["price"], "449.00")
+        self.assertEqual(response.data["category"], "phones")
+
+        response = self.client.delete(detail_url)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(Product.objects.filter(slug="pixel").exists())
+
+    def test_customer_cannot_change_products(self):
+        product = self.make_products(1)[0]
+        self.client.force_authenticate(user=self.customer)
+        response = self.client.put(
+            f"{self.url}{product.pk}/", {"price": "1.00"}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_negative_price_rejected(self):
+        self.client.force_authenticate(user=self.staff)
+        response = self.client.post(
+            self.url,
+            {"name": "Bad", "slug": "bad", "category": "phones", "price": "-1.00"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("price", response.data)
+
+    def test_filters(self):
+        self.make_products(4)
+        self.make_products(3, category=self.laptops, prefix="laptop")
+        self.make_products(2, prefix="hidden", is_available=False)
+
+        response = self.client.get(self.url)
+        self.assertEqual(len(response.data["results"]), 7)
+
+        response = self.client.get(self.url, {"available": "any"})
+        self.assertEqual(len(response.data["results"]), 9)
+
+        response = self.client.get(self.url, {"available": "false"})
+        self.assertEqual(len(response.data["results"]), 2)
+
+        response = self.client.get(self.url, {"category": "laptops"})
+        self.assertEqual(len(response.data["results"]), 3)
+
+        response = self.client.get(self.url, {"min_price": "2", "max_price": "3"})
+        prices = {Decimal(p["price"]) for p in response.data["results"]}
+        self.assertEqual(prices, {Decimal(2), Decimal(3)})
+
+    def test_invalid_filters_rejected(self):
+        response = self.client.get(self.url, {"min_price": "5", "max_price": "1"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.get(self.url, {"category": "missing"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.get(self.url, {"ordering": "name"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ResponseCacheTests(CatalogTestCase):
+    """Tests for the tagged response cache of the catalog endpoints"""
+
+    url = "/api/v1/catalog/products/"
+
+    def setUp(self):
+        super().setUp()
+        self.phone, self.spare = self.make_products(2)
+        self.laptop = self.make_products(1, category=self.laptops, prefix="laptop")[0]
+
+    def get(self, url, **params):
+        response = self.client.get(url, params)
+        return response, response[response_cache.HEADER]
+
+    def test_pages_are_served_from_cache(self):
+        _, state = self.get(self.url)
+        self.assertEqual(state, "MISS")
+        with self.assertNumQueries(0):
+            response, state = self.get(self.url)
+        self.assertEqual(state, "HIT")
+        self.assertEqual(len(response.data["results"]), 3)
+
+        # Other query strings are other pages; parameter order does not matter.
+        self.assertEqual(self.get(self.url, category="phones")[1], "MISS")
+        response = self.client.get(f"{self.url}?ordering=price&available=true")
+        self.assertEqual(response[response_cache.HEADER], "MISS")
+        response = self.client.get(f"{self.url}?available=true&ordering=price")
+        self.assertEqual(response[response_cache.HEADER], "HIT")
+
+    def test_changing_a_product_drops_only_pages_showing_it(self):
+        detail = f"{self.url}{self.phone.pk}/"
+        for url in (self.url, detail, f"{self.url}{self.laptop.pk}/"):
+            self.get(url)
+        self.get(self.url, category="laptops")
+
+        phone = Product.objects.get(pk=self.phone.pk)
+        phone.stock = 7
+        phone.save()
+        response, state = self.get(detail)
+        self.assertEqual((state, response.data["stock"]), ("MISS", 7))
+        self.assertEqual(self.get(self.url)[1], "MISS")
+        self.assertEqual(self.get(f"{self.url}{self.laptop.pk}/")[1], "HIT")
+        self.assertEqual(self.get(self.url, category="laptops")[1], "HIT")
+
+    def test_new_rows_drop_listings(self):
+        self.get(self.url, category="laptops")
+        self.get(self.url, ordering="price")
+        self.get(self.url, min_price="1")
+
+        # A price change may move a product into any price-ordered page.
+        laptop = Product.objects.get(pk=self.laptop.pk)
+        laptop.price = Decimal("99.00")
+        laptop.save()
+        self.assertEqual(self.get(self.url, ordering="price")[1], "MISS")
+        self.assertEqual(self.get(self.url, min_price="1")[1], "MISS")
+
+        Product.objects.create(
+            category=self.laptops, name="New", slug="new", price=Decimal("5")
+        )
+        response, state = self.get(self.url, category="laptops")
+        self.assertEqual((state, len(response.data["results"])), ("MISS", 2))
+
+    def test_category_changes_drop_category_pages(self):
+        self.get("/api/v1/catalog/categories/")
+        self.get(self.url, category="phones")
+        Category.objects.create(name="Android", slug="android", parent=self.phones)
+        response, state = self.get("/api/v1/catalog/categories/")
+        self.assertEqual((state, len(response.data)), ("MISS", 3))
+        self.assertEqual(self.get(self.url, category="phones")[1], "MISS")
+
+    def test_errors_are_not_cached(self):
+        self.get(self.url, ordering="name")
+        response, state = self.get(self.url, ordering="name")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(state, "MISS")
+
+    @override_settings(RESPONSE_CACHE_TTL=0)
+    def test_stale_pages_are_served_while_refreshed(self):
+        detail = f"{self.url}{self.phone.pk}/"
+        self.get(detail)
+        # Bypasses save(), so nothing is invalidated.
+        Product.objects.filter(pk=self.phone.pk).update(stock=3)
+        refresher = mock.Mock(submit=lambda refresh: refresh())
+        with mock.patch.object(response_cache, "refresher", refresher):
+            response, state = self.get(detail)
+            self.assertEqual((state, response.data["stock"]), ("STALE", 0))
+            response, state = self.get(detail)
+            self.assertEqual((state, response.data["stock"]), ("STALE", 3))
+
+            # One refresh at a time.
+            Product.objects.filter(pk=self.phone.pk).update(stock=4)
+            self.assertEqual(self.get(detail)[0].data["stock"], 3)
+
+    def test_render_racing_an_invalidation_is_not_stored(self):
+        store = response_cache.LocalResponseStore()
+        started = store.now()
+        store.invalidate(["catalog.product:1"], remember=60)
+        entry = {"data": {}, "fresh_until": started + 60}
+        self.assertFalse(store.set("key", entry, ["catalog.product:1"], 60, started))
+        self.assertTrue(store.set("key", entry, ["catalog.product:1"], 60, store.now()))
+        self.assertEqual(store.invalidate(["catalog.product:1"], remember=60), 1)
+        self.assertIsNone(store.get("key"))
+
+
+class KeysetPaginationTests(CatalogTestCase):
+    """Tests for cursor pagination of the product listing"""
+
+    url = "/api/v1/catalog/products/"
+
+    def setUp(self):
+        super().setUp()
+        self.make_products(11)
+
+    def walk(self, params):
+        """Follow next links from the first page, returning every page"""
+        pages = []
+        response = self.client.get(self.url, params)
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            pages.append(response.data)
+            if not response.data["next"]:
+                return pages
+            response = self.client.get(response.data["next"])
+
+    def test_pages_cover_every_row_in_order(self):
+        for ordering in ["-created_at", "created_at", "price", "-price"]:
+            with self.subTest(ordering=ordering):
+                pages = self.walk({"ordering": ordering, "page_size": 3})
+                self.assertEqual([len(p["results"]) for p in pages], [3, 3, 3, 2])
+                ids = [row["id"] for page in pages for row in page["results"]]
+                expected = Product.objects.order_by(
+                    ordering, "-id" if ordering.startswith("-") else "id"
+                ).values_list("id", flat=True)
+                self.assertEqual(ids, list(expected))
+                self.assertIsNone(pages[0]["previous"])
+
+    def test_previous_link_returns_the_earlier_page(self):
+        pages = self.walk({"ordering": "price", "page_size": 4})
+        response = self.client.get(pages[2]["previous"])
+        self.assertEqual(response.data["results"], pages[1]["results"])
+
+        response = self.client.get(response.data["previous"])
+        self.assertEqual(response.data["results"], pages[0]["results"])
+        self.assertIsNone(response.data["previous"])
+        self.assertIsNotNone(response.data["next"])
+
+    def test_deep_pages_do_not_use_offset(self):
+        pages = self.walk({"page_size": 2})
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(pages[-1]["previous"])
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn("OFFSET", queries[0]["sql"].upper())
+
+    def test_invalid_cursor_returns_not_found(self):
+        for cursor in ["garbage", "eyJkIjogIngifQ=="]:
+            with self.subTest(cursor=cursor):
+                response = self.client.get(self.url, {"cursor": cursor})
+                self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_page_size_is_capped(self):
+        response = self.client.get(self.url, {"page_size": 1000})
+        self.assertEqual(len(response.data["results"]), 11)
+        self.assertIsNone(response.data["next"])
+
+
+class CatalogCommandTests(TestCase):
+    """Tests for the seed_catalog and benchmark_catalog commands"""
+
+    def test_seed_is_repeatable_and_resumes_numbering(self):
+        call_command(
+            "seed_catalog",
+            products=25,
+            categories=3,
+            batch_size=10,
+            stdout=io.StringIO(),
+        )
+        self.assertEqual(Category.objects.count(), 3)
+        self.assertEqual(Product.objects.count(), 25)
+
+        call_command(
+            "seed_catalog",
+            products=5,
+            categories=3,
+            batch_size=10,
+            stdout=io.StringIO(),
+        )
+        self.assertEqual(Category.objects.count(), 3)
+        self.assertEqual(Product.objects.count(), 30)
+        self.assertTrue(Product.objects.filter(slug="seed-product-29").exists())
+
+    def test_benchmark_reports_each_depth(self):
+        call_command("seed_catalog", products=40, stdout=io.StringIO())
+        out = io.StringIO()
+        call_command(
+            "benchmark_catalog",
+            depths=[1, 2, 100],
+            page_size=5,
+            repeat=1,
+            stdout=out,
+        )
+        lines = out.getvalue().splitlines()
+        self.assertTrue(lines[2].strip().startswith("1 "))
+        self.assertTrue(lines[3].strip().startswith("2 "))
+        self.assertIn("past the end", lines[4])
+
+    def test_benchmark_search_reports_each_query(self):
+        call_command("seed_catalog", products=30, stdout=io.StringIO())
+        out = io.StringIO()
+        call_command("benchmark_search", queries=["smart", "zzz"], repeat=1, stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertIn("backend memory", lines[0])
+        self.assertTrue(lines[2].startswith("smart"))
+        self.assertEqual(lines[3].split()[:2], ["zzz", "0"])
+
+
+class ProductSearchTests(CatalogTestCase):
+    """Tests for product search on the in-memory index"""
+
+    url = "/api/v1/catalog/products/search/"
+
+    def setUp(self):
+        super().setUp()
+        self.headphones = Product.objects.create(
+            category=self.phones,
+            name="Wireless Headphones",
+            slug="wireless-headphones",
+            description="Over-ear, with a carrying case.",
+            price=Decimal("99.00"),
+        )
+        self.case = Product.objects.create(
+            category=self.phones,
+            name="Carrying Case",
+            slug="carrying-case",
+            description="Fits wireless headphones.",
+            price=Decimal("15.00"),
+        )
+        self.keyboard = Product.objects.create(
+            category=self.laptops,
+            name="Wireless Keyboard",
+            slug="wireless-keyboard",
+            description="Quiet keys.",
+            price=Decimal("45.00"),
+        )
+
+    def names(self, text, **params):
+        response = self.client.get(self.url, {"q": text, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [row["name"] for row in response.data["results"]]
+
+    def test_matches_every_word_as_prefix(self):
+        self.assertEqual(
+            self.names("wire head"), ["Wireless Headphones", "Carrying Case"]
+        )
+        self.assertEqual(self.names("WIRELESS keyb"), ["Wireless Keyboard"])
+        self.assertEqual(self.names("wireless tablet"), [])
+
+    def test_name_matches_rank_first(self):
+        self.assertEqual(self.names("case"), ["Carrying Case", "Wireless Headphones"])
+
+    def test_category_name_is_searched(self):
+        self.assertEqual(self.names("laptop"), ["Wireless Keyboard"])
+
+    def test_filters_apply(self):
+        self.assertEqual(
+            self.names("wireless", category="laptops"), ["Wireless Keyboard"]
+        )
+        self.assertEqual(
+            self.names("wireless", max_price="50"),
+            ["Wireless Keyboard", "Carrying Case"],
+        )
+
+    def test_index_follows_changes(self):
+        self.assertEqual(self.names("quiet"), ["Wireless Keyboard"])
+        self.keyboard.name = "Silent Keyboard"
+        self.keyboard.save()
+        self.assertEqual(self.names("silent"), ["Silent Keyboard"])
+
+        self.laptops.name = "Notebooks"
+        self.laptops.save()
+        self.assertEqual(self.names("notebook"), ["Silent Keyboard"])
+
+        self.keyboard.delete()
+        self.assertEqual(self.names("silent"), [])
+
+        # bulk_create() sends no signals.
+        self.make_products(2, prefix="bulk")
+        self.assertEqual(len(self.names("product")), 2)
+
+    def test_pages(self):
+        self.make_products(5, prefix="bulk")
+        response = self.client.get(self.url, {"q": "product", "page_size": 2})
+        self.assertEqual(len(response.data["results"]), 2)
+        self.assertIsNone(response.data["previous"])
+
+        response = self.client.get(response.data["next"])
+        response = self.client.get(response.data["next"])
+        self.assertEqual(len(response.data["results"]), 1)
+        self.assertIsNone(response.data["next"])
+        self.assertIsNotNone(response.data["previous"])
+
+    def test_query_without_words_rejected(self):
+        for text in ["", "  ", "!?"]:
+            with self.subTest(q=text):
+                response = self.client.get(self.url, {"q": text})
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.get(self.url, {"q": "case", "page": 11})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_postgres_query_uses_prefix_tsquery(self):
+        queryset = search.postgres_search(Product.objects.all(), ["wire", "head"])
+        sql, params = queryset.query.sql_with_params()
+        self.assertIn("@@", sql)
+        self.assertIn("wire:* & head:*", params)
+
+    def test_search_vectors_only_kept_on_postgres(self):
+        self.assertEqual(Product.objects.refresh_search_vectors(), 0)
+        product = Product.objects.get(pk=self.case.pk)
+        self.assertIsNone(product.search_vector)
+
+    def test_rebuild_command_builds_memory_index(self):
+        out = io.StringIO()
+        call_command("rebuild_search_index", stdout=out)
+        self.assertIn("in-memory index", out.getvalue())
@@ -0,0 +1,108 @@
+"""
+The category tree, cached in every process.
+
+Category pages, breadcrumbs and the category filter of the product list
+all need the tree, and it changes rarely, so ``get_category_tree()`` keeps
+the whole tree in a two-tier cache (see e_commerce_api.tiered_cache):
+loaded with one query, then served from process memory. Saving, moving or
+deleting a category invalidates it in every process.
+
+Settings:
+
+    CATEGORY_TREE_LOCAL_TTL = 300     # seconds in process memory
+"""
+
+import bisect
+from collections import namedtuple
+
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from e_commerce_api.tiered_cache import (TieredCache,
+                                         invalidate_now_and_on_commit)
+
+from .models import Category
+
+Node = namedtuple("Node", ["id", "parent_id", "name", "slug", "path", "depth"])
+
+TREE_KEY = "tree"
+
+category_tree_cache = TieredCache(
+    "catalog:category-tree",
+    maxsize=1,
+    local_ttl=getattr(settings, "CATEGORY_TREE_LOCAL_TTL", 300),
+    timeout=None,
+)
+
+
+class CategoryTree:
+    """Read-only snapshot of every category; shared between threads"""
+
+    def __init__(self, nodes):
+        # In path order: every category comes right before its subtree.
+        self.nodes = sorted(nodes, key=lambda node: node.path)
+        self.paths = [node.path for node in self.nodes]
+        self.by_id = {node.id: node for node in self.nodes}
+        self.by_slug = {node.slug: node for node in self.nodes}
+        self.children = {}
+        for node in sorted(self.nodes, key=lambda node: node.name):
+            self.children.setdefault(node.parent_id, []).append(node)
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def get(self, slug):
+        return self.by_slug.get(slug)
+
+    def subtree_ids(self, node):
+        """Ids of ``node`` and every category under it"""
+        ids = []
+        for index in range(bisect.bisect_left(self.paths, node.path), len(self)):
+            if not self.paths[index].startswith(node.path):
+                break
+            ids.append(self.nodes[index].id)
+        return ids
+
+    def ancestors(self, node):
+        """The ancestors of ``node``, root first"""
+        ids = node.path.strip("/").split("/")[:-1]
+        return [self.by_id[int(pk)] for pk in ids]
+
+    def breadcrumb(self, node):
+        return [
+            {"name": crumb.name, "slug": crumb.slug}
+            for crumb in self.ancestors(node) + [node]
+        ]
+
+    def as_nested(self, parent_id=None):
+        """The tree below ``parent_id`` as nested dicts, siblings by name"""
+        return [
+            {
+                "id": node.id,
+                "name": node.name,
+                "slug": node.slug,
+                "children": self.as_nested(node.id),
+            }
+            for node in self.children.get(parent_id, [])
+        ]
+
+
+def _load_tree():
+    return CategoryTree(
+        Node(*row) for row in Category.objects.order_by().values_list(*Node._fields)
+    )
+
+
+def get_category_tree():
+    return category_tree_cache.get_or_set(TREE_KEY, _load_tree)
+
+
+def invalidate_category_tree():
+    invalidate_now_and_on_commit(lambda: category_tree_cache.invalidate(TREE_KEY))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed(sender, **kwargs):
+    invalidate_category_tree()
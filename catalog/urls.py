@@ -0,0 +1,40 @@
+from django.urls import path
+
+from . import views
+
+app_name = "catalog"
+
+urlpatterns = [
+    # Categories
+    path(
+        "categories/",
+        views.CategoryListView.as_view(),
+        name="category-list",
+    ),
+    path(
+        "categories/<slug:slug>/",
+        views.CategoryDetailView.as_view(),
+        name="category-detail",
+    ),
+    path(
+        "category-tree/",
+        views.CategoryTreeView.as_view(),
+        name="category-tree",
+    ),
+    # Products
+    path(
+        "products/",
+        views.ProductListView.as_view(),
+        name="product-list",
+    ),
+    path(
+        "products/search/",
+        views.ProductSearchView.as_view(),
+        name="product-search",
+    ),
+    path(
+        "products/<int:pk>/",
+        views.ProductDetailView.as_view(),
+        name="product-detail",
+    ),
+]
@@ -0,0 +1,300 @@
+from django.db.models import ProtectedError
+from django.shortcuts import get_object_or_404
+from drf_yasg import openapi
+from drf_yasg.utils import swagger_auto_schema
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+from rest_framework.views import APIView
+
+from e_commerce_api.response_cache import cache_response
+
+from . import search
+from .caching import tag_categories, tag_products
+from .models import Category, Product
+from .pagination import KeysetPagination
+from .permissions import IsStaffOrReadOnly
+from .serializers import (SEARCH_MAX_PAGE, CategorySerializer,
+                          ProductFilterSerializer,
+                          ProductSearchResultSerializer,
+                          ProductSearchSerializer, ProductSerializer)
+from .tree import get_category_tree
+
+PAGINATED_PRODUCTS = openapi.Response(
+    description="A page of products",
+    schema=openapi.Schema(
+        type=openapi.TYPE_OBJECT,
+        properties={
+            "next": openapi.Schema(type=openapi.TYPE_STRING),
+            "previous": openapi.Schema(type=openapi.TYPE_STRING),
+            "results": openapi.Schema(
+                type=openapi.TYPE_ARRAY,
+                items=openapi.Schema(type=openapi.TYPE_OBJECT),
+            ),
+        },
+    ),
+)
+
+
+class CategoryListView(APIView):
+    """
+    Category list endpoint.
+
+    GET: List all categories by name.
+    POST: Create a category. Requires a staff account.
+    """
+
+    permission_classes = [IsStaffOrReadOnly]
+
+    @swagger_auto_schema(
+        operation_description="List categories",
+        responses={200: CategorySerializer(many=True)},
+    )
+    @cache_response
+    def get(self, request):
+        tag_categories(request)
+        serializer = CategorySerializer(Category.objects.all(), many=True)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    @swagger_auto_schema(
+        operation_description="Create a category",
+        request_body=CategorySerializer,
+        responses={201: CategorySerializer, 400: "Validation error"},
+    )
+    def post(self, request):
+        serializer = CategorySerializer(data=request.data)
+        if serializer.is_valid():
+            serializer.save()
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class CategoryDetailView(APIView):
+    """
+    Category detail endpoint.
+
+    GET: Retrieve a category by slug.
+    PUT: Update a category (partial updates supported). Requires staff.
+    Setting ``parent`` moves the category with its whole subtree.
+    DELETE: Delete a category that has no products or subcategories.
+    Requires staff.
+    """
+
+    permission_classes = [IsStaffOrReadOnly]
+
+    @swagger_auto_schema(
+        operation_description="Get a category",
+        responses={200: CategorySerializer, 404: "Category not found"},
+    )
+    @cache_response
+    def get(self, request, slug):
+        tag_categories(request)
+        category = get_object_or_404(Category, slug=slug)
+        return Response(CategorySerializer(category).data, status=status.HTTP_200_OK)
+
+    @swagger_auto_schema(
+        operation_description="Update a category",
+        request_body=CategorySerializer,
+        responses={200: CategorySerializer, 400: "Validation error"},
+    )
+    def put(self, request, slug):
+        category = get_object_or_404(Category, slug=slug)
+        serializer = CategorySerializer(category, data=request.data, partial=True)
+        if serializer.is_valid():
+            serializer.save()
+            return Response(serializer.data, status=status.HTTP_200_OK)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    @swagger_auto_schema(
+        operation_description="Delete a category",
+        responses={
+            204: "Deleted",
+            409: "Category still has products or subcategories",
+        },
+    )
+    def delete(self, request, slug):
+        category = get_object_or_404(Category, slug=slug)
+        try:
+            category.delete()
+        except ProtectedError:
+            return Response(
+                {"error": "Category still has products or subcategories."},
+                status=status.HTTP_409_CONFLICT,
+            )
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class CategoryTreeView(APIView):
+    """
+    Category tree endpoint.
+
+    GET: Every category, nested under its parent, siblings by name. Served
+    from the per-process tree cache.
+    """
+
+    permission_classes = [IsStaffOrReadOnly]
+
+    @swagger_auto_schema(
+        operation_description="Get the category tree",
+        responses={200: "Nested categories"},
+    )
+    def get(self, request):
+        return Response(get_category_tree().as_nested(), status=status.HTTP_200_OK)
+
+
+class ProductListView(APIView):
+    """
+    Product list endpoint.
+
+    GET: List products, filtered by ``category`` (slug, including its
+    subcategories), ``min_price``,
+    ``max_price`` and ``available`` (true, false or any; default true),
+    sorted by ``ordering`` (-created_at, created_at, price or -price).
+    Pages are fetched with the opaque ``cursor`` of the next or previous
+    link, so deep pages cost the same as the first.
+    POST: Create a product. Requires a staff account.
+    """
+
+    permission_classes = [IsStaffOrReadOnly]
+    pagination_class = KeysetPagination
+
+    @swagger_auto_schema(
+        operation_description="List products",
+        query_serializer=ProductFilterSerializer,
+        manual_parameters=[
+            openapi.Parameter("cursor", openapi.IN_QUERY, type=openapi.TYPE_STRING),
+            openapi.Parameter("page_size", openapi.IN_QUERY, type=openapi.TYPE_INTEGER),
+        ],
+        responses={200: PAGINATED_PRODUCTS, 400: "Invalid filter"},
+    )
+    @cache_response
+    def get(self, request):
+        filters = ProductFilterSerializer(data=request.query_params)
+        if not filters.is_valid():
+            return Response(filters.errors, status=status.HTTP_400_BAD_REQUEST)
+        data = filters.validated_data
+        queryset = filters.filter_queryset(Product.objects.select_related("category"))
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(queryset, request, data["ordering"])
+        tag_products(
+            request,
+            page,
+            listing=True,
+            by_price=filters.by_price,
+            by_category="category" in data,
+        )
+        return paginator.get_paginated_response(ProductSerializer(page, many=True).data)
+
+    @swagger_auto_schema(
+        operation_description="Create a product",
+        request_body=ProductSerializer,
+        responses={201: ProductSerializer, 400: "Validation error"},
+    )
+    def post(self, request):
+        serializer = ProductSerializer(data=request.data)
+        if serializer.is_valid():
+            serializer.save()
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class ProductSearchView(APIView):
+    """
+    Product search endpoint.
+
+    GET: Full-text search of product names, categories and descriptions.
+    Every word of ``q`` must match the start of a word in the product, and
+    results are ordered by relevance, name matches first. Accepts the
+    filters of the product list, and ``page`` (up to 10) and ``page_size``
+    (up to 50).
+    """
+
+    permission_classes = []
+
+    @swagger_auto_schema(
+        operation_description="Search products",
+        query_serializer=ProductSearchSerializer,
+        responses={200: PAGINATED_PRODUCTS, 400: "Invalid query"},
+    )
+    @cache_response
+    def get(self, request):
+        params = ProductSearchSerializer(data=request.query_params)
+        if not params.is_valid():
+            return Response(params.errors, status=status.HTTP_400_BAD_REQUEST)
+        data = params.validated_data
+        page, size = data["page"], data["page_size"]
+        queryset = params.filter_queryset(Product.objects.select_related("category"))
+        # One extra row tells whether there is a next page.
+        results = search.search(
+            data["q"], queryset, limit=size + 1, offset=(page - 1) * size
+        )
+        url = request.build_absolute_uri()
+        next_link = previous_link = None
+        if len(results) > size and page < SEARCH_MAX_PAGE:
+            next_link = replace_query_param(url, "page", page + 1)
+        if page > 1:
+            previous_link = replace_query_param(url, "page", page - 1)
+        tag_products(
+            request,
+            results[:size],
+            listing=True,
+            by_price=params.by_price,
+            by_category="category" in data,
+        )
+        return Response(
+            {
+                "next": next_link,
+                "previous": previous_link,
+                "results": ProductSearchResultSerializer(
+                    results[:size], many=True
+                ).data,
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
+class ProductDetailView(APIView):
+    """
+    Product detail endpoint.
+
+    GET: Retrieve a product.
+    PUT: Update a product (partial updates supported). Requires staff.
+    DELETE: Delete a product. Requires staff.
+    """
+
+    permission_classes = [IsStaffOrReadOnly]
+
+    def get_object(self, pk):
+        return get_object_or_404(Product.objects.select_related("category"), pk=pk)
+
+    @swagger_auto_schema(
+        operation_description="Get a product",
+        responses={200: ProductSerializer, 404: "Product not found"},
+    )
+    @cache_response
+    def get(self, request, pk):
+        product = self.get_object(pk)
+        tag_products(request, [product])
+        return Response(ProductSerializer(product).data, status=status.HTTP_200_OK)
+
+    @swagger_auto_schema(
+        operation_description="Update a product",
+        request_body=ProductSerializer,
+        responses={200: ProductSerializer, 400: "Validation error"},
+    )
+    def put(self, request, pk):
+        serializer = ProductSerializer(
+            self.get_object(pk), data=request.data, partial=True
+        )
+        if serializer.is_valid():
+            serializer.save()
+            return Response(serializer.data, status=status.HTTP_200_OK)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    @swagger_auto_schema(
+        operation_description="Delete a product",
+        responses={204: "Deleted", 404: "Product not found"},
+    )
+    def delete(self, request, pk):
+        self.get_object(pk).delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,19 @@
+"""
+Celery application for e_commerce_api project.
+
+Configuration is read from the Django settings prefixed with ``CELERY_``
+(for example ``CELERY_BROKER_URL``), and tasks are discovered in each
+installed app's ``tasks`` module. Start a worker with:
+
+    celery -A e_commerce_api worker
+"""
+
+import os
+
+from celery import Celery
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "e_commerce_api.settings")
+
+app = Celery("e_commerce_api")
+app.config_from_object("django.conf:settings", namespace="CELERY")
+app.autodiscover_tasks()
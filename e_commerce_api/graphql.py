@@ -0,0 +1,125 @@
+"""
+GraphQL endpoint for e_commerce_api project.
+
+The view runs behind DRF authentication and permissions, so it accepts the
+same JWTs as the REST API, and rejects queries that are too deep or would
+fetch too many objects before executing them.
+"""
+
+from django.conf import settings
+from graphene.validation import depth_limit_validator
+from graphene_django.views import GraphQLView
+from graphql import (FieldNode, FragmentSpreadNode, GraphQLError,
+                     InlineFragmentNode, IntValueNode, ValidationRule,
+                     get_named_type, get_nullable_type, is_list_type,
+                     specified_rules)
+from rest_framework.decorators import (api_view, authentication_classes,
+                                       permission_classes)
+from rest_framework.permissions import IsAdminUser
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from accounts.schema import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+
+MAX_QUERY_DEPTH = getattr(settings, "GRAPHQL_MAX_DEPTH", 6)
+MAX_QUERY_COMPLEXITY = getattr(settings, "GRAPHQL_MAX_COMPLEXITY", 1000)
+
+
+def _list_size(node):
+    """Number of items a list field may return, from its ``first`` argument"""
+    for argument in node.arguments:
+        if argument.name.value == "first":
+            if isinstance(argument.value, IntValueNode):
+                return min(int(argument.value.value), MAX_PAGE_SIZE)
+            # Variables are unknown at validation time; assume the worst.
+            return MAX_PAGE_SIZE
+    return DEFAULT_PAGE_SIZE
+
+
+class ComplexityLimitRule(ValidationRule):
+    """
+    Reject operations whose estimated cost exceeds MAX_QUERY_COMPLEXITY.
+
+    Every field costs one per parent object it is resolved for, and list
+    fields multiply the cost of their children by their page size.
+    """
+
+    def enter_operation_definition(self, node, *_args):
+        root_type = self.context.schema.get_root_type(node.operation)
+        cost = self.selection_cost(node.selection_set, root_type, 1, set())
+        if cost > MAX_QUERY_COMPLEXITY:
+            self.report_error(
+                GraphQLError(
+                    f"Query complexity {cost} exceeds the maximum of "
+                    f"{MAX_QUERY_COMPLEXITY}.",
+                    node,
+                )
+            )
+
+    def selection_cost(self, selection_set, parent_type, multiplier, fragments):
+        if selection_set is None or parent_type is None:
+            return 0
+
+        cost = 0
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                name = selection.name.value
+                field = getattr(parent_type, "fields", {}).get(name)
+                if name.startswith("__") or field is None:
+                    continue
+                cost += multiplier
+                child_multiplier = multiplier
+                if is_list_type(get_nullable_type(field.type)):
+                    child_multiplier *= _list_size(selection)
+                cost += self.selection_cost(
+                    selection.selection_set,
+                    get_named_type(field.type),
+                    child_multiplier,
+                    fragments,
+                )
+            elif isinstance(selection, InlineFragmentNode):
+                fragment_type = parent_type
+                if selection.type_condition is not None:
+                    fragment_type = self.context.schema.get_type(
+                        selection.type_condition.name.value
+                    )
+                cost += self.selection_cost(
+                    selection.selection_set, fragment_type, multiplier, fragments
+                )
+            elif isinstance(selection, FragmentSpreadNode):
+                name = selection.name.value
+                fragment = self.context.get_fragment(name)
+                if fragment is None or name in fragments:
+                    continue
+                cost += self.selection_cost(
+                    fragment.selection_set,
+                    self.context.schema.get_type(fragment.type_condition.name.value),
+                    multiplier,
+                    fragments | {name},
+                )
+        return cost
+
+
+VALIDATION_RULES = (
+    *specified_rules,
+    depth_limit_validator(max_depth=MAX_QUERY_DEPTH),
+    ComplexityLimitRule,
+)
+
+
+class DRFAuthenticatedGraphQLView(GraphQLView):
+    """GraphQL view restricted to staff users authenticated through DRF"""
+
+    validation_rules = VALIDATION_RULES
+
+    def parse_body(self, request):
+        if isinstance(request, Request):
+            return request.data
+        return super().parse_body(request)
+
+    @classmethod
+    def as_view(cls, *args, **kwargs):
+        view = super().as_view(*args, **kwargs)
+        view = permission_classes([IsAdminUser])(view)
+        view = authentication_classes(api_settings.DEFAULT_AUTHENTICATION_CLASSES)(view)
+        return api_view(["GET", "POST"])(view)
@@ -0,0 +1,246 @@
+"""
+Idempotency-Key support for unsafe API methods.
+
+A client that retries a request sends the same ``Idempotency-Key`` header
+with each attempt. The first attempt runs the view and its response is
+stored for ``IDEMPOTENCY_TTL`` seconds; later attempts with the same key
+get the stored response back, marked with ``Idempotency-Replayed: true``,
+without running the view again. While the first attempt is still running,
+duplicates wait for its response for up to ``IDEMPOTENCY_WAIT`` seconds,
+then get 409 Conflict. Reusing a key with a different request body is
+rejected with 422.
+
+Keys are scoped to the user (or to anonymous callers), the method and the
+path. Responses with a 5xx status are not stored, so the request can be
+retried. Requests without the header are not affected.
+
+A request can revoke the token it was sent with, as a password change
+does, and then its retry fails authentication before the view runs. For
+such retries the response is also stored under the exact Authorization
+header. Views using ``IdempotentMixin`` replay it in place of the
+authentication error, when the retry has the same key and body.
+
+Apply it to a view method with ``@idempotent`` or to every unsafe method of
+an APIView with ``IdempotentMixin``. Responses are stored in the cache named
+by ``IDEMPOTENCY_CACHE_ALIAS``, which must be shared by all workers (Redis).
+
+Settings:
+
+    IDEMPOTENCY_CACHE_ALIAS = "default"
+    IDEMPOTENCY_TTL = 3600
+    IDEMPOTENCY_WAIT = 10
+    IDEMPOTENCY_LOCK_TIMEOUT = 60   # longest a request is expected to run
+"""
+
+import hashlib
+import json
+import time
+import uuid
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from drf_yasg import openapi
+from rest_framework import exceptions, status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 255
+POLL_INTERVAL = 0.05
+STORED_HEADERS = ("Location",)
+
+IDEMPOTENCY_KEY_PARAMETER = openapi.Parameter(
+    HEADER,
+    openapi.IN_HEADER,
+    description="Unique key for this request; retries with the same key "
+    "replay the first response",
+    type=openapi.TYPE_STRING,
+    required=False,
+)
+
+
+class IdempotencyStore:
+    """Stored responses and in-flight locks, kept in a shared cache"""
+
+    def __init__(self, alias=None, ttl=None, lock_timeout=None):
+        self.cache = caches[
+            alias or getattr(settings, "IDEMPOTENCY_CACHE_ALIAS", "default")
+        ]
+        self.ttl = ttl or getattr(settings, "IDEMPOTENCY_TTL", 3600)
+        self.lock_timeout = lock_timeout or getattr(
+            settings, "IDEMPOTENCY_LOCK_TIMEOUT", 60
+        )
+
+    def get(self, scope):
+        return self.cache.get(f"{scope}:response")
+
+    def acquire(self, scope):
+        """Return a lock token if no other request holds the key, else None"""
+        token = uuid.uuid4().hex
+        if self.cache.add(f"{scope}:lock", token, self.lock_timeout):
+            return token
+        return None
+
+    def release(self, scope, token):
+        if self.cache.get(f"{scope}:lock") == token:
+            self.cache.delete(f"{scope}:lock")
+
+    def wait(self, scope, timeout):
+        """Wait for the request holding the key; returns its stored response"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            time.sleep(POLL_INTERVAL)
+            stored = self.get(scope)
+            if stored is not None:
+                return stored
+            if self.cache.get(f"{scope}:lock") is None:
+                # It failed without storing a response.
+                return None
+        return None
+
+    def save(self, scope, fingerprint, response):
+        headers = {
+            name: response[name] for name in STORED_HEADERS if response.has_header(name)
+        }
+        self.cache.set(
+            f"{scope}:response",
+            {
+                "fingerprint": fingerprint,
+                "status": response.status_code,
+                # Plain JSON types, so the stored value does not depend on
+                # serializer classes.
+                "data": json.loads(json.dumps(response.data, cls=JSONEncoder)),
+                "headers": headers,
+            },
+            self.ttl,
+        )
+
+
+def request_scope(request, key):
+    user = getattr(request, "user", None)
+    owner = user.pk if user is not None and user.is_authenticated else "anonymous"
+    digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+    return f"idempotency:{owner}:{request.method}:{request.path}:{digest}"
+
+
+def credentials_scope(request, key):
+    """The scope of a key for the exact credentials of a request, if any"""
+    credentials = request.META.get("HTTP_AUTHORIZATION")
+    if not credentials:
+        return None
+    digest = hashlib.sha256(f"{credentials}\n{key}".encode("utf-8")).hexdigest()
+    return f"idempotency:credentials:{request.method}:{request.path}:{digest}"
+
+
+def request_fingerprint(request):
+    body = json.dumps(request.data, cls=JSONEncoder, sort_keys=True, default=str)
+    return hashlib.sha256(body.encode("utf-8")).hexdigest()
+
+
+def replay(stored, fingerprint):
+    if stored["fingerprint"] != fingerprint:
+        return Response(
+            {"detail": f"This {HEADER} was already used with a different request."},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+    response = Response(stored["data"], status=stored["status"])
+    for name, value in stored["headers"].items():
+        response[name] = value
+    response["Idempotency-Replayed"] = "true"
+    return response
+
+
+def idempotent(view_method=None, *, wait=None):
+    """Make an APIView method honour the Idempotency-Key header"""
+
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            key = request.headers.get(HEADER)
+            if key is None:
+                return method(self, request, *args, **kwargs)
+            if not key or len(key) > MAX_KEY_LENGTH:
+                return Response(
+                    {"detail": f"{HEADER} must be 1 to {MAX_KEY_LENGTH} characters."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+            store = IdempotencyStore()
+            scope = request_scope(request, key)
+            fingerprint = request_fingerprint(request)
+            stored = store.get(scope)
+            if stored is not None:
+                return replay(stored, fingerprint)
+
+            token = store.acquire(scope)
+            if token is None:
+                if wait is None:
+                    timeout = getattr(settings, "IDEMPOTENCY_WAIT", 10)
+                else:
+                    timeout = wait
+                stored = store.wait(scope, timeout)
+                if stored is None:
+                    return Response(
+                        {"detail": f"A request with this {HEADER} is in progress."},
+                        status=status.HTTP_409_CONFLICT,
+                    )
+                return replay(stored, fingerprint)
+
+            try:
+                # It may have finished between get() and acquire().
+                stored = store.get(scope)
+                if stored is not None:
+                    return replay(stored, fingerprint)
+                response = method(self, request, *args, **kwargs)
+                if response.status_code < 500 and hasattr(response, "data"):
+                    store.save(scope, fingerprint, response)
+                    credentials = credentials_scope(request, key)
+                    if credentials is not None:
+                        store.save(credentials, fingerprint, response)
+                return response
+            finally:
+                store.release(scope, token)
+
+        wrapper.idempotent = True
+        return wrapper
+
+    if view_method is not None:
+        return decorator(view_method)
+    return decorator
+
+
+class IdempotentMixin:
+    """Apply ``idempotent`` to the unsafe methods an APIView defines"""
+
+    idempotent_methods = ("post", "put", "patch", "delete")
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        for name in cls.idempotent_methods:
+            method = cls.__dict__.get(name)
+            if method is not None and not getattr(method, "idempotent", False):
+                setattr(cls, name, idempotent(method))
+
+    def handle_exception(self, exc):
+        if isinstance(
+            exc, (exceptions.AuthenticationFailed, exceptions.NotAuthenticated)
+        ):
+            response = self.replay_for_credentials(self.request)
+            if response is not None:
+                return response
+        return super().handle_exception(exc)
+
+    def replay_for_credentials(self, request):
+        """The stored response to this retry, found by its credentials"""
+        handler = getattr(self, request.method.lower(), None)
+        key = request.headers.get(HEADER)
+        if not getattr(handler, "idempotent", False) or not key:
+            return None
+        scope = credentials_scope(request, key)
+        stored = None if scope is None else IdempotencyStore().get(scope)
+        fingerprint = request_fingerprint(request)
+        # Only the request that was answered may see the answer again.
+        if stored is None or stored["fingerprint"] != fingerprint:
+            return None
+        return replay(stored, fingerprint)
@@ -0,0 +1,158 @@
+"""
+Read replica routing for e_commerce_api project.
+
+Requests with a safe method (GET, HEAD, OPTIONS) read from a replica; any
+other request, and any code running outside a request, uses the primary.
+After a user writes, their reads stay on the primary for
+``REPLICA_PIN_SECONDS`` so they never read a replica that has not caught up
+with their own change. Enable it in settings:
+
+    DATABASES = {
+        "default": persistent_connections({...primary...}),
+        "replica": persistent_connections({...replica...}),
+    }
+    DATABASE_REPLICAS = ["replica"]
+    DATABASE_ROUTERS = ["e_commerce_api.replicas.ReplicaRouter"]
+    MIDDLEWARE = [..., "e_commerce_api.replicas.ReplicaMiddleware"]
+
+The middleware should come after SessionMiddleware. Pins are stored in the
+default cache so they hold across workers.
+"""
+
+import contextvars
+import random
+from contextlib import contextmanager
+
+import jwt
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework_simplejwt import settings as jwt_settings
+
+PIN_SECONDS = getattr(settings, "REPLICA_PIN_SECONDS", 5)
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+# State of the current request: whether reads may use a replica, and whether
+# anything was written to the primary.
+_read_from_replica = contextvars.ContextVar("read_from_replica", default=False)
+_wrote = contextvars.ContextVar("wrote_to_primary", default=False)
+
+
+def persistent_connections(database, max_age=60):
+    """
+    Return a copy of a DATABASES entry that keeps its connections open.
+
+    With psycopg 3 on PostgreSQL the connections are pooled; otherwise each
+    worker reuses its connection for ``max_age`` seconds. Stale connections
+    are health checked before reuse either way.
+    """
+    database = {**database, "CONN_HEALTH_CHECKS": True}
+    if database.get("ENGINE") == "django.db.backends.postgresql":
+        try:
+            import psycopg_pool  # noqa: F401
+        except ImportError:
+            pass
+        else:
+            database["OPTIONS"] = {"pool": True, **database.get("OPTIONS", {})}
+            database["CONN_MAX_AGE"] = 0
+            return database
+    database.setdefault("CONN_MAX_AGE", max_age)
+    return database
+
+
+def get_replicas():
+    return list(getattr(settings, "DATABASE_REPLICAS", []))
+
+
+def pin_key(user_id):
+    return f"db:primary-pin:{user_id}"
+
+
+def pin_to_primary(user_id):
+    """Send the user's reads to the primary for the next PIN_SECONDS"""
+    cache.set(pin_key(user_id), True, PIN_SECONDS)
+
+
+def is_pinned(user_id):
+    return user_id is not None and cache.get(pin_key(user_id)) is not None
+
+
+@contextmanager
+def use_primary():
+    """Send every read inside the block to the primary"""
+    token = _read_from_replica.set(False)
+    try:
+        yield
+    finally:
+        _read_from_replica.reset(token)
+
+
+def get_request_user_id(request):
+    """
+    Identify the caller before authentication has run.
+
+    Reads the user id from the bearer token without verifying it, or from the
+    session. This only decides where reads go, never what the caller may
+    access, so an unverified claim is good enough here.
+    """
+    header = request.META.get("HTTP_AUTHORIZATION", "")
+    scheme, _, raw_token = header.partition(" ")
+    if scheme.lower() == "bearer" and raw_token:
+        claim = jwt_settings.api_settings.USER_ID_CLAIM
+        try:
+            payload = jwt.decode(raw_token, options={"verify_signature": False})
+        except jwt.InvalidTokenError:
+            return None
+        return payload.get(claim)
+
+    session = getattr(request, "session", None)
+    return session.get(SESSION_KEY) if session is not None else None
+
+
+class ReplicaRouter:
+    """Route reads to a replica when the current request allows it"""
+
+    def db_for_read(self, model, **hints):
+        replicas = get_replicas()
+        if replicas and _read_from_replica.get() and not _wrote.get():
+            return random.choice(replicas)
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        _wrote.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary.
+        databases = {DEFAULT_DB_ALIAS, *get_replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return None
+
+
+class ReplicaMiddleware:
+    """Decide per request whether reads may go to a replica"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        read_from_replica = request.method in SAFE_METHODS and not is_pinned(
+            get_request_user_id(request)
+        )
+        replica_token = _read_from_replica.set(read_from_replica)
+        wrote_token = _wrote.set(False)
+        try:
+            response = self.get_response(request)
+            if _wrote.get() or request.method not in SAFE_METHODS:
+                user = getattr(request, "user", None)
+                if user is not None and user.is_authenticated:
+                    pin_to_primary(user.pk)
+            return response
+        finally:
+            _read_from_replica.reset(replica_token)
+            _wrote.reset(wrote_token)
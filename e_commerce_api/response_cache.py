@@ -0,0 +1,324 @@
+"""
+Tag-based caching of public GET responses.
+
+A view method decorated with ``@cache_response`` stores its 200 responses
+under the full URL (host, path and sorted query string), and while a
+response is cached the view does not run. The view names what the
+response depends on with ``tag_response(request, *tags)``: typically one
+tag per object it shows (``catalog.product:12``) and one per collection a
+listing is drawn from. ``invalidate_tags()`` then drops exactly the
+responses carrying any of the tags, wherever they were cached. Responses
+without tags are not cached.
+
+In Redis every response is a string key and every tag a set of response
+keys; invalidating a tag deletes its members and the set in one script.
+A response rendered while one of its tags was invalidated is not stored,
+so a slow render cannot bring back the data the invalidation removed.
+
+A response is fresh for ``RESPONSE_CACHE_TTL`` seconds. For
+``RESPONSE_CACHE_STALE_TTL`` seconds after that it is still served, marked
+``X-Response-Cache: STALE``, while one worker thread of one process
+renders it again in the background (stale-while-revalidate). Tags keep
+the objects shown on a page current; the TTL bounds how long a listing
+may miss rows that moved into it without touching its tags.
+
+Responses keep the data, not the rendered bytes, so they are rendered for
+each client as usual. ``LocalResponseStore`` keeps responses in process
+memory with the same behaviour, for development and tests.
+
+Settings:
+
+    RESPONSE_CACHE_BACKEND = "redis"        # or "local" (one process only);
+                                            # default: "redis" on django-redis
+    RESPONSE_CACHE_TTL = 60                 # seconds a response is fresh
+    RESPONSE_CACHE_STALE_TTL = 300          # seconds it may then be served stale
+    RESPONSE_CACHE_REFRESH_WORKERS = 2      # background refresh threads
+"""
+
+import copy
+import hashlib
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.db import connections
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from .tiered_cache import invalidate_now_and_on_commit, shared_store
+
+logger = logging.getLogger(__name__)
+
+HEADER = "X-Response-Cache"
+REFRESH_LOCK_TIMEOUT = 30
+
+# KEYS[1]: response; KEYS[2..]: its tag sets.
+# ARGV: entry, ttl, time the render started.
+SET_SCRIPT = """
+for i = 2, #KEYS do
+  local stamp = redis.call('GET', KEYS[i] .. ':invalidated')
+  if stamp and tonumber(stamp) >= tonumber(ARGV[3]) then
+    return 0
+  end
+end
+local ttl = tonumber(ARGV[2])
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ttl)
+for i = 2, #KEYS do
+  redis.call('SADD', KEYS[i], KEYS[1])
+  if redis.call('TTL', KEYS[i]) < ttl then
+    redis.call('EXPIRE', KEYS[i], ttl)
+  end
+end
+return 1
+"""
+
+# KEYS: tag sets; ARGV: how long to remember the invalidation.
+INVALIDATE_SCRIPT = """
+local now = redis.call('TIME')
+local stamp = now[1] .. '.' .. string.format('%06d', now[2])
+local dropped = 0
+for i = 1, #KEYS do
+  local responses = redis.call('SMEMBERS', KEYS[i])
+  for j = 1, #responses do
+    dropped = dropped + redis.call('DEL', responses[j])
+  end
+  redis.call('DEL', KEYS[i])
+  redis.call('SET', KEYS[i] .. ':invalidated', stamp, 'EX', ARGV[1])
+end
+return dropped
+"""
+
+
+def response_key(key):
+    return f"response-cache:response:{key}"
+
+
+def tag_key(tag):
+    return f"response-cache:tag:{tag}"
+
+
+class LocalResponseStore:
+    """Responses and tags kept in this process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._responses = {}
+        self._tags = {}
+        self._invalidated = {}
+        self._refreshing = {}
+
+    def now(self):
+        return time.time()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._responses.get(key)
+            if entry is not None and entry[0] <= time.time():
+                del self._responses[key]
+                return None
+            return None if entry is None else entry[1]
+
+    def set(self, key, entry, tags, ttl, started):
+        with self._lock:
+            if any(self._invalidated.get(tag, 0) >= started for tag in tags):
+                return False
+            self._responses[key] = (time.time() + ttl, entry)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            return True
+
+    def invalidate(self, tags, remember):
+        with self._lock:
+            now, dropped = time.time(), 0
+            for tag in tags:
+                for key in self._tags.pop(tag, ()):
+                    dropped += self._responses.pop(key, None) is not None
+                self._invalidated[tag] = now
+            # Renders started before then are over; forget older stamps.
+            self._invalidated = {
+                tag: stamp
+                for tag, stamp in self._invalidated.items()
+                if stamp > now - remember
+            }
+            return dropped
+
+    def claim_refresh(self, key, timeout):
+        with self._lock:
+            if self._refreshing.get(key, 0) > time.time():
+                return False
+            self._refreshing[key] = time.time() + timeout
+            return True
+
+    def clear(self):
+        with self._lock:
+            self._responses.clear()
+            self._tags.clear()
+            self._invalidated.clear()
+            self._refreshing.clear()
+
+
+class RedisResponseStore:
+    """
+    Responses and tags kept in Redis and shared by every process. On Redis
+    Cluster all the keys must map to one slot.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self._set = client.register_script(SET_SCRIPT)
+        self._invalidate = client.register_script(INVALIDATE_SCRIPT)
+
+    def now(self):
+        # The server's clock, which also stamps invalidations.
+        seconds, microseconds = self.client.time()
+        return f"{seconds}.{microseconds:06d}"
+
+    def get(self, key):
+        stored = self.client.get(response_key(key))
+        return None if stored is None else json.loads(stored)
+
+    def set(self, key, entry, tags, ttl, started):
+        return bool(
+            self._set(
+                keys=[response_key(key), *(tag_key(tag) for tag in tags)],
+                args=[json.dumps(entry, cls=JSONEncoder), ttl, started],
+            )
+        )
+
+    def invalidate(self, tags, remember):
+        return int(
+            self._invalidate(keys=[tag_key(tag) for tag in tags], args=[remember])
+        )
+
+    def claim_refresh(self, key, timeout):
+        return bool(
+            self.client.set(f"response-cache:refresh:{key}", 1, nx=True, ex=timeout)
+        )
+
+    def clear(self):
+        for key in self.client.scan_iter(match="response-cache:*", count=1000):
+            self.client.delete(key)
+
+
+class BackgroundRefresher:
+    """Runs refreshes on a small thread pool, started on first use"""
+
+    def __init__(self, workers):
+        self.workers = workers
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def submit(self, refresh):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(
+                    max_workers=self.workers,
+                    thread_name_prefix="response-cache-refresh",
+                )
+        self._pool.submit(self._run, refresh)
+
+    @staticmethod
+    def _run(refresh):
+        try:
+            refresh()
+        except Exception:
+            logger.exception("Could not refresh a cached response")
+        finally:
+            connections.close_all()
+
+
+get_response_store = shared_store(
+    "RESPONSE_CACHE_BACKEND", RedisResponseStore, LocalResponseStore
+)
+refresher = BackgroundRefresher(getattr(settings, "RESPONSE_CACHE_REFRESH_WORKERS", 2))
+
+
+def _fresh_ttl():
+    return getattr(settings, "RESPONSE_CACHE_TTL", 60)
+
+
+def _stale_ttl():
+    return getattr(settings, "RESPONSE_CACHE_STALE_TTL", 300)
+
+
+def request_key(request):
+    """The cache key of a GET request: its host, path and sorted query"""
+    query = urlencode(sorted(request.query_params.lists()), doseq=True)
+    url = f"{request.scheme}://{request.get_host()}{request.path}?{query}"
+    return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+
+def tag_response(request, *tags):
+    """Record that the response to ``request`` depends on ``tags``"""
+    recorded = getattr(request, "_response_cache_tags", None)
+    if recorded is not None:
+        recorded.update(str(tag) for tag in tags)
+
+
+def invalidate_tags(*tags):
+    """Drop every cached response tagged with any of ``tags``"""
+    if not tags:
+        return
+
+    def invalidate():
+        get_response_store().invalidate(tags, remember=_fresh_ttl() + _stale_ttl())
+
+    invalidate_now_and_on_commit(invalidate)
+
+
+def _render(view_method, view, request, args, kwargs, key):
+    """Run the view and cache its response; returns the response"""
+    started = get_response_store().now()
+    request._response_cache_tags = tags = set()
+    response = view_method(view, request, *args, **kwargs)
+    if response.status_code == status.HTTP_200_OK and tags:
+        entry = {
+            # Plain JSON types, so the stored value does not depend on
+            # serializer classes.
+            "data": json.loads(json.dumps(response.data, cls=JSONEncoder)),
+            "fresh_until": time.time() + _fresh_ttl(),
+        }
+        get_response_store().set(
+            key, entry, sorted(tags), _fresh_ttl() + _stale_ttl(), started
+        )
+    return response
+
+
+def cache_response(view_method):
+    """Cache the GET responses of an APIView method by URL and tag them"""
+
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request_key(request)
+        entry = get_response_store().get(key)
+        if entry is None:
+            response = _render(view_method, self, request, args, kwargs, key)
+            response[HEADER] = "MISS"
+            return response
+
+        state = "HIT"
+        if entry["fresh_until"] <= time.time():
+            state = "STALE"
+            if get_response_store().claim_refresh(key, REFRESH_LOCK_TIMEOUT):
+                # Copies, as the view and request finish on this thread.
+                refresher.submit(
+                    lambda: _render(
+                        view_method,
+                        copy.copy(self),
+                        copy.copy(request),
+                        args,
+                        kwargs,
+                        key,
+                    )
+                )
+        return Response(
+            entry["data"], status=status.HTTP_200_OK, headers={HEADER: state}
+        )
+
+    return wrapper
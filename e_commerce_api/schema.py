@@ -0,0 +1,16 @@
+"""
+GraphQL schema for e_commerce_api project.
+
+Each app contributes a ``Query`` class that is mixed into the root query.
+"""
+
+import graphene
+
+import accounts.schema
+
+
+class Query(accounts.schema.Query, graphene.ObjectType):
+    pass
+
+
+schema = graphene.Schema(query=Query)
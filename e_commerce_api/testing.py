@@ -0,0 +1,187 @@
+"""
+Fast test mode for e_commerce_api project.
+
+Most tests create users, and every password hashed with PBKDF2 costs tens
+of milliseconds. ``FastTestRunner`` makes a run cheaper without changing
+what the tests check:
+
+- Passwords are hashed with MD5 (``FAST_PASSWORD_HASHERS``) while the tests
+  run, in the main process and in every ``--parallel`` worker. The
+  settings are not changed, so this never applies outside the runner.
+- Authentication events are audited by a manual audit log (see
+  accounts.audit) that is never flushed, in the main process and in every
+  worker. The default log writes from a background thread, outside the
+  transaction of the test that recorded the event, and flushes what is
+  left at exit, after the test databases are gone.
+- The slowest tests are listed at the end (``--slowest N``, default 10;
+  0 turns the list off), including the tests run by parallel workers.
+
+Run it with
+
+    python manage.py test --parallel auto \
+        --testrunner e_commerce_api.testing.FastTestRunner
+
+With ``--parallel`` Django gives each worker process its own copy of the
+test database. On SQLite the copies live in memory and are cheap to make,
+so a fast profile can run the suite on SQLite (the PostgreSQL-only tests
+are skipped there):
+
+    if "test" in sys.argv and os.environ.get("FAST_TESTS"):
+        DATABASES = sqlite_test_databases(DATABASES)
+        TEST_RUNNER = "e_commerce_api.testing.FastTestRunner"
+
+Tests should create shared rows once per class in ``setUpTestData`` and
+users with accounts.factories, which hashes each password once.
+"""
+
+import time
+import unittest
+from unittest import mock
+
+from django.test import override_settings
+from django.test.runner import (DiscoverRunner, ParallelTestSuite,
+                                RemoteTestResult, RemoteTestRunner)
+
+FAST_PASSWORD_HASHERS = ["django.contrib.auth.hashers.MD5PasswordHasher"]
+
+
+def sqlite_test_databases(databases):
+    """
+    Return a copy of a DATABASES setting with every alias on SQLite. Test
+    databases are then created in memory, one per parallel worker; mirror
+    and dependency settings are kept.
+    """
+    return {
+        alias: {
+            "ENGINE": "django.db.backends.sqlite3",
+            # Only the in-memory test databases are ever opened.
+            "NAME": f"{alias}.sqlite3",
+            "TEST": {
+                key: value
+                for key, value in database.get("TEST", {}).items()
+                if key in ("MIRROR", "DEPENDENCIES")
+            },
+        }
+        for alias, database in databases.items()
+    }
+
+
+def use_fast_hashers():
+    override_settings(PASSWORD_HASHERS=FAST_PASSWORD_HASHERS).enable()
+
+
+def use_manual_audit_log():
+    """Replace the audit log with a manual one; returns the patcher"""
+    from accounts import audit
+
+    patcher = mock.patch.object(audit, "audit_log", audit.AuditLog(backend="manual"))
+    patcher.start()
+    return patcher
+
+
+def setup_worker():
+    use_fast_hashers()
+    use_manual_audit_log()
+
+
+class TimedTextTestResult(unittest.TextTestResult):
+    """Collects the duration of each test in ``collectedDurations``"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.collectedDurations = []
+
+    def startTest(self, test):
+        self._started, self._timed = time.perf_counter(), False
+        super().startTest(test)
+
+    def addDuration(self, test, elapsed):
+        # Called by unittest from Python 3.12, and with the times measured
+        # by parallel workers.
+        self._timed = True
+        self.collectedDurations.append((str(test), elapsed))
+
+    def stopTest(self, test):
+        if not self._timed:
+            self.addDuration(test, time.perf_counter() - self._started)
+        super().stopTest(test)
+
+
+class TimedRemoteTestResult(RemoteTestResult):
+    """Sends the duration of each test from a worker to the main process"""
+
+    def startTest(self, test):
+        self._started, self._timed = time.perf_counter(), False
+        super().startTest(test)
+
+    def addDuration(self, test, elapsed):
+        self._timed = True
+        self.events.append(("addDuration", self.test_index, elapsed))
+
+    def stopTest(self, test):
+        if not self._timed:
+            self.addDuration(test, time.perf_counter() - self._started)
+        super().stopTest(test)
+
+
+class TimedRemoteTestRunner(RemoteTestRunner):
+    resultclass = TimedRemoteTestResult
+
+
+class FastParallelTestSuite(ParallelTestSuite):
+    runner_class = TimedRemoteTestRunner
+    # Spawned workers start from the settings module; forked ones inherit
+    # the hashers and audit log of the main process either way.
+    process_setup = setup_worker
+
+
+class FastTestRunner(DiscoverRunner):
+    """
+    Test runner with cheap password hashing, a manual audit log and a
+    slowest-tests report
+    """
+
+    parallel_test_suite = FastParallelTestSuite
+
+    def __init__(self, slowest=10, **kwargs):
+        super().__init__(**kwargs)
+        self.slowest = slowest
+
+    @classmethod
+    def add_arguments(cls, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            "--slowest",
+            type=int,
+            default=10,
+            metavar="N",
+            help="List the N slowest tests at the end (0 for none).",
+        )
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._hashers = override_settings(PASSWORD_HASHERS=FAST_PASSWORD_HASHERS)
+        self._hashers.enable()
+        self._audit_log = use_manual_audit_log()
+
+    def teardown_test_environment(self, **kwargs):
+        self._audit_log.stop()
+        self._hashers.disable()
+        super().teardown_test_environment(**kwargs)
+
+    def get_resultclass(self):
+        return super().get_resultclass() or TimedTextTestResult
+
+    def run_suite(self, suite, **kwargs):
+        result = super().run_suite(suite, **kwargs)
+        self.report_slowest(result)
+        return result
+
+    def report_slowest(self, result):
+        durations = getattr(result, "collectedDurations", [])
+        if not self.slowest or not durations:
+            return
+        slowest = sorted(durations, key=lambda item: item[1], reverse=True)
+        self.log(f"\nSlowest {min(self.slowest, len(slowest))} tests:")
+        for name, elapsed in slowest[: self.slowest]:
+            self.log(f"{elapsed:8.3f}s  {name}")
@@ -0,0 +1,451 @@
+"""
+Two-tier cache for e_commerce_api project.
+
+A bounded, per-process LRU with a short TTL sits in front of a Django cache
+(Redis in production, through django-redis). Reads are answered from process
+memory when possible, then from Redis, then by calling a loader.
+
+- Invalidation is versioned per key. ``invalidate`` bumps the key's version
+  in Redis and broadcasts it over Redis pub/sub, and every process evicts
+  older local copies. Values written by a loader that raced an invalidation
+  carry the old version and are ignored. If a broadcast is lost, the local
+  TTL bounds how long a process can serve a stale value. Each process
+  subscribes when its first cache is created, and again after a fork.
+  ``invalidate_many`` does the same for many keys at once: one pipelined
+  round trip bumps the versions, one deletes the values and a single
+  broadcast carries them all.
+- Concurrent misses for the same key are coalesced. Within a process only
+  one thread runs the loader while the others wait for its result, and
+  across processes a short Redis lock lets one loader run while the rest
+  poll for its value.
+- Each cache counts local hits, remote hits, misses, loads and coalesced
+  waits; ``stats()`` reports them with hit rates.
+
+Values are shared between threads of a process, so cache immutable values
+(tuples, strings, frozen dicts) or copies.
+
+Settings:
+
+    TIERED_CACHE_ALIAS = "default"        # Django cache used as the shared tier
+    TIERED_CACHE_BROADCAST = "redis"      # "redis", or "local" for one process
+    TIERED_CACHE_CHANNEL = "tiered-cache:invalidate"
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+import weakref
+from functools import lru_cache
+
+from cachetools import TTLCache
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class CacheStats:
+    """Thread-safe hit and miss counters"""
+
+    FIELDS = ("local_hits", "remote_hits", "misses", "loads", "coalesced")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._counts = dict.fromkeys(self.FIELDS, 0)
+
+    def incr(self, field):
+        with self._lock:
+            self._counts[field] += 1
+
+    def snapshot(self):
+        with self._lock:
+            counts = dict(self._counts)
+        lookups = counts["local_hits"] + counts["remote_hits"] + counts["misses"]
+        hits = counts["local_hits"] + counts["remote_hits"]
+        counts["hit_rate"] = hits / lookups if lookups else 0.0
+        counts["local_hit_rate"] = counts["local_hits"] / lookups if lookups else 0.0
+        return counts
+
+
+class _Flight:
+    """A load in progress that other threads can wait on"""
+
+    def __init__(self):
+        self._done = threading.Event()
+        self._value = None
+        self._error = None
+
+    def resolve(self, value):
+        self._value = value
+        self._done.set()
+
+    def reject(self, error):
+        self._error = error
+        self._done.set()
+
+    def wait(self):
+        self._done.wait()
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+
+class TieredCache:
+    """
+    Process-local LRU in front of a shared Django cache.
+
+    Args:
+        name: Namespace for the keys, shared by every process using this cache
+        maxsize: Maximum number of entries kept in process memory
+        local_ttl: Seconds an entry may be served from process memory
+        timeout: Seconds an entry is kept in the shared cache
+        lock_timeout: Seconds a process may hold the cross-process load lock
+    """
+
+    def __init__(self, name, maxsize=1024, local_ttl=30, timeout=300, lock_timeout=5):
+        self.name = name
+        self.timeout = timeout
+        self.lock_timeout = lock_timeout
+        self.stats = CacheStats()
+        self._local = TTLCache(maxsize=maxsize, ttl=local_ttl)
+        # Versions announced by invalidations, so a load that started before
+        # one cannot repopulate the local tier with the value it replaced.
+        self._invalidated = TTLCache(maxsize=maxsize, ttl=local_ttl)
+        self._lock = threading.Lock()
+        self._inflight = {}
+        _registry.add(self)
+        # Subscribe now: a process that only reads must still hear about
+        # invalidations made by others.
+        get_broadcaster()
+
+    @property
+    def remote(self):
+        return caches[getattr(settings, "TIERED_CACHE_ALIAS", "default")]
+
+    def _value_key(self, key):
+        return f"tiered:{self.name}:{key}"
+
+    def _version_key(self, key):
+        return f"tiered:{self.name}:{key}:version"
+
+    def _lock_key(self, key):
+        return f"tiered:{self.name}:{key}:lock"
+
+    def _get_local(self, key):
+        get_broadcaster()
+        with self._lock:
+            entry = self._local.get(key)
+        return _MISSING if entry is None else entry[1]
+
+    def _set_local(self, key, version, value):
+        with self._lock:
+            if self._invalidated.get(key, -1) >= version:
+                return
+            self._local[key] = (version, value)
+
+    def evict_local(self, key, version=None):
+        """Drop the local copy of the key if it is older than ``version``"""
+        key = str(key)
+        with self._lock:
+            if version is None:
+                self._local.pop(key, None)
+                return
+            self._invalidated[key] = max(version, self._invalidated.get(key, -1))
+            entry = self._local.get(key)
+            if entry is not None and entry[0] < version:
+                del self._local[key]
+
+    def clear_local(self):
+        with self._lock:
+            self._local.clear()
+
+    def _get_remote(self, key):
+        """Return (value or _MISSING, current version) from the shared cache"""
+        value_key, version_key = self._value_key(key), self._version_key(key)
+        found = self.remote.get_many([value_key, version_key])
+        version = found.get(version_key, 0)
+        stored = found.get(value_key)
+        if stored is not None and stored[0] == version:
+            self._set_local(key, version, stored[1])
+            return stored[1], version
+        return _MISSING, version
+
+    def get(self, key, default=None):
+        key = str(key)
+        value = self._get_local(key)
+        if value is not _MISSING:
+            self.stats.incr("local_hits")
+            return value
+        value, _ = self._get_remote(key)
+        if value is not _MISSING:
+            self.stats.incr("remote_hits")
+            return value
+        self.stats.incr("misses")
+        return default
+
+    def get_or_set(self, key, loader, timeout=None):
+        """
+        Return the cached value for the key, calling ``loader()`` on a miss.
+
+        Exceptions raised by the loader propagate to every waiting caller and
+        nothing is cached.
+        """
+        key = str(key)
+        value = self._get_local(key)
+        if value is not _MISSING:
+            self.stats.incr("local_hits")
+            return value
+
+        with self._lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+        if not leader:
+            self.stats.incr("coalesced")
+            return flight.wait()
+
+        try:
+            value = self._load(key, loader, timeout)
+        except Exception as error:
+            flight.reject(error)
+            raise
+        else:
+            flight.resolve(value)
+            return value
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def _load(self, key, loader, timeout):
+        value, version = self._get_remote(key)
+        if value is not _MISSING:
+            self.stats.incr("remote_hits")
+            return value
+        self.stats.incr("misses")
+
+        lock_key = self._lock_key(key)
+        locked = self.remote.add(lock_key, True, self.lock_timeout)
+        if not locked:
+            # Another process is loading the key; wait for its result.
+            deadline = time.monotonic() + self.lock_timeout
+            while time.monotonic() < deadline:
+                time.sleep(0.05)
+                value, version = self._get_remote(key)
+                if value is not _MISSING:
+                    self.stats.incr("coalesced")
+                    return value
+
+        try:
+            value = loader()
+            self.stats.incr("loads")
+            self._store(key, version, value, timeout)
+        finally:
+            if locked:
+                self.remote.delete(lock_key)
+        return value
+
+    def _store(self, key, version, value, timeout):
+        timeout = self.timeout if timeout is None else timeout
+        self.remote.set(self._value_key(key), (version, value), timeout)
+        self._set_local(key, version, value)
+
+    def set(self, key, value, timeout=None):
+        key = str(key)
+        _, version = self._get_remote(key)
+        self._store(key, version, value, timeout)
+
+    def invalidate(self, key):
+        """Remove the key from every process and from the shared cache"""
+        self.invalidate_many([key])
+
+    def invalidate_many(self, keys):
+        """Remove the keys from every process and from the shared cache"""
+        keys = list(dict.fromkeys(str(key) for key in keys))
+        if not keys:
+            return
+        versions = self._bump_versions(keys)
+        self.remote.delete_many([self._value_key(key) for key in keys])
+        for key, version in versions.items():
+            self.evict_local(key, version)
+        get_broadcaster().publish(self.name, versions)
+
+    def _bump_versions(self, keys):
+        """Increment the version of each key; returns {key: new version}"""
+        version_keys = [self._version_key(key) for key in keys]
+        # Outlive any value written under the previous version.
+        version_timeout = None if self.timeout is None else self.timeout * 2
+        client = _redis_client(self.remote)
+        if client is not None:
+            # django-redis keeps integers as plain Redis integers, so INCR
+            # works on them directly, for all the keys in one round trip.
+            pipeline = client.pipeline(transaction=False)
+            for version_key in version_keys:
+                raw_key = self.remote.make_key(version_key)
+                pipeline.incr(raw_key)
+                if version_timeout is not None:
+                    pipeline.expire(raw_key, version_timeout)
+            results = pipeline.execute()
+            step = 1 if version_timeout is None else 2
+            return dict(zip(keys, results[::step]))
+
+        versions = {}
+        for key, version_key in zip(keys, version_keys):
+            self.remote.add(version_key, 0, version_timeout)
+            try:
+                versions[key] = self.remote.incr(version_key)
+            except ValueError:
+                versions[key] = 1
+                self.remote.set(version_key, 1, version_timeout)
+        return versions
+
+
+def _redis_client(cache):
+    """The redis-py client behind a django-redis cache, or None"""
+    get_client = getattr(getattr(cache, "client", None), "get_client", None)
+    return None if get_client is None else get_client(write=True)
+
+
+class LocalBroadcaster:
+    """Deliver invalidations to the caches of this process only"""
+
+    def publish(self, name, versions):
+        dispatch(name, versions)
+
+
+class RedisBroadcaster:
+    """Deliver invalidations to every process over Redis pub/sub"""
+
+    def __init__(self, alias, channel):
+        from django_redis import get_redis_connection
+
+        self.channel = channel
+        self.client = get_redis_connection(alias)
+        self._listener = threading.Thread(
+            target=self.listen, name="tiered-cache-invalidations", daemon=True
+        )
+        self._listener.start()
+
+    def publish(self, name, versions):
+        message = json.dumps({"name": name, "versions": versions})
+        self.client.publish(self.channel, message)
+
+    def listen(self):
+        while True:
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                for message in pubsub.listen():
+                    data = json.loads(message["data"])
+                    if "versions" not in data:
+                        # Sent by a process still running the one-key format.
+                        data["versions"] = {data["key"]: data["version"]}
+                    dispatch(data["name"], data["versions"])
+            except Exception:
+                logger.exception("Lost the cache invalidation channel")
+            # Invalidations may have been missed while disconnected.
+            for cache in list(_registry):
+                cache.clear_local()
+            time.sleep(1)
+
+
+_registry = weakref.WeakSet()
+_broadcaster = None
+_broadcaster_pid = None
+_broadcaster_lock = threading.Lock()
+
+
+def dispatch(name, versions):
+    for cache in list(_registry):
+        if cache.name == name:
+            for key, version in versions.items():
+                cache.evict_local(key, version)
+
+
+def _default_backend(alias):
+    backend = settings.CACHES[alias]["BACKEND"]
+    return "redis" if backend.startswith("django_redis.") else "local"
+
+
+def shared_store(backend_setting, make_redis, make_local, depends_on=()):
+    """
+    Return a getter of a store kept in Redis or, for one process, in memory.
+
+    The setting named ``backend_setting`` picks "redis" or "local"; unset,
+    it is "redis" when the shared tier is django-redis. ``make_redis`` is
+    called with the Redis client of ``TIERED_CACHE_ALIAS``. The store is
+    built on first use, not on import, and again when the backend or one
+    of the ``depends_on`` settings changes.
+    """
+
+    @lru_cache(maxsize=None)
+    def get_store():
+        alias = getattr(settings, "TIERED_CACHE_ALIAS", "default")
+        if getattr(settings, backend_setting, _default_backend(alias)) == "redis":
+            from django_redis import get_redis_connection
+
+            return make_redis(get_redis_connection(alias))
+        return make_local()
+
+    watched = {backend_setting, "CACHES", "TIERED_CACHE_ALIAS", *depends_on}
+
+    def reset(*, setting, **kwargs):
+        if setting in watched:
+            get_store.cache_clear()
+
+    setting_changed.connect(reset, weak=False)
+    return get_store
+
+
+def get_broadcaster():
+    """The broadcaster of this process, started on first use and after a fork"""
+    global _broadcaster, _broadcaster_pid
+    pid = os.getpid()
+    if _broadcaster is not None and _broadcaster_pid == pid:
+        return _broadcaster
+    with _broadcaster_lock:
+        if _broadcaster is None or _broadcaster_pid != pid:
+            forked = _broadcaster is not None
+            alias = getattr(settings, "TIERED_CACHE_ALIAS", "default")
+            mode = getattr(settings, "TIERED_CACHE_BROADCAST", _default_backend(alias))
+            if mode == "redis":
+                _broadcaster = RedisBroadcaster(
+                    alias,
+                    getattr(
+                        settings, "TIERED_CACHE_CHANNEL", "tiered-cache:invalidate"
+                    ),
+                )
+            else:
+                _broadcaster = LocalBroadcaster()
+            _broadcaster_pid = pid
+            if forked:
+                # The listener thread stayed in the parent; entries copied
+                # from it may have missed invalidations since.
+                for cache in list(_registry):
+                    cache.clear_local()
+        return _broadcaster
+
+
+def invalidate_now_and_on_commit(invalidate):
+    """
+    Call ``invalidate()`` now and, inside a transaction, again after the
+    commit: a concurrent request may cache the old data again before then.
+    """
+    invalidate()
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(invalidate)
+
+
+def stats():
+    """Return the counters of every live cache, by name"""
+    return {cache.name: cache.stats.snapshot() for cache in list(_registry)}
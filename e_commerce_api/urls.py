@@ -11,6 +11,11 @@ from drf_yasg import openapi
 from drf_yasg.views import get_schema_view
 from rest_framework import permissions
 
+from accounts.views import JWKSView
+
+from .graphql import DRFAuthenticatedGraphQLView
+from .schema import schema
+
 schema_view = get_schema_view(
     openapi.Info(
         title="E-Commerce API",
@@ -27,6 +32,15 @@ urlpatterns = [
     path("admin/", admin.site.urls),
     # API routes
     path("api/v1/accounts/", include("accounts.urls")),
+    path("api/v1/catalog/", include("catalog.urls")),
+    path("api/v1/cart/", include("cart.urls")),
+    path("api/v1/orders/", include("orders.urls")),
+    path(".well-known/jwks.json", JWKSView.as_view(), name="jwks"),
+    path(
+        "graphql/",
+        DRFAuthenticatedGraphQLView.as_view(schema=schema, graphiql=settings.DEBUG),
+        name="graphql",
+    ),
     # API Documentation
     path("swagger/", schema_view.with_ui("swagger", cache_timeout=0)),
     path("redoc/", schema_view.with_ui("redoc", cache_timeout=0)),
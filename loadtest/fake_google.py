@@ -0,0 +1,215 @@
+"""
+Local stand-in for Google's OAuth 2.0 endpoints.
+
+Issues RS256-signed ID tokens, serves the matching certificates as a JWK set
+and implements the authorization code token endpoint, with configurable
+latency and failure injection. Point the accounts settings at it:
+
+    GOOGLE_OAUTH2_CERTS_URL = "http://127.0.0.1:8765/oauth2/v3/certs"
+    GOOGLE_OAUTH2_TOKEN_URL = "http://127.0.0.1:8765/token"
+
+Authorization codes are self-describing (``<sub>|<email>``), so a load
+generator can invent as many users as it needs without talking to the
+provider first.
+
+Run standalone with:
+
+    python -m loadtest.fake_google --port 8765 --client-id <client id>
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import jwt
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+ISSUER = "https://accounts.google.com"
+CERTS_PATH = "/oauth2/v3/certs"
+TOKEN_PATH = "/token"
+
+
+class FakeGoogleProvider:
+    """In-process fake Google OAuth provider served over localhost HTTP"""
+
+    def __init__(
+        self,
+        client_id,
+        host="127.0.0.1",
+        port=0,
+        latency=0.0,
+        jitter=0.0,
+        failure_rate=0.0,
+        token_lifetime=3600,
+    ):
+        self.client_id = client_id
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.token_lifetime = token_lifetime
+        self.kid = uuid.uuid4().hex
+        self._private_key = rsa.generate_private_key(
+            public_exponent=65537, key_size=2048
+        )
+        self._jwks = json.dumps({"keys": [self._public_jwk()]}).encode()
+        self.server = ThreadingHTTPServer((host, port), self._make_handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def certs_url(self):
+        return f"{self.url}{CERTS_PATH}"
+
+    @property
+    def token_url(self):
+        return f"{self.url}{TOKEN_PATH}"
+
+    def _public_jwk(self):
+        jwk = jwt.algorithms.RSAAlgorithm.to_jwk(
+            self._private_key.public_key(), as_dict=True
+        )
+        jwk.update({"kid": self.kid, "alg": "RS256", "use": "sig"})
+        return jwk
+
+    def issue_id_token(self, sub, email=None, given_name="Load", family_name="Test"):
+        """Return a signed ID token for the given Google user"""
+        now = int(time.time())
+        claims = {
+            "iss": ISSUER,
+            "aud": self.client_id,
+            "azp": self.client_id,
+            "sub": str(sub),
+            "email": email or f"{sub}@loadtest.example.com",
+            "email_verified": True,
+            "given_name": given_name,
+            "family_name": family_name,
+            "iat": now,
+            "exp": now + self.token_lifetime,
+        }
+        return jwt.encode(
+            claims, self._private_key, algorithm="RS256", headers={"kid": self.kid}
+        )
+
+    @staticmethod
+    def make_code(sub, email=None):
+        """Return an authorization code the token endpoint will accept"""
+        return f"{sub}|{email or ''}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _make_handler(self):
+        provider = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def send_json(self, status, body):
+                data = json.dumps(body).encode() if isinstance(body, dict) else body
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def simulate_network(self):
+                """Apply latency, then return True if the call should fail"""
+                delay = provider.latency + random.uniform(0, provider.jitter)
+                if delay:
+                    time.sleep(delay)
+                if random.random() < provider.failure_rate:
+                    self.send_json(503, {"error": "temporarily_unavailable"})
+                    return True
+                return False
+
+            def do_GET(self):
+                if urlparse(self.path).path != CERTS_PATH:
+                    self.send_json(404, {"error": "not_found"})
+                    return
+                if not self.simulate_network():
+                    self.send_json(200, provider._jwks)
+
+            def do_POST(self):
+                if urlparse(self.path).path != TOKEN_PATH:
+                    self.send_json(404, {"error": "not_found"})
+                    return
+                length = int(self.headers.get("Content-Length", 0))
+                form = parse_qs(self.rfile.read(length).decode())
+                if self.simulate_network():
+                    return
+
+                code = form.get("code", [""])[0]
+                sub, _, email = code.partition("|")
+                if form.get("client_id", [""])[0] != provider.client_id:
+                    self.send_json(401, {"error": "invalid_client"})
+                elif not sub:
+                    self.send_json(400, {"error": "invalid_grant"})
+                else:
+                    self.send_json(
+                        200,
+                        {
+                            "access_token": uuid.uuid4().hex,
+                            "expires_in": provider.token_lifetime,
+                            "token_type": "Bearer",
+                            "scope": "openid email profile",
+                            "id_token": provider.issue_id_token(sub, email or None),
+                        },
+                    )
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--client-id", required=True)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--failure-rate", type=float, default=0)
+    args = parser.parse_args()
+
+    provider = FakeGoogleProvider(
+        args.client_id,
+        host=args.host,
+        port=args.port,
+        latency=args.latency_ms / 1000,
+        jitter=args.jitter_ms / 1000,
+        failure_rate=args.failure_rate,
+    )
+    print(f"Fake Google provider on {provider.url}")
+    print(f"  GOOGLE_OAUTH2_CERTS_URL = {provider.certs_url}")
+    print(f"  GOOGLE_OAUTH2_TOKEN_URL = {provider.token_url}")
+    try:
+        provider.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
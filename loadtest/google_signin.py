@@ -0,0 +1,120 @@
+"""
+Load test for end-to-end Google sign-in.
+
+Starts the fake Google provider in this process, then drives concurrent
+sign-ins against a running accounts server whose settings point at it:
+
+    GOOGLE_OAUTH2_CLIENT_ID = "loadtest-client"
+    GOOGLE_OAUTH2_CERTS_URL = "http://127.0.0.1:8765/oauth2/v3/certs"
+    GOOGLE_OAUTH2_TOKEN_URL = "http://127.0.0.1:8765/token"
+
+    python -m loadtest.google_signin --base-url http://127.0.0.1:8000 \\
+        --client-id loadtest-client --requests 2000 --concurrency 32
+
+With ``--flow id_token`` the client posts provider-minted ID tokens to
+``google/``; with ``--flow code`` it posts authorization codes to
+``google/callback/`` so the server also calls the token endpoint. Users are
+drawn from a pool of ``--users`` subjects, so the run mixes first logins
+with repeat logins.
+"""
+
+import argparse
+import random
+import statistics
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from .fake_google import FakeGoogleProvider
+
+_local = threading.local()
+
+
+def _session():
+    if not hasattr(_local, "session"):
+        _local.session = requests.Session()
+    return _local.session
+
+
+def sign_in(provider, base_url, flow, sub):
+    """Perform one sign-in and return (status code, seconds elapsed)"""
+    if flow == "code":
+        url = f"{base_url}/api/v1/accounts/google/callback/"
+        body = {"code": provider.make_code(sub)}
+    else:
+        url = f"{base_url}/api/v1/accounts/google/"
+        body = {"token": provider.issue_id_token(sub)}
+
+    started = time.perf_counter()
+    try:
+        status = _session().post(url, json=body, timeout=30).status_code
+    except requests.RequestException:
+        status = 0
+    return status, time.perf_counter() - started
+
+
+def run(provider, base_url, flow, users, total, concurrency):
+    subs = [f"loadtest-{i}" for i in range(users)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(
+            pool.map(
+                lambda _: sign_in(provider, base_url, flow, random.choice(subs)),
+                range(total),
+            )
+        )
+    return results, time.perf_counter() - started
+
+
+def report(results, elapsed):
+    statuses = Counter(status for status, _ in results)
+    latencies = sorted(seconds * 1000 for _, seconds in results)
+    percentiles = statistics.quantiles(latencies, n=100, method="inclusive")
+    print(f"requests:    {len(results)}")
+    print(f"status:      {dict(sorted(statuses.items()))}")
+    print(f"throughput:  {len(results) / elapsed:.1f} sign-ins/s")
+    print(
+        "latency ms:  "
+        f"p50={percentiles[49]:.1f} p95={percentiles[94]:.1f} "
+        f"p99={percentiles[98]:.1f} max={latencies[-1]:.1f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--client-id", required=True)
+    parser.add_argument("--flow", choices=["id_token", "code"], default="id_token")
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--provider-port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--failure-rate", type=float, default=0)
+    args = parser.parse_args()
+
+    provider = FakeGoogleProvider(
+        args.client_id,
+        port=args.provider_port,
+        latency=args.latency_ms / 1000,
+        jitter=args.jitter_ms / 1000,
+        failure_rate=args.failure_rate,
+    )
+    with provider:
+        results, elapsed = run(
+            provider,
+            args.base_url.rstrip("/"),
+            args.flow,
+            args.users,
+            args.requests,
+            args.concurrency,
+        )
+    report(results, elapsed)
+
+
+if __name__ == "__main__":
+    main()
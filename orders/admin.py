@@ -0,0 +1,23 @@
+from django.contrib import admin
+
+from .models import Order, OrderItem
+
+
+class OrderItemInline(admin.TabularInline):
+    model = OrderItem
+    raw_id_fields = ("product",)
+    readonly_fields = ("product", "quantity", "unit_price")
+    extra = 0
+    can_delete = False
+
+
+@admin.register(Order)
+class OrderAdmin(admin.ModelAdmin):
+    list_display = ("id", "user", "status", "total", "created_at", "expires_at")
+    list_filter = ("status",)
+    search_fields = ("user__email",)
+    raw_id_fields = ("user",)
+    list_select_related = ("user",)
+    # Status changes move stock; make them through orders.placement.
+    readonly_fields = ("status", "total", "expires_at", "confirmed_at")
+    inlines = [OrderItemInline]
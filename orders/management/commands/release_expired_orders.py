@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+
+from orders.placement import release_expired_reservations
+
+SCHEDULE_NAME = "Release expired order reservations"
+TASK = "orders.tasks.release_expired_orders"
+
+
+class Command(BaseCommand):
+    help = (
+        "Expire pending orders past their reservation deadline and return "
+        "their stock. Normally run every minute by celery beat."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=None, help="Orders per transaction"
+        )
+        parser.add_argument(
+            "--install-schedule",
+            action="store_true",
+            help="Create or update the celery beat schedule, every minute",
+        )
+
+    def handle(self, *args, **options):
+        if options["install_schedule"]:
+            self.install_schedule()
+            return
+        released = release_expired_reservations(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Released {released} expired orders"))
+
+    def install_schedule(self):
+        from django_celery_beat.models import IntervalSchedule, PeriodicTask
+
+        interval, _ = IntervalSchedule.objects.get_or_create(
+            every=1, period=IntervalSchedule.MINUTES
+        )
+        PeriodicTask.objects.update_or_create(
+            name=SCHEDULE_NAME, defaults={"task": TASK, "interval": interval}
+        )
+        self.stdout.write(self.style.SUCCESS(f"Scheduled {TASK} every minute"))
@@ -0,0 +1,50 @@
+from rest_framework import serializers
+
+from .models import Order, OrderItem
+
+MAX_ORDER_LINES = 100
+
+
+class OrderLineSerializer(serializers.Serializer):
+    product = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField(min_value=1, max_value=1000)
+
+
+class PlaceOrderSerializer(serializers.Serializer):
+    """Products to order; the user's cart when ``items`` is left out"""
+
+    items = OrderLineSerializer(many=True, required=False)
+
+    def validate_items(self, value):
+        if not value:
+            raise serializers.ValidationError("Order at least one product.")
+        if len(value) > MAX_ORDER_LINES:
+            raise serializers.ValidationError(
+                f"Order at most {MAX_ORDER_LINES} products at once."
+            )
+        return value
+
+
+class OrderItemSerializer(serializers.ModelSerializer):
+    name = serializers.CharField(source="product.name", read_only=True)
+    subtotal = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+
+    class Meta:
+        model = OrderItem
+        fields = ["product", "name", "quantity", "unit_price", "subtotal"]
+
+
+class OrderSerializer(serializers.ModelSerializer):
+    items = OrderItemSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Order
+        fields = [
+            "id",
+            "status",
+            "total",
+            "items",
+            "created_at",
+            "expires_at",
+            "confirmed_at",
+        ]
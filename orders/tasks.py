@@ -0,0 +1,9 @@
+from celery import shared_task
+
+from .placement import release_expired_reservations
+
+
+@shared_task(ignore_result=True)
+def release_expired_orders():
+    """Return the stock of pending orders past their reservation deadline"""
+    release_expired_reservations()
@@ -0,0 +1,310 @@
+import io
+import random
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from accounts import factories
+from accounts.retention import DELETE, AccountCleanup
+from cart.store import get_cart_store, user_key
+from catalog.models import Category, Product
+from e_commerce_api.response_cache import get_response_store
+
+from .models import Order
+from .placement import (OutOfStock, cancel_order, confirm_order, place_order,
+                        release_expired_reservations)
+
+User = get_user_model()
+
+
+def make_user(email):
+    return factories.make_user(
+        email, password="BuyerPass123!", first_name="Buy", last_name="Er"
+    )
+
+
+def make_product(category, slug, stock, price="10.00"):
+    return Product.objects.create(
+        category=category,
+        name=slug.title(),
+        slug=slug,
+        price=Decimal(price),
+        stock=stock,
+    )
+
+
+class OrderPlacementTests(TestCase):
+    """Tests for reserving stock and the order lifecycle"""
+
+    def setUp(self):
+        self.user = make_user("buyer@example.com")
+        category = Category.objects.create(name="Phones", slug="phones")
+        self.phone = make_product(category, "phone", stock=5, price="100.00")
+        self.case = make_product(category, "case", stock=2, price="10.50")
+
+    def stock(self, product):
+        product.refresh_from_db(fields=["stock"])
+        return product.stock
+
+    def test_place_order_reserves_stock(self):
+        # Two reservations, the prices, the order and its lines, inside
+        # the test's transaction.
+        with self.assertNumQueries(7):
+            order = place_order(
+                self.user, [(self.phone.pk, 2), (self.case.pk, 1), (self.phone.pk, 1)]
+            )
+        self.assertEqual(order.status, Order.PENDING)
+        self.assertEqual(order.total, Decimal("310.50"))
+        self.assertEqual(
+            list(order.items.values_list("product_id", "quantity", "unit_price")),
+            [
+                (self.phone.pk, 3, Decimal("100.00")),
+                (self.case.pk, 1, Decimal("10.50")),
+            ],
+        )
+        self.assertEqual(self.stock(self.phone), 2)
+        self.assertEqual(self.stock(self.case), 1)
+
+    def test_reservations_drop_cached_product_pages(self):
+        get_response_store().clear()
+        url = f"/api/v1/catalog/products/{self.phone.pk}/"
+        self.client.get(url)
+        order = place_order(self.user, [(self.phone.pk, 2)])
+        self.assertEqual(self.client.get(url).data["stock"], 3)
+        cancel_order(order)
+        self.assertEqual(self.client.get(url).data["stock"], 5)
+
+    def test_short_product_reserves_nothing(self):
+        with self.assertRaises(OutOfStock) as raised:
+            place_order(self.user, [(self.phone.pk, 1), (self.case.pk, 3)])
+        self.assertEqual(raised.exception.product_ids, [self.case.pk])
+        self.assertEqual(self.stock(self.phone), 5)
+        self.assertFalse(Order.objects.exists())
+
+    def test_unavailable_and_unknown_products_are_short(self):
+        Product.objects.filter(pk=self.phone.pk).update(is_available=False)
+        with self.assertRaises(OutOfStock) as raised:
+            place_order(self.user, [(self.phone.pk, 1), (999999, 1)])
+        self.assertEqual(raised.exception.product_ids, [self.phone.pk, 999999])
+
+    def test_confirm_keeps_stock(self):
+        order = place_order(self.user, [(self.phone.pk, 2)])
+        self.assertTrue(confirm_order(order))
+        self.assertFalse(cancel_order(order))
+        self.assertEqual(release_expired_reservations(now=order.expires_at), 0)
+        self.assertEqual(self.stock(self.phone), 3)
+
+    def test_cancel_returns_stock(self):
+        order = place_order(self.user, [(self.phone.pk, 2), (self.case.pk, 2)])
+        self.assertTrue(cancel_order(order))
+        self.assertFalse(cancel_order(order))
+        self.assertFalse(confirm_order(order))
+        self.assertEqual(self.stock(self.phone), 5)
+        self.assertEqual(self.stock(self.case), 2)
+
+    def test_expired_reservations_are_released_in_batches(self):
+        orders = [place_order(self.user, [(self.phone.pk, 1)]) for _ in range(5)]
+        confirm_order(orders[0])
+        Order.objects.filter(pk=orders[1].pk).update(
+            expires_at=timezone.now() + timedelta(hours=1)
+        )
+        self.assertEqual(self.stock(self.phone), 0)
+
+        later = timezone.now() + timedelta(minutes=30)
+        self.assertEqual(release_expired_reservations(batch_size=2, now=later), 3)
+        self.assertEqual(self.stock(self.phone), 3)
+        self.assertEqual(Order.objects.filter(status=Order.EXPIRED).count(), 3)
+        self.assertFalse(confirm_order(orders[2]))
+
+    def test_release_command(self):
+        order = place_order(self.user, [(self.case.pk, 2)])
+        Order.objects.filter(pk=order.pk).update(expires_at=timezone.now())
+        out = io.StringIO()
+        call_command("release_expired_orders", stdout=out)
+        self.assertIn("Released 1 expired orders", out.getvalue())
+        self.assertEqual(self.stock(self.case), 2)
+
+    @override_settings(ACCOUNT_RETENTION_TRACKED_SINCE="2000-01-01")
+    def test_account_retention_keeps_buyers(self):
+        old = timezone.now() - timedelta(days=400)
+        buyer = factories.make_user("old-buyer@example.com", date_joined=old)
+        unused = factories.make_user("unused@example.com", date_joined=old)
+        place_order(buyer, [(self.case.pk, 1)])
+        cache.clear()
+        progress = AccountCleanup(mode=DELETE, sleep=0).run()
+        self.assertTrue(progress["finished"])
+        self.assertEqual(progress["removed"], 1)
+        self.assertTrue(User.objects.filter(pk=buyer.pk).exists())
+        self.assertFalse(User.objects.filter(pk=unused.pk).exists())
+
+
+class OrderAPITests(TestCase):
+    """Tests for the order endpoints"""
+
+    url = "/api/v1/orders/"
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = make_user("buyer@example.com")
+        self.client.force_authenticate(user=self.user)
+        self.addCleanup(get_cart_store().clear, user_key(self.user.pk))
+        category = Category.objects.create(name="Phones", slug="phones")
+        self.phone = make_product(category, "phone", stock=3)
+
+    def test_place_order_with_items(self):
+        response = self.client.post(
+            self.url,
+            {"items": [{"product": self.phone.pk, "quantity": 2}]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["status"], Order.PENDING)
+        self.assertEqual(response.data["items"][0]["name"], "Phone")
+
+        response = self.client.post(
+            self.url,
+            {"items": [{"product": self.phone.pk, "quantity": 2}]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data["products"], [self.phone.pk])
+
+    def test_place_order_from_cart_empties_it(self):
+        response = self.client.post(self.url, {}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        get_cart_store().add(user_key(self.user.pk), self.phone.pk, 3)
+        response = self.client.post(self.url, {}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["total"], "30.00")
+        self.assertEqual(get_cart_store().items(user_key(self.user.pk)), {})
+
+    def test_orders_are_private(self):
+        order = place_order(self.user, [(self.phone.pk, 1)])
+        response = self.client.get(f"{self.url}{order.pk}/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.client.force_authenticate(user=make_user("other@example.com"))
+        response = self.client.get(f"{self.url}{order.pk}/")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.post(f"{self.url}{order.pk}/cancel/")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(INTERNAL_SERVICE_TOKENS=["payment-secret"])
+    def test_confirm_and_cancel(self):
+        order = place_order(self.user, [(self.phone.pk, 1)])
+        response = self.client.post(f"{self.url}{order.pk}/confirm/")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        # The payment service confirms orders, without a user.
+        self.client.force_authenticate(user=None)
+        response = self.client.post(
+            f"{self.url}{order.pk}/confirm/", headers={"X-Service-Token": "nope"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        response = self.client.post(
+            f"{self.url}{order.pk}/confirm/",
+            headers={"X-Service-Token": "payment-secret"},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["status"], Order.CONFIRMED)
+
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post(f"{self.url}{order.pk}/cancel/")
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+        response = self.client.get(self.url)
+        self.assertEqual([row["id"] for row in response.data], [order.pk])
+
+    def test_staff_confirms_any_order(self):
+        order = place_order(self.user, [(self.phone.pk, 1)])
+        staff = factories.make_user("staff@example.com", is_staff=True)
+        self.client.force_authenticate(user=staff)
+        response = self.client.post(f"{self.url}{order.pk}/confirm/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["status"], Order.CONFIRMED)
+
+
+class OrderConcurrencyTests(TransactionTestCase):
+    """Stress tests with many buyers placing orders at the same time"""
+
+    BUYERS = 24
+
+    def setUp(self):
+        category = Category.objects.create(name="Flash sale", slug="flash-sale")
+        self.sku = make_product(category, "sku", stock=10)
+        self.other = make_product(category, "other", stock=10)
+        self.users = factories.make_users(self.BUYERS, password="BuyerPass123!")
+
+    def run_buyers(self, lines_for):
+        """Start every buyer at once; returns (orders placed, buyers turned away)"""
+        start = threading.Barrier(self.BUYERS)
+        placed, refused, errors = [], [], []
+
+        def buy(user, lines):
+            try:
+                start.wait()
+                for _attempt in range(50):
+                    try:
+                        placed.append(place_order(user, lines))
+                        return
+                    except OutOfStock:
+                        refused.append(user)
+                        return
+                    except OperationalError:
+                        # SQLite locks the whole database; retry as a client would.
+                        time.sleep(random.uniform(0.001, 0.01))
+                errors.append(user)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=buy, args=(user, lines_for(n)))
+            for n, user in enumerate(self.users)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        return placed, refused
+
+    def test_one_sku_is_never_oversold(self):
+        placed, refused = self.run_buyers(lambda n: [(self.sku.pk, 1)])
+        self.assertEqual(len(placed), 10)
+        self.assertEqual(len(refused), self.BUYERS - 10)
+        self.sku.refresh_from_db()
+        self.assertEqual(self.sku.stock, 0)
+        self.assertEqual(Order.objects.count(), 10)
+
+    def test_overlapping_orders_do_not_deadlock(self):
+        # Half the buyers list the products in the opposite order.
+        def lines_for(n):
+            lines = [(self.sku.pk, 1), (self.other.pk, 1)]
+            return lines[::-1] if n % 2 else lines
+
+        placed, refused = self.run_buyers(lines_for)
+        self.assertEqual(len(placed), 10)
+        for product in (self.sku, self.other):
+            product.refresh_from_db()
+            self.assertEqual(product.stock, 0)
+
+    def test_expired_orders_return_stock_for_later_buyers(self):
+        placed, _ = self.run_buyers(lambda n: [(self.sku.pk, 2)])
+        self.assertEqual(len(placed), 5)
+        Order.objects.update(expires_at=timezone.now())
+        self.assertEqual(release_expired_reservations(), 5)
+        self.sku.refresh_from_db()
+        self.assertEqual(self.sku.stock, 10)
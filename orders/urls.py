@@ -0,0 +1,12 @@
+from django.urls import path
+
+from . import views
+
+app_name = "orders"
+
+urlpatterns = [
+    path("", views.OrderListView.as_view(), name="order-list"),
+    path("<int:pk>/", views.OrderDetailView.as_view(), name="order-detail"),
+    path("<int:pk>/confirm/", views.OrderConfirmView.as_view(), name="order-confirm"),
+    path("<int:pk>/cancel/", views.OrderCancelView.as_view(), name="order-cancel"),
+]
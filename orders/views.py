@@ -0,0 +1,166 @@
+from django.shortcuts import get_object_or_404
+from drf_yasg.utils import swagger_auto_schema
+from rest_framework import status
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from accounts.permissions import IsInternalService
+from cart.store import get_cart_store, user_key
+from e_commerce_api.idempotency import IDEMPOTENCY_KEY_PARAMETER, idempotent
+
+from .models import Order
+from .placement import OutOfStock, cancel_order, confirm_order, place_order
+from .serializers import OrderSerializer, PlaceOrderSerializer
+
+ORDER_LIST_LIMIT = 50
+
+
+def user_orders(user):
+    return Order.objects.filter(user=user).prefetch_related("items__product")
+
+
+class OrderListView(APIView):
+    """
+    Orders endpoint.
+
+    GET: The signed-in user's latest orders, newest first.
+    POST: Place an order for the given items, or for the contents of the
+    user's cart when no items are given. The stock is reserved until the
+    order is confirmed, cancelled or expires.
+    Requires authentication.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description="List my orders",
+        responses={200: OrderSerializer(many=True)},
+    )
+    def get(self, request):
+        orders = user_orders(request.user)[:ORDER_LIST_LIMIT]
+        return Response(
+            OrderSerializer(orders, many=True).data, status=status.HTTP_200_OK
+        )
+
+    @swagger_auto_schema(
+        operation_description="Place an order",
+        request_body=PlaceOrderSerializer,
+        manual_parameters=[IDEMPOTENCY_KEY_PARAMETER],
+        responses={
+            201: OrderSerializer,
+            400: "Validation error or empty cart",
+            409: "Not enough stock",
+        },
+    )
+    @idempotent
+    def post(self, request):
+        serializer = PlaceOrderSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        from_cart = "items" not in serializer.validated_data
+        if from_cart:
+            lines = list(get_cart_store().items(user_key(request.user.pk)).items())
+            if not lines:
+                return Response(
+                    {"error": "Cart is empty."}, status=status.HTTP_400_BAD_REQUEST
+                )
+        else:
+            lines = [
+                (line["product"], line["quantity"])
+                for line in serializer.validated_data["items"]
+            ]
+
+        try:
+            order = place_order(request.user, lines)
+        except OutOfStock as e:
+            return Response(
+                {
+                    "error": "Some products are not available in the requested "
+                    "quantity.",
+                    "products": e.product_ids,
+                },
+                status=status.HTTP_409_CONFLICT,
+            )
+        if from_cart:
+            get_cart_store().clear(user_key(request.user.pk))
+        order = user_orders(request.user).get(pk=order.pk)
+        return Response(OrderSerializer(order).data, status=status.HTTP_201_CREATED)
+
+
+class OrderDetailView(APIView):
+    """
+    Order detail endpoint.
+
+    GET: One of the signed-in user's orders.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description="Get an order",
+        responses={200: OrderSerializer, 404: "Order not found"},
+    )
+    def get(self, request, pk):
+        order = get_object_or_404(user_orders(request.user), pk=pk)
+        return Response(OrderSerializer(order).data, status=status.HTTP_200_OK)
+
+
+class OrderConfirmView(APIView):
+    """
+    Order confirmation endpoint.
+
+    POST: Confirm a pending order, keeping its stock. Called once payment
+    succeeds; fails once the reservation has expired.
+    Requires a staff user or a service token in the X-Service-Token header:
+    buyers must not confirm orders they have not paid for.
+    """
+
+    permission_classes = [IsAdminUser | IsInternalService]
+
+    @swagger_auto_schema(
+        operation_description="Confirm an order",
+        responses={
+            200: OrderSerializer,
+            404: "Order not found",
+            409: "Order is not pending or its reservation expired",
+        },
+    )
+    def post(self, request, pk):
+        order = get_object_or_404(
+            Order.objects.prefetch_related("items__product"), pk=pk
+        )
+        if not confirm_order(order):
+            return Response(
+                {"error": "Order can no longer be confirmed."},
+                status=status.HTTP_409_CONFLICT,
+            )
+        return Response(OrderSerializer(order).data, status=status.HTTP_200_OK)
+
+
+class OrderCancelView(APIView):
+    """
+    Order cancellation endpoint.
+
+    POST: Cancel a pending order and release its stock.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description="Cancel an order",
+        responses={
+            200: OrderSerializer,
+            404: "Order not found",
+            409: "Order is not pending",
+        },
+    )
+    def post(self, request, pk):
+        order = get_object_or_404(user_orders(request.user), pk=pk)
+        if not cancel_order(order):
+            return Response(
+                {"error": "Only pending orders can be cancelled."},
+                status=status.HTTP_409_CONFLICT,
+            )
+        return Response(OrderSerializer(order).data, status=status.HTTP_200_OK)